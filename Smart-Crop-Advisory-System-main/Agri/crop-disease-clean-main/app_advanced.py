@@ -3,31 +3,146 @@ KrishiVannai AI Plant Disease Prediction System
 Advanced Flask web application for AI-powered plant disease detection
 """
 
-from flask import Flask, request, render_template, jsonify
+from flask import Flask, request, render_template, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageOps
 import io
 import base64
+import math
 from predict_advanced import AdvancedPlantDiseasePredictor
+from inference_backends import configure_tensorflow_threads
+from autotune import load_tuning_profile
+from micro_batching import MicroBatchScheduler, QueueFullError, SchedulerClosedError
+from prediction_cache import PredictionCache
+from image_quality import QualityGate, QUALITY_GATE_MODES
+from model_registry import ModelRegistry, UnknownModelError, load_registry_specs
+from embedding_index import EmbeddingIndex, encode_embedding, decode_embedding
+from tiled_inference import predict_tiled, TILE_AGGREGATIONS
+from video_inference import VideoFrames, SequenceFrames, iter_timeline, VIDEO_EXTENSIONS
+from tensor_protocol import (parse_tensor_request, encode_binary_results, TensorFormatError,
+                             TENSOR_MIME_TYPE, RESULT_MIME_TYPE, REQUEST_HEADER)
+from metrics import STAGE_SECONDS, stage_timer, request_labels, render_metric
 from werkzeug.utils import secure_filename
+from werkzeug.datastructures import FileStorage
 import json
 from datetime import datetime
 import traceback
 import logging
+import time
+import threading
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Settings measured by autotune.py on this host; explicitly set variables win
+tuning_profile = load_tuning_profile(os.environ.get('TUNING_PROFILE', 'tuning_profile.json'))
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 app.config['SECRET_KEY'] = 'krishivannai-ai-plant-disease-prediction-secret-key'
 app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024  # 32MB max file size
+app.config['MAX_UPLOAD_BYTES'] = int(float(os.environ.get('MAX_UPLOAD_MB', 32)) * 1024 * 1024)  # Whole request, single-image routes
+app.config['MAX_BATCH_UPLOAD_BYTES'] = int(float(os.environ.get('MAX_BATCH_UPLOAD_MB', 512)) * 1024 * 1024)  # Batch, video and tensor uploads
+# Enforced by Werkzeug while parsing, also for bodies without a Content-Length; limit_upload_size applies the per-route limit
+app.config['MAX_CONTENT_LENGTH'] = max(app.config['MAX_UPLOAD_BYTES'], app.config['MAX_BATCH_UPLOAD_BYTES'])
+app.config['BATCH_MAX_FILES'] = int(os.environ.get('BATCH_MAX_FILES', 500))
+app.config['BATCH_CHUNK_SIZE'] = int(os.environ.get('BATCH_CHUNK_SIZE', 32))
+app.config['BATCH_DECODE_WORKERS'] = int(os.environ.get('BATCH_DECODE_WORKERS', min(8, os.cpu_count() or 1)))
+app.config['IMAGE_ECHO_MAX_BYTES'] = int(os.environ.get('IMAGE_ECHO_MAX_BYTES', 100 * 1024))
+app.config['IMAGE_ECHO_THUMBNAIL_SIZE'] = int(os.environ.get('IMAGE_ECHO_THUMBNAIL_SIZE', 320))
+app.config['PREDICTION_CACHE_SIZE'] = int(os.environ.get('PREDICTION_CACHE_SIZE', 1024))
+app.config['PREDICTION_CACHE_DB'] = os.environ.get('PREDICTION_CACHE_DB', os.path.join('cache', 'predictions.sqlite3'))
+app.config['PREDICTION_CACHE_DISK_MAX_ENTRIES'] = int(os.environ.get('PREDICTION_CACHE_DISK_MAX_ENTRIES', 100000))
+app.config['MICRO_BATCH_MAX_SIZE'] = int(os.environ.get('MICRO_BATCH_MAX_SIZE', 8))
+app.config['MICRO_BATCH_MAX_WAIT_MS'] = float(os.environ.get('MICRO_BATCH_MAX_WAIT_MS', 10))
+app.config['MICRO_BATCH_WORKERS'] = int(os.environ.get('MICRO_BATCH_WORKERS', 1))
+app.config['TF_INTRA_OP_THREADS'] = int(os.environ['TF_INTRA_OP_THREADS']) if os.environ.get('TF_INTRA_OP_THREADS') else None
+app.config['TF_INTER_OP_THREADS'] = int(os.environ['TF_INTER_OP_THREADS']) if os.environ.get('TF_INTER_OP_THREADS') else None
+app.config['INFERENCE_QUEUE_SIZE'] = int(os.environ.get('INFERENCE_QUEUE_SIZE', 64))
+app.config['INFERENCE_QUEUE_RETRY_AFTER'] = int(os.environ.get('INFERENCE_QUEUE_RETRY_AFTER', 1))  # Seconds
+app.config['REQUEST_DEADLINE_MS'] = float(os.environ.get('REQUEST_DEADLINE_MS', 30000))  # 0 waits forever
+app.config['TILE_OVERLAP'] = float(os.environ.get('TILE_OVERLAP', 0.25))
+app.config['TILE_MAX_TILES'] = int(os.environ.get('TILE_MAX_TILES', 64))
+app.config['TILE_MIN_STD'] = float(os.environ.get('TILE_MIN_STD', 8.0))  # Flatter tiles are skipped as background
+app.config['TILE_AGGREGATION'] = os.environ.get('TILE_AGGREGATION', 'max')
+app.config['TILE_BATCH_SIZE'] = int(os.environ.get('TILE_BATCH_SIZE', 32))
+app.config['VIDEO_SAMPLE_FPS'] = float(os.environ.get('VIDEO_SAMPLE_FPS', 2.0))
+app.config['VIDEO_DEDUP_THRESHOLD'] = float(os.environ.get('VIDEO_DEDUP_THRESHOLD', 4.0))
+app.config['VIDEO_MAX_FRAMES'] = int(os.environ.get('VIDEO_MAX_FRAMES', 3600))  # Sampled frames per request
+app.config['QUALITY_GATE'] = os.environ.get('QUALITY_GATE', 'warn').lower()  # off, warn or reject
+app.config['QUALITY_MIN_SHARPNESS'] = float(os.environ.get('QUALITY_MIN_SHARPNESS', 10.0))  # Laplacian variance
+app.config['QUALITY_MIN_BRIGHTNESS'] = float(os.environ.get('QUALITY_MIN_BRIGHTNESS', 35.0))  # Mean gray level
+app.config['QUALITY_MAX_BRIGHTNESS'] = float(os.environ.get('QUALITY_MAX_BRIGHTNESS', 230.0))
+app.config['QUALITY_MAX_CLIPPED_FRACTION'] = float(os.environ.get('QUALITY_MAX_CLIPPED_FRACTION', 0.6))
+app.config['QUALITY_MIN_GREEN_COVERAGE'] = float(os.environ.get('QUALITY_MIN_GREEN_COVERAGE', 0.05))
+app.config['TTA_VIEWS'] = int(os.environ.get('TTA_VIEWS', 5))
+app.config['TTA_SEED'] = int(os.environ.get('TTA_SEED', 42))
+app.config['TTA_CONFIDENCE_THRESHOLD'] = float(os.environ.get('TTA_CONFIDENCE_THRESHOLD', 0.95))
+app.config['TTA_MARGIN_THRESHOLD'] = float(os.environ.get('TTA_MARGIN_THRESHOLD', 0.5))
+app.config['INFERENCE_BACKEND'] = os.environ.get('INFERENCE_BACKEND', 'keras')
+app.config['MODEL_PATH'] = os.environ.get('MODEL_PATH', 'best_model.h5')  # Keras model for the keras backend
+app.config['MODEL_REGISTRY'] = os.environ.get('MODEL_REGISTRY', 'model_registry.json')  # Crop-specialised models
+app.config['MODEL_REGISTRY_MEMORY_MB'] = float(os.environ.get('MODEL_REGISTRY_MEMORY_MB', 1024))
+app.config['EMBEDDING_STORE_DIR'] = os.environ.get('EMBEDDING_STORE_DIR', 'similar_cases')  # Empty disables similar cases
+app.config['EMBEDDING_INDEX_LISTS'] = int(os.environ.get('EMBEDDING_INDEX_LISTS', 1024))
+app.config['EMBEDDING_INDEX_PROBES'] = int(os.environ.get('EMBEDDING_INDEX_PROBES', 16))
+app.config['SIMILAR_CASES_MAX_K'] = int(os.environ.get('SIMILAR_CASES_MAX_K', 50))
+app.config['HEATMAP_CACHE_SIZE'] = int(os.environ.get('HEATMAP_CACHE_SIZE', 1024))
+app.config['HEATMAP_CACHE_DB'] = os.environ.get('HEATMAP_CACHE_DB', '')  # Optional SQLite tier
+app.config['HEATMAP_MAX_CONCURRENT'] = int(os.environ.get('HEATMAP_MAX_CONCURRENT', 2))  # 0 disables heatmaps
+app.config['CASCADE_SCREENING_MODEL'] = os.environ.get('CASCADE_SCREENING_MODEL', '')  # e.g. the 224x224 basic model
+app.config['CASCADE_SCREENING_BACKEND'] = os.environ.get('CASCADE_SCREENING_BACKEND', '')  # Empty picks keras/tflite by file extension
+app.config['CASCADE_CONFIDENCE_THRESHOLD'] = float(os.environ.get('CASCADE_CONFIDENCE_THRESHOLD', 0.8))
+app.config['CASCADE_ESCALATION_SEVERITIES'] = tuple(
+    severity.strip() for severity in os.environ.get('CASCADE_ESCALATION_SEVERITIES', 'High,Critical').split(',') if severity.strip()
+)
+app.config['INFERENCE_BATCH_BUCKETS'] = tuple(
+    int(size) for size in os.environ.get('INFERENCE_BATCH_BUCKETS', '1,2,4,8,16,32,64').split(',') if size.strip()
+)
+app.config['INFERENCE_WARMUP'] = os.environ.get('INFERENCE_WARMUP', 'true').lower() == 'true'
+app.config['TFLITE_MODEL_PATH'] = os.environ.get('TFLITE_MODEL_PATH', 'best_model_float16.tflite')
+app.config['TFLITE_NUM_THREADS'] = int(os.environ['TFLITE_NUM_THREADS']) if os.environ.get('TFLITE_NUM_THREADS') else None
+app.config['INFERENCE_SOCKET'] = os.environ.get('INFERENCE_SOCKET', '/tmp/krishivannai-inference.sock')
+app.config['INFERENCE_AUTHKEY'] = os.environ.get('INFERENCE_AUTHKEY', '')
+app.config['INFERENCE_CONNECT_TIMEOUT'] = float(os.environ.get('INFERENCE_CONNECT_TIMEOUT', 120))
+app.config['INFERENCE_CALL_TIMEOUT'] = float(os.environ.get('INFERENCE_CALL_TIMEOUT', 60))  # 0 waits forever
+app.config['MODEL_LOADING_RETRY_AFTER'] = int(os.environ.get('MODEL_LOADING_RETRY_AFTER', 5))  # Seconds
 
 # Global error handler for 500 errors only
+# Routes that take many images (or a video) in one request, under MAX_BATCH_UPLOAD_BYTES
+BATCH_UPLOAD_ENDPOINTS = ('batch_predict', 'video_predict', 'tensor_predict')
+
+@app.before_request
+def limit_upload_size():
+    """Reject a declared body over the route's limit before any of it is read"""
+    if request.content_length is None:
+        return None
+    if request.endpoint in BATCH_UPLOAD_ENDPOINTS:
+        limit, setting = app.config['MAX_BATCH_UPLOAD_BYTES'], 'MAX_BATCH_UPLOAD_MB'
+    else:
+        limit, setting = app.config['MAX_UPLOAD_BYTES'], 'MAX_UPLOAD_MB'
+    if request.content_length > limit:
+        return jsonify({
+            'success': False,
+            'error': f'Request too large: {request.content_length / 1024 / 1024:.1f} MB, the limit is '
+                     f'{limit / 1024 / 1024:g} MB ({setting})'
+        }), 413
+    return None
+
+@app.errorhandler(413)
+def handle_request_too_large(e):
+    """Handle bodies over MAX_CONTENT_LENGTH found while parsing"""
+    return jsonify({
+        'success': False,
+        'error': f"Request too large, the limit is {app.config['MAX_CONTENT_LENGTH'] / 1024 / 1024:g} MB"
+    }), 413
+
 @app.errorhandler(500)
 def handle_internal_error(e):
     """Handle internal server errors"""
@@ -48,74 +163,522 @@ def favicon():
 # Create uploads directory if it doesn't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Re-uploaded images are answered from the cache instead of the model
+prediction_cache = PredictionCache(
+    max_entries=app.config['PREDICTION_CACHE_SIZE'],
+    db_path=app.config['PREDICTION_CACHE_DB'] or None,
+    max_disk_entries=app.config['PREDICTION_CACHE_DISK_MAX_ENTRIES']
+)
+
+# Explanation heatmaps by image hash; computed only when asked for, and by at most
+# HEATMAP_MAX_CONCURRENT requests at once (others are answered without one)
+heatmap_cache = PredictionCache(
+    max_entries=app.config['HEATMAP_CACHE_SIZE'],
+    db_path=app.config['HEATMAP_CACHE_DB'] or None,
+    max_disk_entries=app.config['PREDICTION_CACHE_DISK_MAX_ENTRIES']
+)
+heatmap_slots = threading.BoundedSemaphore(max(1, app.config['HEATMAP_MAX_CONCURRENT']))
+heatmap_counts = {'computed': 0, 'cached': 0, 'busy': 0, 'unavailable': 0}
+heatmap_counts_lock = threading.Lock()
+
+# Blurry, badly exposed or leafless uploads are flagged (or turned away) before the model
+quality_gate = QualityGate(
+    mode=app.config['QUALITY_GATE'],
+    min_sharpness=app.config['QUALITY_MIN_SHARPNESS'],
+    min_brightness=app.config['QUALITY_MIN_BRIGHTNESS'],
+    max_brightness=app.config['QUALITY_MAX_BRIGHTNESS'],
+    max_clipped_fraction=app.config['QUALITY_MAX_CLIPPED_FRACTION'],
+    min_green_coverage=app.config['QUALITY_MIN_GREEN_COVERAGE']
+)
+
 # Initialize the advanced predictor
 predictor = None
+batch_scheduler = None
+
+# Confirmed cases searched by embedding, opened once the model is loaded
+embedding_index = None
+embedding_index_error = None
+
+# Background model loading state, reported by the health endpoints
+model_load_lock = threading.Lock()
+model_load_thread = None
+model_load_state = {
+    'status': 'not_started',  # not_started, loading, ready, failed
+    'attempts': 0,
+    'started_at': None,
+    'ready_at': None,
+    'duration_ms': None,
+    'error': None,
+    'timeline': []
+}
+
+def record_model_load_event(event, **details):
+    """Append an event to the model load timeline"""
+    started_at = model_load_state['started_at']
+    elapsed_ms = round((time.time() - started_at) * 1000.0, 3) if started_at else 0.0
+    model_load_state['timeline'].append({'event': event, 'elapsed_ms': elapsed_ms, **details})
+    logger.info(f"Model load: {event} (+{elapsed_ms:.0f} ms)")
+
+def get_backend_options(backend):
+    """Options for create_backend from the service config: TFLite threads, or how to reach the inference process"""
+    if backend == 'tflite':
+        return {'num_threads': app.config['TFLITE_NUM_THREADS']}
+    if backend == 'remote':
+        return {
+            'authkey': app.config['INFERENCE_AUTHKEY'],
+            'connect_timeout': app.config['INFERENCE_CONNECT_TIMEOUT'],
+            'call_timeout': app.config['INFERENCE_CALL_TIMEOUT']
+        }
+    return {}
 
 def initialize_predictor():
     """Initialize predictor with better error handling"""
-    global predictor
+    global predictor, batch_scheduler
+    model_load_state.update({
+        'status': 'loading',
+        'attempts': model_load_state['attempts'] + 1,
+        'started_at': time.time(),
+        'ready_at': None,
+        'duration_ms': None,
+        'error': None,
+        'timeline': []
+    })
+    record_model_load_event('started', backend=app.config['INFERENCE_BACKEND'])
     try:
-        # Check if model files exist
-        if not os.path.exists('best_model.h5'):
-            logger.error("No model files found. Please ensure best_model.h5 is available.")
+        # Thread pools are sized before TensorFlow starts (the first load in this process);
+        # with the remote backend TensorFlow runs in the inference process instead
+        if app.config['INFERENCE_BACKEND'] != 'remote':
+            configure_tensorflow_threads(app.config['TF_INTRA_OP_THREADS'], app.config['TF_INTER_OP_THREADS'])
+        
+        # The Keras .h5 model stays the fallback for the other backends
+        backend = app.config['INFERENCE_BACKEND']
+        backend_options = get_backend_options(backend)
+        model_path = app.config['MODEL_PATH']
+        if backend == 'tflite':
+            model_path = app.config['TFLITE_MODEL_PATH']
+        elif backend == 'remote':
+            # Forward passes go to the shared inference process (inference_server.py)
+            model_path = app.config['INFERENCE_SOCKET']
+        screening_backend = app.config['CASCADE_SCREENING_BACKEND'] or None
+        
+        # Check the file the selected backend opens; the remote backend opens none, it waits for the server
+        if backend != 'remote' and not os.path.exists(model_path) and not os.path.exists('best_model.h5'):
+            logger.error(f"No model files found. Please ensure {model_path} (or the fallback best_model.h5) is available.")
+            model_load_state['status'] = 'failed'
+            model_load_state['error'] = f'No model files found ({model_path} or best_model.h5)'
+            record_model_load_event('failed', error=model_load_state['error'])
             return False
         
-        predictor = AdvancedPlantDiseasePredictor(model_path='best_model.h5', class_names_path='class_names.txt', fallback_model='best_model.h5')
+        predictor = AdvancedPlantDiseasePredictor(
+            model_path=model_path,
+            class_names_path='class_names.txt',
+            fallback_model='best_model.h5',
+            tta_views=app.config['TTA_VIEWS'],
+            tta_seed=app.config['TTA_SEED'],
+            tta_confidence_threshold=app.config['TTA_CONFIDENCE_THRESHOLD'],
+            tta_margin_threshold=app.config['TTA_MARGIN_THRESHOLD'],
+            screening_model_path=app.config['CASCADE_SCREENING_MODEL'] or None,
+            cascade_confidence_threshold=app.config['CASCADE_CONFIDENCE_THRESHOLD'],
+            escalation_severities=app.config['CASCADE_ESCALATION_SEVERITIES'],
+            screening_backend_name=screening_backend,
+            screening_backend_options=get_backend_options(screening_backend) if screening_backend else None,
+            backend=backend,
+            backend_options=backend_options,
+            batch_buckets=app.config['INFERENCE_BATCH_BUCKETS'],
+            warmup=app.config['INFERENCE_WARMUP']
+        )
         logger.info("✅ Advanced predictor initialized successfully")
+        record_model_load_event('model_loaded', model_type=predictor.model_type, **predictor.load_timings)
+        
+        # Coalesce concurrent /predict calls into shared forward passes
+        if batch_scheduler is not None:
+            batch_scheduler.shutdown()
+        batch_scheduler = MicroBatchScheduler(
+            predictor,
+            max_batch_size=app.config['MICRO_BATCH_MAX_SIZE'],
+            max_wait_ms=app.config['MICRO_BATCH_MAX_WAIT_MS'],
+            num_workers=app.config['MICRO_BATCH_WORKERS'],
+            max_queue_size=app.config['INFERENCE_QUEUE_SIZE']
+        )
+        batch_scheduler.start()
+        
+        open_embedding_index()
+        
+        model_load_state['status'] = 'ready'
+        model_load_state['ready_at'] = time.time()
+        model_load_state['duration_ms'] = round((model_load_state['ready_at'] - model_load_state['started_at']) * 1000.0, 3)
+        record_model_load_event('ready')
         return True
     except Exception as e:
         logger.error(f"❌ Failed to initialize advanced predictor: {e}")
         logger.error(traceback.format_exc())
+        model_load_state['status'] = 'failed'
+        model_load_state['error'] = str(e)
+        record_model_load_event('failed', error=str(e))
+        return False
+
+def open_embedding_index():
+    """
+    Open the similar-case store for the loaded model; failures only disable similar-case search
+    
+    Returns:
+        bool: True if the store is open
+    """
+    global embedding_index, embedding_index_error
+    
+    if embedding_index is not None:
+        embedding_index.close()
+    embedding_index = None
+    embedding_index_error = None
+    
+    if not app.config['EMBEDDING_STORE_DIR']:
+        embedding_index_error = 'Similar-case search is disabled (EMBEDDING_STORE_DIR is empty)'
         return False
+    if not predictor.supports_embeddings:
+        embedding_index_error = f"The {predictor.embedding_backend.name} backend cannot return embeddings"
+        return False
+    
+    try:
+        embedding_index = EmbeddingIndex(
+            app.config['EMBEDDING_STORE_DIR'],
+            predictor.get_embedding_dim(),
+            model_id=predictor.embedding_fingerprint,
+            num_lists=app.config['EMBEDDING_INDEX_LISTS'],
+            num_probes=app.config['EMBEDDING_INDEX_PROBES']
+        )
+        logger.info(f"🔎 Similar-case store opened with {len(embedding_index)} cases")
+        record_model_load_event('embedding_index_opened', cases=len(embedding_index))
+        return True
+    except Exception as e:
+        logger.error(f"Similar-case search unavailable: {e}")
+        embedding_index_error = str(e)
+        return False
+
+def load_registry_predictor(model_id, spec):
+    """Load a crop-specialised model from its registry spec, with the service's TTA and batching settings"""
+    model_path = spec['model_path']
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file {model_path} for '{model_id}' not found")
+    return AdvancedPlantDiseasePredictor(
+        model_path=model_path,
+        class_names_path=spec.get('class_names_path', 'class_names.txt'),
+        fallback_model=model_path,  # Never fall back to the general model silently
+        tta_views=app.config['TTA_VIEWS'],
+        tta_seed=app.config['TTA_SEED'],
+        tta_confidence_threshold=app.config['TTA_CONFIDENCE_THRESHOLD'],
+        tta_margin_threshold=app.config['TTA_MARGIN_THRESHOLD'],
+        backend=spec.get('backend', 'tflite' if model_path.endswith('.tflite') else 'keras'),
+        backend_options=spec.get('backend_options'),
+        batch_buckets=app.config['INFERENCE_BATCH_BUCKETS'],
+        warmup=app.config['INFERENCE_WARMUP']
+    )
+
+def make_registry_scheduler(model):
+    """Micro-batching for a registry model; one worker, the general model keeps the rest"""
+    scheduler = MicroBatchScheduler(
+        model,
+        max_batch_size=app.config['MICRO_BATCH_MAX_SIZE'],
+        max_wait_ms=app.config['MICRO_BATCH_MAX_WAIT_MS'],
+        max_queue_size=app.config['INFERENCE_QUEUE_SIZE']
+    )
+    scheduler.start()
+    return scheduler
+
+# Crop-specialised models next to the general one, loaded on first use
+model_registry = ModelRegistry(
+    load_registry_specs(app.config['MODEL_REGISTRY']),
+    load_registry_predictor,
+    make_scheduler=make_registry_scheduler,
+    memory_budget_mb=app.config['MODEL_REGISTRY_MEMORY_MB']
+)
+
+def get_requested_model(form):
+    """
+    Registry model ID asked for by the `model` or `crop` form field
+    
+    Returns:
+        str: Model ID, or None for the general model
+    """
+    model_id = form.get('model')
+    if model_id:
+        if model_id not in model_registry.specs:
+            raise UnknownModelError(model_id)
+        return model_id
+    return model_registry.model_for_crop(form.get('crop'))
+
+@contextmanager
+def served_model(model_id):
+    """
+    The predictor and scheduler answering a request
+    
+    Yields:
+        tuple: (predictor, scheduler); the general model for None, otherwise a leased registry model
+    """
+    if model_id is None:
+        yield predictor, batch_scheduler
+        return
+    with model_registry.lease(model_id) as (model, scheduler):
+        yield model, scheduler
+
+def start_predictor_loading():
+    """
+    Load the predictor in a background thread so the server can bind immediately
+    
+    Returns:
+        bool: True if a load was started, False if one is already running
+    """
+    global model_load_thread
+    with model_load_lock:
+        if model_load_thread is not None and model_load_thread.is_alive():
+            return False
+        model_load_state['status'] = 'loading'
+        model_load_thread = threading.Thread(target=initialize_predictor, name='model-loader', daemon=True)
+        model_load_thread.start()
+        return True
+
+def is_predictor_ready():
+    """Check whether predictions can be served"""
+    return predictor is not None and batch_scheduler is not None and model_load_state['status'] == 'ready'
+
+def predictor_unavailable_response():
+    """Fast 503 while the model is loading; a failed load is retried in the background"""
+    if model_load_state['status'] in ('failed', 'not_started'):
+        start_predictor_loading()
+    
+    response = jsonify({
+        'success': False,
+        'error': 'Prediction service is starting up. Model not loaded yet.',
+        'model_status': model_load_state['status']
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(app.config['MODEL_LOADING_RETRY_AFTER'])
+    return response
+
+def server_busy_response():
+    """Fast 429 when the inference queue is full, instead of queueing without bound"""
+    response = jsonify({
+        'success': False,
+        'error': 'Prediction service is busy. Please retry shortly.'
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(app.config['INFERENCE_QUEUE_RETRY_AFTER'])
+    return response
+
+def scheduler_closed_response():
+    """503 for a request that reached a scheduler shut down by a model reload or eviction"""
+    response = jsonify({
+        'success': False,
+        'error': 'The model serving this request was replaced or unloaded. Please retry.'
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(app.config['INFERENCE_QUEUE_RETRY_AFTER'])
+    return response
+
+def get_request_deadline(form, default_ms):
+    """
+    Absolute time.perf_counter() deadline for a request's inference
+    
+    Clients can shorten (never extend) the server default with a deadline_ms
+    form field or an X-Request-Deadline-Ms header. Like the server default,
+    a client value must be positive; others are ignored.
+    
+    Args:
+        form (dict): Request form
+        default_ms (float): Server default in milliseconds, 0 or None for no limit
+        
+    Returns:
+        float: Deadline, or None to wait forever
+    """
+    budgets = [float(default_ms)] if default_ms else []
+    requested = request.headers.get('X-Request-Deadline-Ms') or form.get('deadline_ms')
+    if requested:
+        try:
+            requested_ms = float(requested)
+        except ValueError:
+            requested_ms = None
+        if requested_ms is not None and math.isfinite(requested_ms) and requested_ms > 0:
+            budgets.append(requested_ms)
+        else:
+            logger.warning(f"Ignoring invalid request deadline: {requested!r}")
+    if not budgets:
+        return None
+    return time.perf_counter() + min(budgets) / 1000.0
 
-# Try to initialize predictor
-initialize_predictor()
+def time_left(deadline):
+    """Seconds until a deadline from get_request_deadline, None for no limit"""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.perf_counter())
+
+# Load the predictor in the background; the debug reloader's watcher process
+# never serves requests, so it skips the load (see __main__ below)
+if __name__ != '__main__':
+    start_predictor_loading()
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp'}
 
+# Ways the uploaded image can be echoed back in prediction responses
+IMAGE_ECHO_MODES = ('auto', 'full', 'thumbnail', 'none')
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def process_uploaded_image(file):
+def get_echo_options(form):
     """
-    Process uploaded image and convert to format suitable for prediction
+    Read the image echo mode and thumbnail size from a request form
+    
+    Raises:
+        ValueError: thumbnail_size is not an integer
+    """
+    echo_mode = form.get('image_echo', 'auto').lower()
+    if echo_mode not in IMAGE_ECHO_MODES:
+        echo_mode = 'auto'
+    thumbnail_size = form.get('thumbnail_size')
+    if thumbnail_size:
+        try:
+            thumbnail_size = min(max(int(thumbnail_size), 32), 1024)
+        except ValueError:
+            raise ValueError('thumbnail_size must be an integer')
+    else:
+        thumbnail_size = None
+    return echo_mode, thumbnail_size
+
+# Formats browsers can display as-is, echoed back without re-encoding
+BROWSER_IMAGE_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp',
+    'BMP': 'image/bmp'
+}
+
+def base64_length(num_bytes):
+    """Length of the base64 encoding of num_bytes bytes"""
+    return 4 * ((num_bytes + 2) // 3)
+
+def encode_image_echo(image_bytes, image_format, mode='auto', thumbnail_size=None):
+    """
+    Build the display copy of an upload that is sent back to the client
+    
+    Args:
+        image_bytes (bytes): Encoded upload
+        image_format (str): PIL format name of the upload
+        mode (str): 'full' echoes the upload, 'thumbnail' a small JPEG, 'none' nothing,
+            'auto' the upload if it fits IMAGE_ECHO_MAX_BYTES and a thumbnail otherwise
+        thumbnail_size (int): Longest thumbnail side in pixels
+        
+    Returns:
+        tuple: (data URI or None, echo_info dict with the bytes sent and saved)
+    """
+    thumbnail_size = thumbnail_size or app.config['IMAGE_ECHO_THUMBNAIL_SIZE']
+    mime_type = BROWSER_IMAGE_TYPES.get(image_format)
+    
+    if mode == 'auto':
+        fits_budget = mime_type is not None and len(image_bytes) <= app.config['IMAGE_ECHO_MAX_BYTES']
+        mode = 'full' if fits_budget else 'thumbnail'
+    
+    # What the full echo costs, for the bytes-saved report
+    full_length = base64_length(len(image_bytes)) if mime_type else None
+    
+    data_uri = None
+    if mode == 'full' and mime_type is not None:
+        data_uri = f"data:{mime_type};base64,{base64.b64encode(image_bytes).decode()}"
+    elif mode in ('full', 'thumbnail'):
+        image = Image.open(io.BytesIO(image_bytes))
+        if mode == 'thumbnail':
+            # thumbnail() uses JPEG draft decoding, so large uploads stay cheap
+            image.thumbnail((thumbnail_size, thumbnail_size))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        
+        img_buffer = io.BytesIO()
+        image.save(img_buffer, format='JPEG', quality=80 if mode == 'thumbnail' else 95)
+        data_uri = f"data:image/jpeg;base64,{base64.b64encode(img_buffer.getvalue()).decode()}"
+        if full_length is None and mode == 'full':
+            full_length = len(data_uri.split(',', 1)[1])
+    
+    echoed_length = len(data_uri.split(',', 1)[1]) if data_uri else 0
+    echo_info = {
+        'mode': mode,
+        'bytes': echoed_length,
+        'bytes_saved': max(0, full_length - echoed_length) if full_length is not None else None
+    }
+    return data_uri, echo_info
+
+def read_uploaded_image(file, echo_mode='auto', thumbnail_size=None):
+    """
+    Read an upload and build its display echo without decoding the pixels
     
     Args:
         file: Uploaded file object
+        echo_mode (str): How the upload is echoed back, one of IMAGE_ECHO_MODES
+        thumbnail_size (int): Longest side of a thumbnail echo in pixels
         
     Returns:
-        tuple: (processed_image_array, original_image_base64, image_info)
+        tuple: (image_bytes, original_image_base64 or None, image_info)
     """
-    try:
-        # Read image
-        image = Image.open(file.stream)
-        
-        # Get image info
-        image_info = {
-            'format': image.format,
-            'mode': image.mode,
-            'size': image.size,
-            'filename': file.filename
-        }
+    with stage_timer('read'):
+        image_bytes = file.stream.read()
         
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        # Opening only parses the header
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            image_info = {
+                'format': image.format,
+                'mode': image.mode,
+                'size': image.size,
+                'filename': file.filename
+            }
+    
+    # Echo the upload for display, within the response size budget
+    with stage_timer('echo'):
+        original_image_b64, image_info['echo'] = encode_image_echo(
+            image_bytes, image_info['format'], mode=echo_mode, thumbnail_size=thumbnail_size
+        )
+    
+    return image_bytes, original_image_b64, image_info
+
+def decode_uploaded_image(image_bytes, enhance=False, model=None):
+    """
+    Decode an upload into a model-sized array
+    
+    Args:
+        image_bytes (bytes): Encoded upload
+        enhance (bool): Whether to apply image enhancement
+        model (AdvancedPlantDiseasePredictor): Predictor whose input size is used, the general one by default
         
-        # Save original image as base64 for display
-        img_buffer = io.BytesIO()
-        image.save(img_buffer, format='JPEG', quality=95)
-        img_str = base64.b64encode(img_buffer.getvalue()).decode()
-        original_image_b64 = f"data:image/jpeg;base64,{img_str}"
+    Returns:
+        np.array: uint8 array of shape (IMG_HEIGHT, IMG_WIDTH, 3); the backend scales it
+    """
+    model = model or predictor
+    if model is None:
+        raise RuntimeError('Predictor not available')
+    
+    # Decode at reduced scale, orient, resize and enhance
+    resized_image, _ = model.load_image(io.BytesIO(image_bytes), enhance=enhance)
+    
+    with stage_timer('to_array', enhance=enhance):
+        image_array = np.asarray(resized_image)
+    
+    return image_array
+
+def process_uploaded_image(file, enhance=False, echo_mode='auto', thumbnail_size=None):
+    """
+    Process uploaded image and convert to format suitable for prediction
+    
+    Args:
+        file: Uploaded file object
+        enhance (bool): Whether to apply image enhancement
+        echo_mode (str): How the upload is echoed back, one of IMAGE_ECHO_MODES
+        thumbnail_size (int): Longest side of a thumbnail echo in pixels
         
-        # Resize for prediction based on model type
-        target_size = (predictor.IMG_WIDTH, predictor.IMG_HEIGHT) if predictor else (224, 224)
-        resized_image = image.resize(target_size, Image.Resampling.LANCZOS)
-        image_array = np.array(resized_image)
-        image_array = image_array.astype('float32') / 255.0
+    Returns:
+        tuple: (processed_image_array, original_image_base64 or None, image_info)
+    """
+    try:
+        image_bytes, original_image_b64, image_info = read_uploaded_image(file, echo_mode, thumbnail_size)
+        image_array = decode_uploaded_image(image_bytes, enhance=enhance)
         
         return image_array, original_image_b64, image_info
     
@@ -123,18 +686,201 @@ def process_uploaded_image(file):
         print(f"❌ Error processing image: {e}")
         raise
 
+def get_top_n(form, default):
+    """
+    Read the top_n field: predictions returned per image, clamped to 1-10
+    
+    Raises:
+        ValueError: top_n is not an integer
+    """
+    try:
+        return max(1, min(int(form.get('top_n', default)), 10))
+    except ValueError:
+        raise ValueError('top_n must be an integer')
+
+def get_tta_option(form, default='false'):
+    """Read the use_tta form field: True, False or 'adaptive'"""
+    value = form.get('use_tta', default).lower()
+    return 'adaptive' if value == 'adaptive' else value == 'true'
+
+def get_quality_gate_mode(form):
+    """
+    Read the per-request quality gate override
+    
+    Returns:
+        str: One of QUALITY_GATE_MODES, or None to use the server setting
+    """
+    mode = form.get('quality_gate')
+    if mode is None:
+        return None
+    mode = mode.lower()
+    if mode not in QUALITY_GATE_MODES:
+        raise ValueError(f"quality_gate must be one of {', '.join(QUALITY_GATE_MODES)}")
+    return mode
+
+def get_video_number(form, name, default, allow_zero=False):
+    """
+    Read a numeric /video_predict form field that must be finite and positive
+    
+    Args:
+        form: Request form
+        name (str): Field name
+        default (float): Value when the field is absent
+        allow_zero (bool): Also accept 0, for fields where it switches the feature off
+    
+    Returns:
+        float: The field value
+    """
+    try:
+        value = float(form.get(name, default))
+    except ValueError:
+        raise ValueError(f'{name} must be a number')
+    if not math.isfinite(value) or value < 0 or (value == 0 and not allow_zero):
+        raise ValueError(f"{name} must be a {'non-negative' if allow_zero else 'positive'} number")
+    return value
+
+def quality_rejection_error(quality):
+    """Error text for an upload the quality gate turned away"""
+    return 'Image failed the quality check (' + ', '.join(quality['issues']) + '): ' + ' '.join(quality['messages'])
+
+def get_similar_cases_k(form):
+    """
+    Number of similar confirmed cases asked for by the `similar_cases` form field
+    
+    Returns:
+        int: 0 when none are requested
+    """
+    try:
+        k = int(form.get('similar_cases', 0))
+    except ValueError:
+        raise ValueError('similar_cases must be an integer')
+    if not 0 <= k <= app.config['SIMILAR_CASES_MAX_K']:
+        raise ValueError(f"similar_cases must be between 0 and {app.config['SIMILAR_CASES_MAX_K']}")
+    return k
+
+def embedding_request_error(similar_k, tile_options=None, model_id=None):
+    """
+    Why embeddings or similar cases cannot be served for a request
+    
+    Returns:
+        tuple: (error message, status code), or None when they can
+    """
+    if tile_options is not None:
+        return 'Embeddings are not available for tiled predictions', 400
+    if model_id is not None:
+        return 'Embeddings and similar cases come from the general model; omit model and crop', 400
+    if not predictor.supports_embeddings:
+        return f"The {predictor.embedding_backend.name} backend cannot return embeddings", 400
+    if similar_k and embedding_index is None:
+        return f"Similar-case search unavailable: {embedding_index_error}", 503
+    return None
+
+def heatmap_request_error(tile_options=None, model=None):
+    """
+    Why a heatmap cannot be served for a request
+    
+    Returns:
+        tuple: (error message, status code), or None when it can
+    """
+    if app.config['HEATMAP_MAX_CONCURRENT'] <= 0:
+        return 'Heatmaps are disabled (HEATMAP_MAX_CONCURRENT is 0)', 400
+    if tile_options is not None:
+        return 'Tiled predictions already include a per-tile heatmap; omit heatmap', 400
+    model = model or predictor
+    if not model.supports_heatmaps:
+        return f"Heatmaps are not available for the {model.embedding_backend.name} backend and this model", 400
+    return None
+
+def count_heatmap(outcome):
+    """Count a heatmap request as computed, cached, busy (skipped) or unavailable (escalated)"""
+    with heatmap_counts_lock:
+        heatmap_counts[outcome] += 1
+
+def get_tile_options(form):
+    """
+    Read the tiled-mode form fields
+    
+    Returns:
+        dict: predict_tiled options, or None when tiling is off
+    """
+    if form.get('tiled', 'false').lower() != 'true':
+        return None
+    aggregation = form.get('tile_aggregation', app.config['TILE_AGGREGATION']).lower()
+    if aggregation not in TILE_AGGREGATIONS:
+        raise ValueError(f"tile_aggregation must be one of {', '.join(TILE_AGGREGATIONS)}")
+    return {
+        'overlap': min(max(float(form.get('tile_overlap', app.config['TILE_OVERLAP'])), 0.0), 0.9),
+        'max_tiles': max(1, min(int(form.get('max_tiles', app.config['TILE_MAX_TILES'])), app.config['TILE_MAX_TILES'])),
+        'min_std': app.config['TILE_MIN_STD'],
+        'aggregation': aggregation
+    }
+
+def predict_tiled_upload(image_bytes, top_n, use_tta, tile_options, deadline=None, model=None, scheduler=None):
+    """
+    Score a high-resolution upload tile by tile on the shared inference workers
+    
+    Returns:
+        dict: Comprehensive prediction results with a 'tiling' section (grid, heatmap, skipped tiles)
+    """
+    model = model or predictor
+    scheduler = scheduler or batch_scheduler
+    probabilities, tiling = predict_tiled(
+        model, io.BytesIO(image_bytes),
+        batch_size=app.config['TILE_BATCH_SIZE'],
+        use_tta=use_tta,
+        score_batch=lambda batch: scheduler.submit_batch(batch, use_tta=use_tta, timeout=time_left(deadline)),
+        **tile_options
+    )
+    results = model.get_top_predictions(probabilities, top_n)
+    formatted_results = model.format_comprehensive_results(
+        results, use_tta, False, {'tta_applied': tiling['tta_applied_tiles'] > 0, 'tta_mode': tiling['tta_mode']}
+    )
+    formatted_results['tiling'] = tiling
+    return formatted_results
+
+def get_prediction_cache_key(image_bytes, use_tta, enhance_image, top_n, tile_options=None, model=None,
+                             embedding=False, heatmap=False, quality_mode=None):
+    """
+    Cache key for an upload under the loaded model (the general one by default) and the given options;
+    heatmap keys (top_n None) only cover the options that decide the explained class
+    """
+    model = model or predictor
+    options = {}
+    if tile_options is not None:
+        options['tiling'] = tile_options
+    elif not heatmap:
+        # Cache hits skip the quality gate, so a result only answers requests gated the same way
+        options['quality_gate'] = quality_gate.settings(quality_mode)
+    if embedding:
+        options['embedding'] = True
+    if heatmap:
+        options['heatmap'] = True
+    if use_tta == 'adaptive':
+        # The gate thresholds decide which images get TTA
+        options['tta_confidence_threshold'] = model.tta_confidence_threshold
+        options['tta_margin_threshold'] = model.tta_margin_threshold
+    return prediction_cache.make_key(
+        image_bytes,
+        model.model_fingerprint,
+        use_tta=use_tta,
+        enhance_image=enhance_image,
+        top_n=top_n,
+        tta_views=model.tta_views,
+        tta_seed=model.tta_seed,
+        **options
+    )
+
 @app.route('/')
 def index():
     """Enhanced home page"""
     try:
         logger.info(f"Index route accessed. Predictor status: {predictor is not None}")
         
-        if predictor is None:
-            logger.error("Predictor is None - attempting to reinitialize")
-            if not initialize_predictor():
-                model_info = {'model_type': 'unavailable', 'error': 'Failed to initialize predictor'}
-            else:
-                model_info = predictor.get_model_info()
+        if not is_predictor_ready():
+            if model_load_state['status'] in ('failed', 'not_started'):
+                logger.error("Predictor is not loaded - reloading in the background")
+                start_predictor_loading()
+            model_info = {'model_type': 'loading', 'error': 'Model is still loading'}
         else:
             model_info = predictor.get_model_info()
             
@@ -151,13 +897,8 @@ def predict():
     """Handle image upload and advanced prediction"""
     try:
         # Check if predictor is available
-        if not predictor:
-            logger.error("Predictor not available - attempting to reinitialize")
-            if not initialize_predictor():
-                return jsonify({
-                    'success': False,
-                    'error': 'Prediction service unavailable. Model not loaded.'
-                }), 503
+        if not is_predictor_ready():
+            return predictor_unavailable_response()
         
         # Check if file was uploaded
         if 'file' not in request.files:
@@ -183,48 +924,174 @@ def predict():
             }), 400
         
         # Get prediction options from form
-        use_tta = request.form.get('use_tta', 'true').lower() == 'true'
+        use_tta = get_tta_option(request.form, default='true')
         enhance_image = request.form.get('enhance_image', 'true').lower() == 'true'
-        top_n = min(int(request.form.get('top_n', 5)), 10)  # Max 10 predictions
-        
-        # Process image
+        deadline = get_request_deadline(request.form, app.config['REQUEST_DEADLINE_MS'])
         try:
-            image_array, original_image_b64, image_info = process_uploaded_image(file)
-        except Exception as e:
-            logger.error(f"Error processing image: {e}")
-            return jsonify({
-                'success': False,
-                'error': f'Error processing image: {str(e)}'
-            }), 400
+            top_n = get_top_n(request.form, 5)  # Max 10 predictions
+            echo_mode, thumbnail_size = get_echo_options(request.form)
+            tile_options = get_tile_options(request.form)
+            quality_mode = get_quality_gate_mode(request.form)
+            model_id = get_requested_model(request.form)
+            similar_k = get_similar_cases_k(request.form)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except UnknownModelError as e:
+            return jsonify({'success': False, 'error': f"Unknown model {e}; registered: {', '.join(sorted(model_registry.specs))}"}), 400
+        if tile_options is not None:
+            enhance_image = False  # Enhancement is tuned for whole-image inputs, tiles skip it
         
-        # Make prediction
-        try:
-            results = predictor.predict_image_from_array(
-                image_array, 
-                top_n=top_n, 
-                use_tta=use_tta
-            )
+        # The embedding comes from the same forward pass as the prediction
+        return_embedding = request.form.get('return_embedding', 'false').lower() == 'true'
+        want_embedding = return_embedding or similar_k > 0
+        if want_embedding:
+            error = embedding_request_error(similar_k, tile_options, model_id)
+            if error is not None:
+                return jsonify({'success': False, 'error': error[0]}), error[1]
+        
+        want_heatmap = request.form.get('heatmap', 'false').lower() == 'true'
+        
+        # A crop-specialised model (loaded on first use) or the general one answers; stages
+        # timed below are labelled with that model and these options
+        with served_model(model_id) as (active_predictor, active_scheduler), \
+                request_labels(model_type=active_predictor.model_type, tta=use_tta, enhance=enhance_image), \
+                stage_timer('request'), ExitStack() as request_cleanup:
+            if want_heatmap:
+                error = heatmap_request_error(tile_options, active_predictor)
+                if error is not None:
+                    return jsonify({'success': False, 'error': error[0]}), error[1]
             
-            # Add image and processing info to results
-            results['original_image'] = original_image_b64
-            results['image_info'] = image_info
-            results['processing_options'] = {
-                'use_tta': use_tta,
-                'enhance_image': enhance_image,
-                'top_n': top_n
-            }
+            # Process image, skipping the decode when the result is cached
+            quality = None
+            heatmap = None
+            heatmap_error = None
+            try:
+                image_bytes, original_image_b64, image_info = read_uploaded_image(file, echo_mode, thumbnail_size)
+                cache_key = get_prediction_cache_key(image_bytes, use_tta, enhance_image, top_n, tile_options,
+                                                     active_predictor, embedding=want_embedding,
+                                                     quality_mode=quality_mode)
+                with stage_timer('cache_lookup'):
+                    results = prediction_cache.get(cache_key)
+                    if want_heatmap:
+                        heatmap_key = get_prediction_cache_key(image_bytes, use_tta, enhance_image, None,
+                                                               model=active_predictor, heatmap=True)
+                        heatmap = heatmap_cache.get(heatmap_key)
+                
+                # A heatmap comes from the activations of the pass that scores the image, so a
+                # missing one means scoring it again, at most HEATMAP_MAX_CONCURRENT at a time
+                compute_heatmap = want_heatmap and heatmap is None and heatmap_slots.acquire(blocking=False)
+                if compute_heatmap:
+                    request_cleanup.callback(heatmap_slots.release)
+                    results = None
+                elif want_heatmap:
+                    count_heatmap('busy' if heatmap is None else 'cached')
+                if results is None and tile_options is None:
+                    image_array = decode_uploaded_image(image_bytes, enhance=enhance_image, model=active_predictor)
+                    # Tiled photos are judged tile by tile (background skipping), not here
+                    with stage_timer('quality_check'):
+                        quality = quality_gate.check(image_array, use_tta=use_tta, mode=quality_mode)
+            except Exception as e:
+                logger.error(f"Error processing image: {e}")
+                return jsonify({
+                    'success': False,
+                    'error': f'Error processing image: {str(e)}'
+                }), 400
             
-            return jsonify({
-                'success': True,
-                'results': results
-            })
+            if quality is not None and quality['rejected']:
+                return jsonify({
+                    'success': False,
+                    'error': quality_rejection_error(quality),
+                    'quality': quality,
+                    'image_info': image_info
+                }), 422
             
-        except Exception as e:
-            logger.error(f"Error making prediction: {e}")
-            return jsonify({
-                'success': False,
-                'error': f'Error making prediction: {str(e)}'
-            }), 500
+            # Make prediction
+            try:
+                cached = results is not None
+                if not cached and tile_options is not None:
+                    results = predict_tiled_upload(image_bytes, top_n, use_tta, tile_options, deadline,
+                                                   active_predictor, active_scheduler)
+                    prediction_cache.put(cache_key, results)
+                elif not cached:
+                    started_at = time.perf_counter()
+                    results = active_scheduler.submit(
+                        image_array, 
+                        top_n=top_n, 
+                        use_tta=use_tta,
+                        enhanced_image=enhance_image,
+                        timeout=time_left(deadline),
+                        embedding=want_embedding,
+                        heatmap=compute_heatmap
+                    )
+                    quality_gate.record_inference(time.perf_counter() - started_at, 1, use_tta)
+                    if quality is not None:
+                        results['quality'] = quality
+                    if want_embedding:
+                        results['embedding'] = encode_embedding(results['embedding'])
+                    if compute_heatmap:
+                        # Cached separately, so predictions without a heatmap stay small
+                        heatmap = results.pop('heatmap')
+                        heatmap_error = results.pop('heatmap_error', None)
+                        if heatmap is not None:
+                            heatmap_cache.put(heatmap_key, heatmap)
+                        count_heatmap('computed' if heatmap is not None else 'unavailable')
+                    prediction_cache.put(cache_key, results)
+                
+                # Stored cases change, so the search runs even for cached predictions
+                if similar_k:
+                    with stage_timer('similar_cases'):
+                        results['similar_cases'] = embedding_index.search_cases(
+                            decode_embedding(results['embedding']), similar_k
+                        )
+                if not return_embedding:
+                    results.pop('embedding', None)
+                if want_heatmap:
+                    results['heatmap'] = heatmap
+                    if heatmap_error is not None:
+                        results['heatmap_status'] = 'unavailable'
+                        results['heatmap_error'] = heatmap_error
+                    else:
+                        results['heatmap_status'] = 'computed' if compute_heatmap else 'cached' if heatmap else 'busy'
+            
+                # Add image and processing info to results
+                if original_image_b64 is not None:
+                    results['original_image'] = original_image_b64
+                results['image_info'] = image_info
+                results['cached'] = cached
+                results['processing_options'] = {
+                    'use_tta': use_tta,
+                    'enhance_image': enhance_image,
+                    'top_n': top_n,
+                    'image_echo': echo_mode,
+                    'tiled': tile_options is not None,
+                    'model': model_id or 'general',
+                    'similar_cases': similar_k,
+                    'heatmap': want_heatmap
+                }
+            
+                with stage_timer('serialize'):
+                    response = jsonify({
+                        'success': True,
+                        'results': results
+                    })
+                return response
+            
+            except QueueFullError:
+                logger.warning("Inference queue full - rejecting /predict with 429")
+                return server_busy_response()
+            except SchedulerClosedError:
+                return scheduler_closed_response()
+            except TimeoutError:
+                return jsonify({
+                    'success': False,
+                    'error': 'Prediction did not finish before the request deadline'
+                }), 504
+            except Exception as e:
+                logger.error(f"Error making prediction: {e}")
+                return jsonify({
+                    'success': False,
+                    'error': f'Error making prediction: {str(e)}'
+                }), 500
     
     except Exception as e:
         logger.error(f"Unexpected error in predict: {e}")
@@ -233,76 +1100,732 @@ def predict():
             'error': f'Unexpected error: {str(e)}'
         }), 500
 
+def load_batch_item(file, top_n, use_tta, enhance_image, echo_mode, thumbnail_size, quality_mode=None):
+    """
+    Read one batch upload, answering from the cache or decoding and quality-checking it for the model
+    
+    Returns:
+        tuple: (cache_key, cached_results or None, image_array or None, quality report or None,
+            original_image_base64, image_info)
+    """
+    # Runs in a decode worker thread, which doesn't see the request's labels
+    with request_labels(model_type=predictor.model_type, tta=use_tta, enhance=enhance_image):
+        image_bytes, original_image_b64, image_info = read_uploaded_image(file, echo_mode, thumbnail_size)
+        cache_key = get_prediction_cache_key(image_bytes, use_tta, enhance_image, top_n, quality_mode=quality_mode)
+        with stage_timer('cache_lookup'):
+            cached_results = prediction_cache.get(cache_key)
+        
+        image_array = None
+        quality = None
+        if cached_results is None:
+            image_array = predictor.prepare_image_array(decode_uploaded_image(image_bytes, enhance=enhance_image))
+            with stage_timer('quality_check'):
+                quality = quality_gate.check(image_array, use_tta=use_tta, mode=quality_mode)
+    
+    return cache_key, cached_results, image_array, quality, original_image_b64, image_info
+
+def iter_batch_predictions(files, top_n=3, use_tta=False, enhance_image=False, echo_mode='auto', thumbnail_size=None,
+                           deadline=None, quality_mode=None):
+    """
+    Score uploaded files in chunked model batches, yielding one result per file
+    
+    Files are decoded and resized in a thread pool; the next chunk is decoded
+    while the current one is on the model. Cached files skip both steps.
+    Chunks are scored by the shared inference workers, so batch and single
+    requests share one bounded queue. Closing the generator (the client went
+    away) cancels decodes that have not started.
+    
+    Args:
+        files (list): Uploaded file objects
+        top_n (int): Number of top predictions per file
+        use_tta (bool or str): Whether to use test-time augmentation, or 'adaptive'
+        enhance_image (bool): Whether to apply image enhancement
+        echo_mode (str): How each upload is echoed back, one of IMAGE_ECHO_MODES
+        thumbnail_size (int): Longest side of a thumbnail echo in pixels
+        deadline (float): time.perf_counter() deadline for the whole batch, None for no limit
+        quality_mode (str): Per-request quality gate mode, None for the server setting
+        
+    Yields:
+        dict: Per-file prediction (or error) records, in upload order
+    """
+    chunk_size = max(1, app.config['BATCH_CHUNK_SIZE'])
+    chunks = [list(enumerate(files))[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+    chunk_timeout = app.config['REQUEST_DEADLINE_MS'] / 1000.0 if app.config['REQUEST_DEADLINE_MS'] else None
+    
+    with ThreadPoolExecutor(max_workers=max(1, app.config['BATCH_DECODE_WORKERS'])) as executor:
+        def submit_chunk(chunk):
+            return [
+                (index, file, executor.submit(load_batch_item, file, top_n, use_tta, enhance_image, echo_mode,
+                                              thumbnail_size, quality_mode))
+                for index, file in chunk
+            ]
+        
+        try:
+            pending = submit_chunk(chunks[0]) if chunks else []
+            for chunk_index in range(len(chunks)):
+                if time_left(deadline) == 0.0:
+                    raise TimeoutError('Batch did not finish before the request deadline')
+                current = pending
+                # Prefetch: decode the next chunk while this one is being scored
+                pending = submit_chunk(chunks[chunk_index + 1]) if chunk_index + 1 < len(chunks) else []
+                
+                records = []
+                to_score = []
+                for index, file, future in current:
+                    try:
+                        cache_key, cached_results, image_array, quality, original_image_b64, image_info = future.result()
+                    except Exception as e:
+                        records.append({
+                            'index': index,
+                            'error': f'Failed to process {file.filename}: {str(e)}',
+                            'filename': file.filename
+                        })
+                        continue
+                    
+                    if quality is not None and quality['rejected']:
+                        records.append({
+                            'index': index,
+                            'error': quality_rejection_error(quality),
+                            'filename': file.filename,
+                            'quality': quality
+                        })
+                        continue
+                    
+                    record = cached_results if cached_results is not None else {}
+                    record['index'] = index
+                    if original_image_b64 is not None:
+                        record['original_image'] = original_image_b64
+                    record['image_info'] = image_info
+                    record['cached'] = cached_results is not None
+                    records.append(record)
+                    if cached_results is None:
+                        to_score.append((record, cache_key, image_array, quality))
+                
+                if to_score:
+                    try:
+                        image_batch = np.concatenate([item[2] for item in to_score])
+                        # Each chunk waits at most the server deadline, and never past the batch's own
+                        budgets = [t for t in (time_left(deadline), chunk_timeout) if t is not None]
+                        started_at = time.perf_counter()
+                        predictions, details = batch_scheduler.submit_batch(
+                            image_batch, use_tta=use_tta, timeout=min(budgets) if budgets else None
+                        )
+                        quality_gate.record_inference(time.perf_counter() - started_at, len(to_score), use_tta)
+                        for (record, cache_key, _, quality), item_predictions, item_details in zip(to_score, predictions, details):
+                            results = predictor.get_top_predictions(item_predictions, top_n)
+                            prediction = predictor.format_comprehensive_results(results, use_tta, enhance_image, item_details)
+                            if quality is not None:
+                                prediction['quality'] = quality
+                            prediction_cache.put(cache_key, prediction)
+                            record.update(prediction)
+                    except Exception as e:
+                        for record, _, _, _ in to_score:
+                            index, filename = record['index'], record['image_info']['filename']
+                            record.clear()
+                            record.update({
+                                'index': index,
+                                'error': f'Failed to process {filename}: {str(e)}',
+                                'filename': filename
+                            })
+                
+                yield from records
+        finally:
+            # Drop queued decodes if the client disconnected or the deadline passed
+            executor.shutdown(wait=False, cancel_futures=True)
+
 @app.route('/batch_predict', methods=['POST'])
 def batch_predict():
-    """Handle batch prediction for multiple images"""
+    """
+    Handle batch prediction for multiple images
+    
+    Results are streamed as newline-delimited JSON: one line per file as soon
+    as its chunk has been scored, followed by a summary line with "done": true.
+    """
     try:
-        if not predictor:
-            return jsonify({'error': 'Prediction service unavailable'}), 503
+        if not is_predictor_ready():
+            return predictor_unavailable_response()
+        if batch_scheduler.is_saturated():
+            return server_busy_response()
         
         files = request.files.getlist('files')
         if not files or len(files) == 0:
             return jsonify({'error': 'No files uploaded'}), 400
         
-        if len(files) > 10:  # Limit batch size
-            return jsonify({'error': 'Maximum 10 files allowed in batch mode'}), 400
+        max_files = app.config['BATCH_MAX_FILES']
+        if len(files) > max_files:  # Limit batch size
+            return jsonify({'error': f'Maximum {max_files} files allowed in batch mode'}), 400
         
-        results = []
-        use_tta = request.form.get('use_tta', 'false').lower() == 'true'  # Disabled by default for batch
+        # Uploaded files are closed when the view returns, so keep their
+        # (still compressed) bytes for the streaming generator
+        files = [
+            FileStorage(io.BytesIO(file.read()), filename=file.filename)
+            for file in files
+            if file.filename != '' and allowed_file(file.filename)
+        ]
+        use_tta = get_tta_option(request.form, default='false')  # Disabled by default for batch
+        enhance_image = request.form.get('enhance_image', 'false').lower() == 'true'
+        # Only a client-set deadline bounds the whole stream; chunks are bounded by REQUEST_DEADLINE_MS
+        deadline = get_request_deadline(request.form, None)
+        try:
+            top_n = get_top_n(request.form, 3)
+            echo_mode, thumbnail_size = get_echo_options(request.form)
+            quality_mode = get_quality_gate_mode(request.form)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        for file in files:
-            if file.filename == '' or not allowed_file(file.filename):
-                continue
-            
+    except Exception as e:
+        return jsonify({'error': f'Batch prediction failed: {str(e)}'}), 500
+    
+    def generate():
+        started_at = time.perf_counter()
+        processed_count = 0
+        failed_count = 0
+        quality_rejected_count = 0
+        bytes_saved = 0
+        try:
+            with request_labels(model_type=predictor.model_type, tta=use_tta, enhance=enhance_image):
+                for record in iter_batch_predictions(
+                    files, top_n=top_n, use_tta=use_tta, enhance_image=enhance_image,
+                    echo_mode=echo_mode, thumbnail_size=thumbnail_size, deadline=deadline, quality_mode=quality_mode
+                ):
+                    if 'error' in record:
+                        failed_count += 1
+                        if record.get('quality'):
+                            quality_rejected_count += 1
+                    else:
+                        processed_count += 1
+                        bytes_saved += record['image_info']['echo']['bytes_saved'] or 0
+                    with stage_timer('serialize'):
+                        line = json.dumps(record) + '\n'
+                    yield line
+        except Exception as e:
+            logger.error(f"Batch prediction failed: {e}")
+            yield json.dumps({'done': True, 'success': False, 'error': f'Batch prediction failed: {str(e)}'}) + '\n'
+            return
+        
+        elapsed = time.perf_counter() - started_at
+        yield json.dumps({
+            'done': True,
+            'success': True,
+            'processed_count': processed_count,
+            'failed_count': failed_count,
+            'quality_rejected_count': quality_rejected_count,
+            'elapsed_seconds': round(elapsed, 3),
+            'images_per_second': round(processed_count / elapsed, 2) if elapsed > 0 else 0.0,
+            'image_echo_bytes_saved': bytes_saved
+        }) + '\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'X-Accel-Buffering': 'no'}  # Keep reverse proxies from buffering the stream
+    )
+
+@app.route('/video_predict', methods=['POST'])
+def video_predict():
+    """
+    Disease timeline for a walk-through video or an ordered frame sequence
+    
+    Accepts either one `video` file or several `frames` images in capture order.
+    Results are streamed as newline-delimited JSON: one line per timeline
+    segment as soon as it closes, followed by a summary line with "done": true.
+    """
+    video_path = None
+    try:
+        if not is_predictor_ready():
+            return predictor_unavailable_response()
+        if batch_scheduler.is_saturated():
+            return server_busy_response()
+        
+        try:
+            # 0 keeps every frame / disables deduplication, as in the server settings
+            sample_fps = get_video_number(request.form, 'sample_fps', app.config['VIDEO_SAMPLE_FPS'], allow_zero=True)
+            dedup_threshold = get_video_number(request.form, 'dedup_threshold', app.config['VIDEO_DEDUP_THRESHOLD'],
+                                               allow_zero=True)
+            frame_rate = get_video_number(request.form, 'frame_rate', 1.0)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        use_tta = get_tta_option(request.form, default='false')
+        max_frames = app.config['VIDEO_MAX_FRAMES']
+        
+        video = request.files.get('video')
+        if video is not None and video.filename != '':
+            if video.filename.rsplit('.', 1)[-1].lower() not in VIDEO_EXTENSIONS:
+                return jsonify({'error': f"Invalid video type. Supported: {', '.join(VIDEO_EXTENSIONS)}"}), 400
+            # OpenCV reads from a path; the upload is copied to disk in chunks, never held whole
+            with tempfile.NamedTemporaryFile(suffix='.' + video.filename.rsplit('.', 1)[-1], delete=False) as f:
+                video_path = f.name
+                video.save(f)
             try:
-                image_array, original_image_b64, image_info = process_uploaded_image(file)
-                prediction = predictor.predict_image_from_array(image_array, top_n=3, use_tta=use_tta)
-                
-                prediction['original_image'] = original_image_b64
-                prediction['image_info'] = image_info
-                results.append(prediction)
+                frames = VideoFrames(video_path, sample_fps=sample_fps, max_frames=max_frames)
+            except ValueError as e:
+                os.remove(video_path)
+                return jsonify({'error': str(e)}), 400
+        else:
+            files = [file for file in request.files.getlist('frames') if file.filename != '' and allowed_file(file.filename)]
+            if not files:
+                return jsonify({'error': 'Upload a video file or an ordered list of frames'}), 400
+            # Keep the (still compressed) frames for the streaming generator, as /batch_predict does
+            files = [FileStorage(io.BytesIO(file.read()), filename=file.filename) for file in files]
+            frames = SequenceFrames(
+                files, frame_rate=frame_rate, max_frames=max_frames,
+                target_size=(predictor.IMG_WIDTH, predictor.IMG_HEIGHT)
+            )
+    
+    except Exception as e:
+        if video_path is not None and os.path.exists(video_path):
+            os.remove(video_path)
+        return jsonify({'error': f'Video prediction failed: {str(e)}'}), 500
+    
+    chunk_timeout = app.config['REQUEST_DEADLINE_MS'] / 1000.0 if app.config['REQUEST_DEADLINE_MS'] else None
+    
+    def generate():
+        started_at = time.perf_counter()
+        stats = {}
+        try:
+            with request_labels(model_type=predictor.model_type, tta=use_tta, enhance=False):
+                for segment in iter_timeline(
+                    predictor, frames,
+                    score_batch=lambda batch: batch_scheduler.submit_batch(batch, use_tta=use_tta, timeout=chunk_timeout),
+                    batch_size=app.config['BATCH_CHUNK_SIZE'],
+                    dedup_threshold=dedup_threshold,
+                    stats=stats
+                ):
+                    yield json.dumps(segment) + '\n'
+        except Exception as e:
+            logger.error(f"Video prediction failed: {e}")
+            yield json.dumps({'done': True, 'success': False, 'error': f'Video prediction failed: {str(e)}'}) + '\n'
+            return
+        finally:
+            if video_path is not None and os.path.exists(video_path):
+                os.remove(video_path)
+        
+        elapsed = time.perf_counter() - started_at
+        yield json.dumps({
+            'done': True,
+            'success': True,
+            'source_fps': round(frames.source_fps, 3),
+            'sample_fps': sample_fps,
+            'frames_read': stats['frames_read'],
+            'frames_sampled': stats['frames_sampled'],
+            'frames_deduplicated': stats['frames_deduplicated'],
+            'frames_scored': stats['frames_scored'],
+            'segments': stats['segments'],
+            'elapsed_seconds': round(elapsed, 3),
+            'frames_per_second': round(stats['frames_read'] / elapsed, 2) if elapsed > 0 else 0.0,
+            'scored_frames_per_second': round(stats['frames_scored'] / stats['inference_seconds'], 2) if stats['inference_seconds'] > 0 else 0.0
+        }) + '\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/tensor_predict', methods=['GET'])
+def tensor_protocol_info():
+    """Describe the tensor frame the loaded model accepts, with the class index order"""
+    if not is_predictor_ready():
+        return predictor_unavailable_response()
+    return jsonify({
+        'request_mime_type': TENSOR_MIME_TYPE,
+        'result_mime_type': RESULT_MIME_TYPE,
+        'header_bytes': REQUEST_HEADER.size,
+        'input_shape': [predictor.IMG_HEIGHT, predictor.IMG_WIDTH, 3],
+        'dtype': 'uint8',
+        'class_names': predictor.class_names,
+        'model_fingerprint': predictor.model_fingerprint
+    })
+
+@app.route('/tensor_predict', methods=['POST'])
+def tensor_predict():
+    """
+    Score raw uint8 RGB tensors sent in the framed format of tensor_protocol.py
+    
+    Options are query parameters (top_n, use_tta, detail=full). The response is
+    a binary result frame when the client accepts RESULT_MIME_TYPE, JSON otherwise.
+    """
+    try:
+        if not is_predictor_ready():
+            return predictor_unavailable_response()
+        if batch_scheduler.is_saturated():
+            return server_busy_response()
+        
+        use_tta = get_tta_option(request.args, default='false')
+        try:
+            top_n = get_top_n(request.args, 3)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        full_detail = request.args.get('detail', 'compact') == 'full'
+        deadline = get_request_deadline(request.args, app.config['REQUEST_DEADLINE_MS'])
+        binary = request.accept_mimetypes.best_match([RESULT_MIME_TYPE, 'application/json']) == RESULT_MIME_TYPE
+        
+        with request_labels(model_type=predictor.model_type, tta=use_tta, enhance=False):
+            with stage_timer('read'):
+                body = request.get_data(cache=False)
+            try:
+                # A view over the request body, handed to the backend as uint8 without a copy
+                tensors = parse_tensor_request(body, predictor.IMG_HEIGHT, predictor.IMG_WIDTH,
+                                               max_count=app.config['BATCH_MAX_FILES'])
+            except TensorFormatError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            
+            # Scored in chunks, like /batch_predict, so one large frame does not hold a worker for its whole length
+            chunk_size = max(1, app.config['BATCH_CHUNK_SIZE'])
+            predictions, details = [], []
+            for start in range(0, len(tensors), chunk_size):
+                if time_left(deadline) == 0.0:
+                    raise TimeoutError('Tensor batch did not finish before the request deadline')
+                chunk_predictions, chunk_details = batch_scheduler.submit_batch(
+                    tensors[start:start + chunk_size], use_tta=use_tta, timeout=time_left(deadline)
+                )
+                predictions.append(chunk_predictions)
+                details.extend(chunk_details)
+            predictions = np.concatenate(predictions)
+            
+            with stage_timer('serialize'):
+                if binary:
+                    return Response(encode_binary_results(predictions, top_n), mimetype=RESULT_MIME_TYPE,
+                                    headers={'X-Model-Fingerprint': predictor.model_fingerprint})
                 
+                results = []
+                for item_predictions, item_details in zip(predictions, details):
+                    top = predictor.get_top_predictions(item_predictions, top_n)
+                    if full_detail:
+                        results.append(predictor.format_comprehensive_results(top, use_tta, False, item_details))
+                    else:
+                        results.append({
+                            'top_prediction': top[0][0],
+                            'confidence': top[0][1],
+                            'predictions': [[class_name, confidence] for class_name, confidence in top]
+                        })
+                return jsonify({'success': True, 'count': len(results), 'results': results})
+    
+    except QueueFullError:
+        return server_busy_response()
+    except SchedulerClosedError:
+        return scheduler_closed_response()
+    except TimeoutError:
+        return jsonify({'success': False, 'error': 'Prediction did not finish before the request deadline'}), 504
+    except Exception as e:
+        logger.error(f"Tensor prediction failed: {e}")
+        return jsonify({'success': False, 'error': f'Tensor prediction failed: {str(e)}'}), 500
+
+@app.route('/cases', methods=['POST'])
+def add_cases():
+    """
+    Store confirmed cases for similar-case search
+    
+    JSON body: {"embedding": <from /predict with return_embedding=true>, "class_name": "...",
+    optional "note" and other details}, or {"cases": [...]} with several of them.
+    """
+    try:
+        if not is_predictor_ready():
+            return predictor_unavailable_response()
+        if embedding_index is None:
+            return jsonify({'success': False, 'error': f"Similar-case search unavailable: {embedding_index_error}"}), 503
+        
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({'success': False, 'error': 'Expected a JSON object'}), 400
+        cases = payload['cases'] if 'cases' in payload else [payload]
+        if not isinstance(cases, list) or not cases:
+            return jsonify({'success': False, 'error': 'cases must be a non-empty list'}), 400
+        
+        embeddings, class_names, metadata = [], [], []
+        try:
+            for case in cases:
+                if not isinstance(case, dict) or 'embedding' not in case:
+                    raise ValueError('Each case needs an embedding')
+                if case.get('class_name') not in predictor.class_names:
+                    raise ValueError(f"Unknown class_name '{case.get('class_name')}'")
+                embedding = decode_embedding(case['embedding'])
+                if embedding.size != embedding_index.dim:
+                    raise ValueError(f"Expected a {embedding_index.dim}-d embedding, got {embedding.size}-d")
+                embeddings.append(embedding)
+                class_names.append(case['class_name'])
+                metadata.append({key: value for key, value in case.items() if key not in ('embedding', 'class_name')})
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        with stage_timer('add_cases'):
+            case_ids = embedding_index.add(np.stack(embeddings), class_names, metadata)
+        return jsonify({'success': True, 'case_ids': case_ids, 'total_cases': len(embedding_index)})
+    
+    except Exception as e:
+        logger.error(f"Adding cases failed: {e}")
+        return jsonify({'success': False, 'error': f'Adding cases failed: {str(e)}'}), 500
+
+@app.route('/similar_cases', methods=['POST'])
+def search_similar_cases():
+    """
+    Most similar confirmed cases for an embedding (JSON {"embedding": ..., "k": 5})
+    or an uploaded image (multipart `file`, optional `k`), scored without TTA
+    """
+    try:
+        if not is_predictor_ready():
+            return predictor_unavailable_response()
+        if embedding_index is None:
+            return jsonify({'success': False, 'error': f"Similar-case search unavailable: {embedding_index_error}"}), 503
+        
+        payload = request.get_json(silent=True) if request.is_json else None
+        options = payload if isinstance(payload, dict) else request.form
+        try:
+            k = get_similar_cases_k({'similar_cases': options.get('k', 5)})
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e).replace('similar_cases', 'k')}), 400
+        
+        query = None
+        if payload is not None:
+            try:
+                embedding = decode_embedding(payload.get('embedding'))
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+        elif 'file' in request.files and request.files['file'].filename:
+            deadline = get_request_deadline(request.form, app.config['REQUEST_DEADLINE_MS'])
+            try:
+                image_bytes, _, _ = read_uploaded_image(request.files['file'], 'none', None)
+                image_array = decode_uploaded_image(image_bytes)
             except Exception as e:
-                results.append({
-                    'error': f'Failed to process {file.filename}: {str(e)}',
-                    'filename': file.filename
-                })
+                return jsonify({'success': False, 'error': f'Error processing image: {str(e)}'}), 400
+            with request_labels(model_type=predictor.model_type, tta=False, enhance=False):
+                results = batch_scheduler.submit(image_array, top_n=1, use_tta=False,
+                                                 timeout=time_left(deadline), embedding=True)
+            embedding = results['embedding']
+            query = {'top_prediction': results['top_prediction'], 'confidence': results['confidence']}
+        else:
+            return jsonify({'success': False, 'error': 'Send a JSON embedding or an image file'}), 400
         
-        return jsonify({
-            'success': True,
-            'results': results,
-            'processed_count': len(results)
-        })
+        if embedding.size != embedding_index.dim:
+            return jsonify({'success': False, 'error': f"Expected a {embedding_index.dim}-d embedding, got {embedding.size}-d"}), 400
         
+        with stage_timer('similar_cases'):
+            matches = embedding_index.search_cases(embedding, k)
+        response = {'success': True, 'similar_cases': matches, 'total_cases': len(embedding_index)}
+        if query is not None:
+            response['query'] = query
+        return jsonify(response)
+    
+    except QueueFullError:
+        return server_busy_response()
+    except SchedulerClosedError:
+        return scheduler_closed_response()
+    except TimeoutError:
+        return jsonify({'success': False, 'error': 'Prediction did not finish before the request deadline'}), 504
     except Exception as e:
-        return jsonify({'error': f'Batch prediction failed: {str(e)}'}), 500
+        logger.error(f"Similar-case search failed: {e}")
+        return jsonify({'success': False, 'error': f'Similar-case search failed: {str(e)}'}), 500
+
+@app.route('/metrics')
+def metrics():
+    """Per-stage latency histograms and service counters in the Prometheus text format"""
+    sections = [STAGE_SECONDS.render()]
+    
+    sections.append(render_metric(
+        'krishivannai_model_ready', 'gauge', 'Whether predictions can be served',
+        [({}, int(is_predictor_ready()))]
+    ))
+    
+    cache_stats = prediction_cache.get_stats()
+    sections.append(render_metric(
+        'krishivannai_prediction_cache_lookups_total', 'counter', 'Prediction cache lookups by outcome',
+        [
+            ({'result': 'memory_hit'}, cache_stats['memory_hits']),
+            ({'result': 'disk_hit'}, cache_stats['disk_hits']),
+            ({'result': 'miss'}, cache_stats['misses'])
+        ]
+    ))
+    
+    quality_stats = quality_gate.get_stats()
+    sections.append(render_metric(
+        'krishivannai_quality_gate_images_total', 'counter', 'Images checked by the quality gate, by outcome',
+        [({'result': result}, quality_stats[result]) for result in ('passed', 'warned', 'rejected')]
+    ))
+    sections.append(render_metric(
+        'krishivannai_quality_gate_issues_total', 'counter', 'Quality issues found, by issue',
+        [({'issue': issue}, count) for issue, count in quality_stats['issues'].items()]
+    ))
+    sections.append(render_metric(
+        'krishivannai_quality_gate_inference_seconds_saved_total', 'counter',
+        'Estimated inference time not spent on rejected images, from measured per-image inference time',
+        [({}, quality_stats['inference_seconds_saved'])]
+    ))
+    
+    if embedding_index is not None:
+        index_stats = embedding_index.get_stats()
+        sections.append(render_metric(
+            'krishivannai_similar_cases_stored', 'gauge', 'Confirmed cases in the similar-case store',
+            [({}, index_stats['vectors'])]
+        ))
+        sections.append(render_metric(
+            'krishivannai_similar_case_searches_total', 'counter', 'Similar-case searches',
+            [({}, index_stats['searches'])]
+        ))
+    
+    with heatmap_counts_lock:
+        heatmap_outcomes = dict(heatmap_counts)
+    sections.append(render_metric(
+        'krishivannai_heatmap_requests_total', 'counter',
+        'Heatmap requests by outcome (computed, cached, busy: skipped at the concurrency limit)',
+        [({'result': outcome}, count) for outcome, count in heatmap_outcomes.items()]
+    ))
+    
+    if model_registry.specs:
+        registry_stats = model_registry.get_stats()
+        sections.append(render_metric(
+            'krishivannai_registry_resident_models', 'gauge', 'Crop-specialised models currently loaded',
+            [({}, len(registry_stats['resident']))]
+        ))
+        sections.append(render_metric(
+            'krishivannai_registry_resident_bytes', 'gauge', 'Estimated memory held by loaded crop-specialised models',
+            [({}, registry_stats['resident_bytes'])]
+        ))
+        sections.append(render_metric(
+            'krishivannai_registry_events_total', 'counter', 'Crop-specialised model lookups, by outcome',
+            [({'event': event}, registry_stats[event]) for event in ('hits', 'loads', 'load_failures', 'evictions')]
+        ))
+    
+    if predictor is not None:
+        tta_stats = predictor.get_tta_stats()
+        sections.append(render_metric(
+            'krishivannai_adaptive_tta_images_total', 'counter', 'Images scored with adaptive TTA, by whether the gate added augmented views',
+            [
+                ({'triggered': True}, tta_stats['adaptive_triggered']),
+                ({'triggered': False}, tta_stats['adaptive_images'] - tta_stats['adaptive_triggered'])
+            ]
+        ))
+        sections.append(render_metric(
+            'krishivannai_adaptive_tta_views_saved_total', 'counter', 'Model views adaptive TTA skipped compared with full TTA',
+            [({}, tta_stats['views_saved'])]
+        ))
+    
+        cascade_stats = predictor.get_cascade_stats()
+        if cascade_stats['enabled']:
+            sections.append(render_metric(
+                'krishivannai_cascade_images_total', 'counter', 'Images scored by the model cascade, by the stage that answered',
+                [
+                    ({'stage': 'screening'}, cascade_stats['images'] - cascade_stats['escalated']),
+                    ({'stage': 'escalated'}, cascade_stats['escalated'])
+                ]
+            ))
+            sections.append(render_metric(
+                'krishivannai_cascade_escalations_total', 'counter', 'Cascade escalations by reason',
+                [({'reason': reason}, count) for reason, count in cascade_stats['escalation_reasons'].items()]
+            ))
+    
+    if batch_scheduler is not None:
+        batch_stats = batch_scheduler.get_stats()
+        sections.append(render_metric(
+            'krishivannai_micro_batches_total', 'counter', 'Forward passes run by the micro-batching scheduler',
+            [({}, batch_stats['total_batches'])]
+        ))
+        sections.append(render_metric(
+            'krishivannai_micro_batch_requests_total', 'counter', 'Requests scored by the micro-batching scheduler',
+            [({}, batch_stats['total_requests'])]
+        ))
+        sections.append(render_metric(
+            'krishivannai_inference_queue_depth', 'gauge', 'Requests waiting for an inference worker',
+            [({}, batch_stats['queue_depth'])]
+        ))
+        sections.append(render_metric(
+            'krishivannai_inference_shed_total', 'counter', 'Requests not scored, by reason',
+            [
+                ({'reason': 'queue_full'}, batch_stats['rejected']),
+                ({'reason': 'expired'}, batch_stats['expired']),
+                ({'reason': 'timed_out'}, batch_stats['timed_out'])
+            ]
+        ))
+    
+    return Response('\n'.join(sections) + '\n', mimetype='text/plain; version=0.0.4')
 
 @app.route('/model_info')
 def model_info():
     """Get detailed model information"""
-    if not predictor:
-        return jsonify({'error': 'Predictor not available'}), 503
+    if not is_predictor_ready():
+        return predictor_unavailable_response()
     
     info = predictor.get_model_info()
     info['classes'] = predictor.class_names[:10]  # First 10 classes
     info['total_classes'] = len(predictor.class_names)
+    info['memory_mb'] = round(predictor.memory_bytes() / 1048576, 2)
+    info['registry'] = model_registry.get_stats()
     
     return jsonify(info)
 
+def get_readiness():
+    """Readiness details shared by the health endpoints"""
+    return {
+        'ready': is_predictor_ready(),
+        'model_status': model_load_state['status'],
+        'model_load': {
+            'attempts': model_load_state['attempts'],
+            'started_at': datetime.fromtimestamp(model_load_state['started_at']).isoformat() if model_load_state['started_at'] else None,
+            'ready_at': datetime.fromtimestamp(model_load_state['ready_at']).isoformat() if model_load_state['ready_at'] else None,
+            'duration_ms': model_load_state['duration_ms'],
+            'error': model_load_state['error'],
+            'timeline': model_load_state['timeline']
+        }
+    }
+
+@app.route('/health/live')
+def liveness_check():
+    """Liveness: the process is up and serving HTTP, whether or not the model is loaded"""
+    return jsonify({'status': 'alive', 'timestamp': datetime.now().isoformat()})
+
+@app.route('/health/ready')
+def readiness_check():
+    """Readiness: 200 once predictions can be served, 503 with Retry-After until then"""
+    readiness = get_readiness()
+    if readiness['ready']:
+        return jsonify(readiness)
+    
+    response = jsonify(readiness)
+    response.status_code = 503
+    response.headers['Retry-After'] = str(app.config['MODEL_LOADING_RETRY_AFTER'])
+    return response
+
 @app.route('/health')
 def health_check():
     """Enhanced health check endpoint"""
+    ready = is_predictor_ready()
     health_status = {
-        'status': 'healthy' if predictor else 'degraded',
+        'status': 'healthy' if ready else 'starting' if model_load_state['status'] == 'loading' else 'degraded',
         'timestamp': datetime.now().isoformat(),
+        'live': True,
+        **get_readiness(),
         'predictor_available': predictor is not None,
-        'model_loaded': predictor.model is not None if predictor else False,
+        'model_loaded': predictor.backend is not None if predictor else False,
+        'inference_backend': predictor.backend.name if predictor and predictor.backend else None,
+        'warmup': predictor.warmup_info if predictor else None,
         'classes_loaded': len(predictor.class_names) if predictor else 0,
         'model_type': predictor.model_type if predictor else 'none',
-        'supports_tta': predictor.model_type == 'advanced' if predictor else False
+        'supports_tta': predictor.model_type == 'advanced' if predictor else False,
+        'micro_batching': batch_scheduler.get_stats() if batch_scheduler else None,
+        'tuning_profile': {
+            'created': tuning_profile.get('created'),
+            'settings': tuning_profile.get('settings'),
+            'measured': tuning_profile.get('measured')
+        } if tuning_profile else None,
+        'adaptive_tta': predictor.get_tta_stats() if predictor else None,
+        'cascade': predictor.get_cascade_stats() if predictor else None,
+        'quality_gate': quality_gate.get_stats(),
+        'similar_cases': embedding_index.get_stats() if embedding_index is not None else {
+            'enabled': False, 'error': embedding_index_error
+        },
+        'heatmaps': {
+            'max_concurrent': app.config['HEATMAP_MAX_CONCURRENT'],
+            'requests': dict(heatmap_counts),
+            'grad_cam': predictor.get_heatmap_stats() if ready else None,
+            'cache': heatmap_cache.get_stats()
+        },
+        'model_registry': {
+            'registered': len(model_registry.specs),
+            'resident': [entry['model_id'] for entry in model_registry.get_stats()['resident']]
+        },
+        'prediction_cache': prediction_cache.get_stats()
     }
     
-    status_code = 200 if predictor else 503
+    status_code = 200 if ready else 503
     return jsonify(health_status), status_code
 
 
@@ -320,20 +1843,14 @@ if __name__ == '__main__':
                 with open('model_phase1.h5', 'wb') as f_out:
                     shutil.copyfileobj(f_in, f_out)
             print("✅ Model decompressed successfully")
-            # Reinitialize predictor after decompression
-            initialize_predictor()
         except Exception as e:
             print(f"❌ Failed to decompress model: {e}")
     
-    if predictor:
-        model_info = predictor.get_model_info()
-        print(f"📊 Model Type: {model_info['model_type']}")
-        print(f"🧠 Model Path: {model_info['model_path']}")
-        print(f"📐 Input Size: {model_info['input_size']}")
-        print(f"🎯 Classes: {model_info['num_classes']}")
-        print(f"🔬 TTA Support: {model_info['supports_tta']}")
-    else:
-        print("⚠️ Predictor not available - check model files")
+    # With the debug reloader, only the serving child process (WERKZEUG_RUN_MAIN)
+    # loads the model; the parent just watches files and restarts the child
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_predictor_loading()
+        print("🧠 Loading model in the background - GET /health/ready reports when predictions can be served")
     
     print(f"🌐 Starting server on port 5000")
     app.run(debug=True, host='127.0.0.1', port=5000)
\ No newline at end of file
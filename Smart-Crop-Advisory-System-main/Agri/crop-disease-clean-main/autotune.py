@@ -0,0 +1,264 @@
+"""
+CPU autotuner for the plant disease service
+Sweeps TensorFlow thread pools, micro-batch size and inference workers under a
+concurrent load on this machine, and writes a profile the app loads at startup
+"""
+
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_PROFILE_PATH = 'tuning_profile.json'
+
+# Profile settings, applied as environment defaults
+PROFILE_SETTINGS = ('TF_INTRA_OP_THREADS', 'TF_INTER_OP_THREADS', 'MICRO_BATCH_MAX_SIZE', 'MICRO_BATCH_WORKERS')
+
+OBJECTIVES = ('throughput', 'latency')
+
+
+def load_tuning_profile(path=DEFAULT_PROFILE_PATH):
+    """
+    Apply a tuning profile's settings as environment defaults
+
+    Variables already set in the environment win over the profile.
+
+    Args:
+        path (str): Profile written by this tool
+
+    Returns:
+        dict: The profile, or None if there is none or it cannot be read
+    """
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            profile = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable tuning profile {path}: {e}")
+        return None
+
+    if profile.get('host', {}).get('cpu_count') != os.cpu_count():
+        print(f"⚠️ Tuning profile {path} was measured on {profile.get('host', {}).get('cpu_count')} CPUs, "
+              f"this host has {os.cpu_count()}; consider re-running autotune.py")
+    for key, value in profile.get('settings', {}).items():
+        if key in PROFILE_SETTINGS:
+            os.environ.setdefault(key, str(value))
+    return profile
+
+
+def default_thread_options(cpu_count):
+    """Powers of two up to the core count, plus the core count itself"""
+    options = {1, cpu_count, max(1, cpu_count // 2)}
+    size = 2
+    while size < cpu_count:
+        options.add(size)
+        size *= 2
+    return sorted(options)
+
+
+def percentile_ms(latencies, q):
+    return round(float(np.percentile(np.asarray(latencies) * 1000.0, q)), 3)
+
+
+def run_trial(predictor, image_bytes, max_batch_size, num_workers, concurrency, requests):
+    """
+    Drive a micro-batching scheduler with concurrent clients, as the HTTP threads would
+
+    Each client decodes an upload and submits it, so decoding competes with
+    inference for the cores exactly as in production.
+
+    Returns:
+        dict: Throughput and latency percentiles
+    """
+    from micro_batching import MicroBatchScheduler
+
+    scheduler = MicroBatchScheduler(predictor, max_batch_size=max_batch_size, num_workers=num_workers,
+                                    max_queue_size=max(64, concurrency * 2))
+    scheduler.start()
+    latencies = []
+    latencies_lock = threading.Lock()
+    remaining = [requests]
+
+    def client():
+        while True:
+            with latencies_lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            started_at = time.perf_counter()
+            image = predictor.preprocess_image(io.BytesIO(image_bytes), enhance=False)[0]
+            scheduler.submit(image, top_n=3, use_tta=False)
+            with latencies_lock:
+                latencies.append(time.perf_counter() - started_at)
+
+    # One untimed request so thread start-up is not measured
+    scheduler.submit(predictor.preprocess_image(io.BytesIO(image_bytes), enhance=False)[0], use_tta=False)
+
+    started_at = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+    stats = scheduler.get_stats()
+    scheduler.shutdown()
+
+    return {
+        'requests': len(latencies),
+        'images_per_second': round(len(latencies) / elapsed, 2),
+        'p50_ms': percentile_ms(latencies, 50),
+        'p95_ms': percentile_ms(latencies, 95),
+        'avg_batch_size': stats['avg_batch_size']
+    }
+
+
+def run_thread_config(args):
+    """
+    Child process: one TensorFlow thread-pool setting, every batch size and worker count
+
+    Thread pools cannot be resized once TensorFlow starts, hence one process per setting.
+    """
+    from inference_backends import configure_tensorflow_threads
+    configure_tensorflow_threads(args.intra_op, args.inter_op)
+
+    # Predictor and TensorFlow chatter goes to stderr; stdout carries the results
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        from benchmark import make_synthetic_image
+        from predict_advanced import AdvancedPlantDiseasePredictor
+
+        predictor = AdvancedPlantDiseasePredictor(
+            model_path=args.model, class_names_path=args.class_names, fallback_model=args.fallback_model,
+            batch_buckets=sorted(set(args.batch_sizes) | {1})
+        )
+        image_bytes = make_synthetic_image(*args.upload_size, seed=7)
+
+        results = []
+        for max_batch_size, num_workers in itertools.product(args.batch_sizes, args.workers):
+            trial = run_trial(predictor, image_bytes, max_batch_size, num_workers, args.concurrency, args.requests)
+            results.append({
+                'TF_INTRA_OP_THREADS': args.intra_op,
+                'TF_INTER_OP_THREADS': args.inter_op,
+                'MICRO_BATCH_MAX_SIZE': max_batch_size,
+                'MICRO_BATCH_WORKERS': num_workers,
+                **trial
+            })
+            print(f"   intra={args.intra_op} inter={args.inter_op} batch={max_batch_size} workers={num_workers}: "
+                  f"{trial['images_per_second']} img/s, p95 {trial['p95_ms']:.1f} ms")
+    finally:
+        sys.stdout = stdout
+    print(json.dumps(results))
+
+
+def pick_best(results, objective='throughput', max_p95_ms=None):
+    """
+    Choose the setting to deploy
+
+    Args:
+        results (list): Trial rows
+        objective (str): 'throughput' maximizes images per second, 'latency' minimizes p95
+        max_p95_ms (float): Only consider settings within this p95 budget, if any meet it
+
+    Returns:
+        dict: The winning row
+    """
+    candidates = [row for row in results if max_p95_ms is None or row['p95_ms'] <= max_p95_ms] or results
+    if objective == 'latency':
+        return min(candidates, key=lambda row: (row['p95_ms'], -row['images_per_second']))
+    return max(candidates, key=lambda row: (row['images_per_second'], -row['p95_ms']))
+
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description='Tune inference threading and batching for this machine')
+    parser.add_argument('--model', default='best_model_advanced.h5', help='Model file')
+    parser.add_argument('--fallback-model', default='best_model.h5', help='Keras model used if --model is missing')
+    parser.add_argument('--class-names', default='class_names.txt', help='Class names file')
+    parser.add_argument('--intra-op', type=lambda text: [int(n) for n in text.split(',')],
+                        default=default_thread_options(cpu_count), help='TensorFlow intra-op thread counts to try')
+    parser.add_argument('--inter-op', type=lambda text: [int(n) for n in text.split(',')],
+                        default=[1, 2], help='TensorFlow inter-op thread counts to try')
+    parser.add_argument('--batch-sizes', type=lambda text: [int(n) for n in text.split(',')],
+                        default=[1, 4, 8, 16], help='Micro-batch sizes to try')
+    parser.add_argument('--workers', type=lambda text: [int(n) for n in text.split(',')],
+                        default=sorted({1, 2, min(4, cpu_count)}), help='Inference worker counts to try')
+    parser.add_argument('--concurrency', type=int, default=max(4, cpu_count), help='Concurrent simulated clients')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per trial')
+    parser.add_argument('--upload-size', type=lambda text: tuple(int(n) for n in text.lower().split('x')),
+                        default=(1600, 1200), help='Synthetic upload size, e.g. 1600x1200')
+    parser.add_argument('--objective', choices=OBJECTIVES, default='throughput')
+    parser.add_argument('--max-p95-ms', type=float, default=None, help='p95 latency budget for the throughput objective')
+    parser.add_argument('--output', default=DEFAULT_PROFILE_PATH, help='Profile file the app loads (TUNING_PROFILE)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # --intra-op and --inter-op hold a single value in a child process
+        args.intra_op, args.inter_op = args.intra_op[0], args.inter_op[0]
+        run_thread_config(args)
+        return
+
+    script = os.path.abspath(__file__)
+    thread_configs = list(itertools.product(args.intra_op, args.inter_op))
+    print(f"🔧 Tuning on {cpu_count} CPUs: {len(thread_configs)} thread settings x "
+          f"{len(args.batch_sizes)} batch sizes x {len(args.workers)} worker counts", file=sys.stderr)
+
+    results = []
+    started_at = time.perf_counter()
+    for intra_op, inter_op in thread_configs:
+        command = [
+            sys.executable, script, '--child',
+            '--model', args.model, '--fallback-model', args.fallback_model, '--class-names', args.class_names,
+            '--intra-op', str(intra_op), '--inter-op', str(inter_op),
+            '--batch-sizes', ','.join(map(str, args.batch_sizes)), '--workers', ','.join(map(str, args.workers)),
+            '--concurrency', str(args.concurrency), '--requests', str(args.requests),
+            '--upload-size', f"{args.upload_size[0]}x{args.upload_size[1]}"
+        ]
+        completed = subprocess.run(command, stdout=subprocess.PIPE, text=True,
+                                   cwd=os.getcwd(), env={**os.environ, 'PYTHONPATH': os.path.dirname(script)})
+        if completed.returncode != 0:
+            print(f"❌ Trial intra={intra_op} inter={inter_op} failed (exit {completed.returncode})", file=sys.stderr)
+            continue
+        results.extend(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    if not results:
+        raise SystemExit('❌ No trial completed')
+
+    best = pick_best(results, args.objective, args.max_p95_ms)
+    profile = {
+        'created': datetime.now().isoformat(),
+        'host': {
+            'cpu_count': cpu_count,
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine()
+        },
+        'model': args.model,
+        'objective': args.objective,
+        'max_p95_ms': args.max_p95_ms,
+        'concurrency': args.concurrency,
+        'settings': {key: best[key] for key in PROFILE_SETTINGS},
+        'measured': {key: best[key] for key in ('images_per_second', 'p50_ms', 'p95_ms', 'avg_batch_size')},
+        'tuning_seconds': round(time.perf_counter() - started_at, 1),
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(profile, f, indent=2)
+
+    print(f"✅ Best: {profile['settings']} - {best['images_per_second']} img/s, p95 {best['p95_ms']:.1f} ms", file=sys.stderr)
+    print(f"💾 Profile written to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
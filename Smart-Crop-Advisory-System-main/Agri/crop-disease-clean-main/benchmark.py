@@ -0,0 +1,630 @@
+"""
+Performance benchmarks for the plant disease service
+Runs preprocessing, predictor inference and the Flask routes against a
+stand-in model with the real input/output shapes and synthetic photos
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+SUITES = ('preprocessing', 'inference', 'routes', 'tiling', 'similarity')
+
+# Typical upload sizes: small web image, downscaled phone photo, 12 MP phone photo
+DEFAULT_IMAGE_SIZES = ((640, 480), (1600, 1200), (4032, 3024))
+
+DEFAULT_BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64)
+
+STAND_IN_ARCHITECTURES = ('mobilenetv2', 'tiny')
+
+# Stored vectors for the similarity suite
+DEFAULT_SIMILARITY_SIZES = (100000, 1000000)
+
+
+def build_stand_in_model(output_path, image_size, num_classes, architecture='mobilenetv2'):
+    """
+    Build an untrained model with the production input and output shapes
+
+    Args:
+        output_path (str): Where to save the .h5 model
+        image_size (int): Square input size (224 basic, 300 advanced)
+        num_classes (int): Number of output classes
+        architecture (str): 'mobilenetv2' matches the production backbone,
+            'tiny' is a single conv layer for quick runs
+
+    Returns:
+        str: The model path
+    """
+    import tensorflow as tf
+
+    inputs = tf.keras.Input((image_size, image_size, 3))
+    if architecture == 'mobilenetv2':
+        backbone = tf.keras.applications.MobileNetV2(
+            input_shape=(image_size, image_size, 3), include_top=False, weights=None
+        )
+        x = backbone(inputs)
+        x = tf.keras.layers.GlobalAveragePooling2D()(x)
+        x = tf.keras.layers.Dense(128, activation='relu')(x)
+        x = tf.keras.layers.Dropout(0.2)(x)
+    elif architecture == 'tiny':
+        x = tf.keras.layers.Conv2D(8, 3, strides=4, activation='relu')(inputs)
+        x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    else:
+        raise ValueError(f"Unknown architecture '{architecture}'. Available: {', '.join(STAND_IN_ARCHITECTURES)}")
+    outputs = tf.keras.layers.Dense(num_classes, activation='softmax')(x)
+
+    tf.keras.Model(inputs, outputs).save(output_path)
+    return output_path
+
+
+def make_synthetic_image(width, height, seed=0, image_format='JPEG'):
+    """
+    Encode a leaf-like synthetic photo
+
+    Smooth green structure, lesion-like spots and sensor noise give it a
+    compressed size close to a real photo of the same resolution.
+
+    Args:
+        width (int): Image width
+        height (int): Image height
+        seed (int): Random seed
+        image_format (str): PIL format to encode
+
+    Returns:
+        bytes: The encoded image
+    """
+    rng = np.random.default_rng(seed)
+
+    # Low-frequency colour field, upsampled to full size
+    coarse = rng.uniform(0.0, 1.0, size=(max(2, height // 64), max(2, width // 64), 3))
+    coarse = coarse * np.array([0.35, 0.6, 0.25]) + np.array([0.1, 0.25, 0.05])
+    image = Image.fromarray((coarse * 255).astype(np.uint8)).resize((width, height), Image.Resampling.BICUBIC)
+
+    # Brown lesions
+    draw = ImageDraw.Draw(image)
+    for _ in range(int(rng.integers(5, 20))):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        radius = int(rng.integers(max(2, width // 100), max(3, width // 25)))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=(110, 70, 30))
+    image = image.filter(ImageFilter.GaussianBlur(radius=max(1, width // 800)))
+
+    # Sensor noise
+    pixels = np.asarray(image, dtype=np.int16) + rng.normal(0, 6, size=(height, width, 3)).astype(np.int16)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=90)
+    return buffer.getvalue()
+
+
+def summarize(latencies, items_per_call=1):
+    """
+    Latency percentiles and throughput of a list of timings
+
+    Args:
+        latencies (list): Seconds per call
+        items_per_call (int): Images processed by one call
+
+    Returns:
+        dict: count, mean/p50/p95/p99 in ms, throughput in images per second
+    """
+    latencies_ms = np.asarray(latencies) * 1000.0
+    total_seconds = float(np.sum(latencies))
+    return {
+        'count': len(latencies),
+        'mean_ms': round(float(latencies_ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies_ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(latencies_ms, 99)), 3),
+        'images_per_second': round(len(latencies) * items_per_call / total_seconds, 2) if total_seconds > 0 else None
+    }
+
+
+def time_calls(function, iterations, warmup=1):
+    """Run function warmup + iterations times, returning the timed latencies"""
+    for _ in range(warmup):
+        function()
+    latencies = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - started_at)
+    return latencies
+
+
+def measure_allocations(function):
+    """
+    Peak host memory allocated by one call, in KB
+
+    Counts what tracemalloc sees: numpy buffers, Python objects and the copy
+    TensorFlow makes of each input batch. Run separately from the timed
+    calls, since tracing slows every allocation down.
+    """
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round((peak - baseline) / 1024.0, 1)
+
+
+def bench_preprocessing(predictor, images, iterations):
+    """
+    Decode, orient, resize and enhance single uploads into uint8 arrays
+
+    Args:
+        predictor (AdvancedPlantDiseasePredictor): Predictor whose input size is used
+        images (dict): (width, height) -> encoded image bytes
+        iterations (int): Timed calls per case
+
+    Returns:
+        list: One result row per image size and enhance option
+    """
+    rows = []
+    for (width, height), image_bytes in images.items():
+        for enhance in (False, True):
+            latencies = time_calls(
+                lambda: predictor.preprocess_image(io.BytesIO(image_bytes), enhance=enhance), iterations
+            )
+            rows.append({
+                'suite': 'preprocessing',
+                'model_input': predictor.IMG_WIDTH,
+                'image_size': f"{width}x{height}",
+                'image_bytes': len(image_bytes),
+                'enhance': enhance,
+                **summarize(latencies)
+            })
+            print(f"   preprocessing {predictor.IMG_WIDTH} {width}x{height} enhance={enhance}: "
+                  f"p50 {rows[-1]['p50_ms']:.1f} ms")
+    return rows
+
+
+def bench_inference(predictor, image_bytes, batch_sizes, iterations):
+    """
+    Score batches through the predictor: preprocessing, forward pass (with or without TTA) and formatting
+
+    Args:
+        predictor (AdvancedPlantDiseasePredictor): Predictor under test
+        image_bytes (bytes): Encoded image used for every batch item
+        batch_sizes (tuple): Batch sizes to measure
+        iterations (int): Timed calls per case
+
+    Returns:
+        list: One result row per batch size, TTA and enhance option
+    """
+    rows = []
+    for use_tta in (False, True, 'adaptive'):
+        for enhance in (False, True):
+            for batch_size in batch_sizes:
+                forward_latencies = []
+                tta_counts = [0, 0]  # Images with TTA applied, images scored
+
+                def run_batch():
+                    image_batch = np.concatenate([
+                        predictor.preprocess_image(io.BytesIO(image_bytes), enhance=enhance)
+                        for _ in range(batch_size)
+                    ])
+                    started_at = time.perf_counter()
+                    predictions, details = predictor.predict_batch(image_batch, use_tta=use_tta, return_details=True)
+                    forward_latencies.append(time.perf_counter() - started_at)
+                    tta_counts[0] += sum(item_details['tta_applied'] for item_details in details)
+                    tta_counts[1] += len(details)
+                    for item_predictions, item_details in zip(predictions, details):
+                        results = predictor.get_top_predictions(item_predictions, 5)
+                        predictor.format_comprehensive_results(results, use_tta, enhance, item_details)
+
+                latencies = time_calls(run_batch, iterations)
+                forward = summarize(forward_latencies[-iterations:], batch_size)
+                alloc_kb = measure_allocations(run_batch)
+                rows.append({
+                    'suite': 'inference',
+                    'model_input': predictor.IMG_WIDTH,
+                    'model_type': predictor.model_type,
+                    'batch_size': batch_size,
+                    'use_tta': use_tta,
+                    'tta_applied_fraction': round(tta_counts[0] / tta_counts[1], 4) if tta_counts[1] else 0.0,
+                    'enhance': enhance,
+                    **summarize(latencies, batch_size),
+                    'forward_p50_ms': forward['p50_ms'],
+                    'forward_images_per_second': forward['images_per_second'],
+                    'alloc_peak_kb_per_image': round(alloc_kb / batch_size, 1)
+                })
+                print(f"   inference {predictor.IMG_WIDTH} batch={batch_size} tta={use_tta} enhance={enhance}: "
+                      f"p50 {rows[-1]['p50_ms']:.1f} ms, {rows[-1]['images_per_second']} img/s, "
+                      f"{rows[-1]['alloc_peak_kb_per_image']} KB allocated/img")
+    return rows
+
+
+def bench_tiling(predictor, image_bytes, iterations, max_tiles=50, tile_batch_sizes=(1, 32)):
+    """
+    Tiled inference on a high-resolution photo, one tile per forward pass against batched tiles
+
+    Args:
+        predictor (AdvancedPlantDiseasePredictor): Predictor under test
+        image_bytes (bytes): Encoded high-resolution photo
+        iterations (int): Timed calls per case
+        max_tiles (int): Tile grid size limit
+        tile_batch_sizes (tuple): Tiles per forward pass; 1 is the sequential baseline
+
+    Returns:
+        list: One result row per tile batch size
+    """
+    from tiled_inference import predict_tiled
+
+    rows = []
+    for tile_batch_size in tile_batch_sizes:
+        tiles = []
+
+        def run_tiled():
+            # min_std=0 keeps every tile so all cases score the same grid
+            _, tiling = predict_tiled(predictor, io.BytesIO(image_bytes), max_tiles=max_tiles, min_std=0.0,
+                                      batch_size=tile_batch_size)
+            tiles.append(tiling['tiles_scored'])
+
+        latencies = time_calls(run_tiled, iterations)
+        rows.append({
+            'suite': 'tiling',
+            'model_input': predictor.IMG_WIDTH,
+            'max_tiles': max_tiles,
+            'tile_batch_size': tile_batch_size,
+            'tiles': tiles[-1],
+            **summarize(latencies)
+        })
+        print(f"   tiling {predictor.IMG_WIDTH} {tiles[-1]} tiles batch={tile_batch_size}: p50 {rows[-1]['p50_ms']:.1f} ms")
+    return rows
+
+
+def bench_routes(app_module, image_bytes, batch_sizes, iterations):
+    """
+    Call /predict and /batch_predict through the Flask test client; /predict is also
+    timed with a heatmap, which shares the forward pass, to measure what explanations add
+
+    Args:
+        app_module (module): The imported app_advanced module, with its predictor ready
+        image_bytes (bytes): Encoded image uploaded by every request
+        batch_sizes (tuple): Files per /batch_predict request
+        iterations (int): Timed requests per case
+
+    Returns:
+        list: One result row per route, option and batch size
+    """
+    client = app_module.app.test_client()
+    model_input = app_module.predictor.IMG_WIDTH
+    rows = []
+
+    def check(response):
+        if response.status_code != 200:
+            raise RuntimeError(f"{response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+    for use_tta in (False, True, 'adaptive'):
+        for enhance in (False, True):
+            options = {'use_tta': str(use_tta).lower(), 'enhance_image': str(enhance).lower()}
+
+            latencies = time_calls(lambda: check(client.post(
+                '/predict',
+                data={**options, 'file': (io.BytesIO(image_bytes), 'leaf.jpg')},
+                content_type='multipart/form-data'
+            )), iterations)
+            rows.append({
+                'suite': 'routes',
+                'route': '/predict',
+                'model_input': model_input,
+                'batch_size': 1,
+                'use_tta': use_tta,
+                'enhance': enhance,
+                **summarize(latencies)
+            })
+            print(f"   /predict {model_input} tta={use_tta} enhance={enhance}: p50 {rows[-1]['p50_ms']:.1f} ms")
+
+            if not enhance:
+                latencies = time_calls(lambda: check(client.post(
+                    '/predict',
+                    data={**options, 'heatmap': 'true', 'file': (io.BytesIO(image_bytes), 'leaf.jpg')},
+                    content_type='multipart/form-data'
+                )), iterations)
+                rows.append({
+                    'suite': 'routes',
+                    'route': '/predict',
+                    'model_input': model_input,
+                    'batch_size': 1,
+                    'use_tta': use_tta,
+                    'enhance': enhance,
+                    'heatmap': True,
+                    **summarize(latencies)
+                })
+                print(f"   /predict {model_input} tta={use_tta} heatmap: p50 {rows[-1]['p50_ms']:.1f} ms")
+
+            for batch_size in batch_sizes:
+                def post_batch():
+                    response = check(client.post(
+                        '/batch_predict',
+                        data={**options, 'files': [(io.BytesIO(image_bytes), f'leaf_{i}.jpg') for i in range(batch_size)]},
+                        content_type='multipart/form-data'
+                    ))
+                    # Drain the NDJSON stream so the whole batch is timed
+                    summary = json.loads(response.get_data(as_text=True).splitlines()[-1])
+                    if not summary.get('success'):
+                        raise RuntimeError(summary.get('error'))
+
+                latencies = time_calls(post_batch, iterations)
+                rows.append({
+                    'suite': 'routes',
+                    'route': '/batch_predict',
+                    'model_input': model_input,
+                    'batch_size': batch_size,
+                    'use_tta': use_tta,
+                    'enhance': enhance,
+                    **summarize(latencies, batch_size)
+                })
+                print(f"   /batch_predict {model_input} batch={batch_size} tta={use_tta} enhance={enhance}: "
+                      f"p50 {rows[-1]['p50_ms']:.1f} ms, {rows[-1]['images_per_second']} img/s")
+    return rows
+
+
+def make_synthetic_embeddings(count, dim, num_classes, rng):
+    """Clustered, non-negative vectors like the penultimate ReLU features of a classifier"""
+    centers = np.random.default_rng(0).normal(size=(num_classes, dim)).astype(np.float32)
+    labels = rng.integers(0, num_classes, count)
+    vectors = centers[labels] + rng.normal(scale=0.8, size=(count, dim)).astype(np.float32)
+    return np.maximum(vectors, 0), labels
+
+
+def bench_similarity(work_dir, sizes, iterations, dim=128, num_classes=38, k=10, recall_queries=20):
+    """
+    Grow a similar-case store and time top-k searches at each size
+
+    Args:
+        work_dir (str): Scratch directory for the store
+        sizes (list): Stored-vector counts to measure, ascending; the store grows incrementally
+        iterations (int): Timed searches per size (at least 50)
+        dim (int): Embedding size (128 for the production head)
+        num_classes (int): Clusters in the synthetic embeddings
+        k (int): Neighbours per search
+        recall_queries (int): Searches checked against an exact scan
+
+    Returns:
+        list: One result row per store size
+    """
+    from embedding_index import EmbeddingIndex, normalize, widen
+
+    rng = np.random.default_rng(1)
+    index = EmbeddingIndex(os.path.join(work_dir, 'similar-cases'), dim, model_id='benchmark')
+    add_seconds = 0.0
+    rows = []
+    for size in sizes:
+        while len(index) < size:
+            vectors, labels = make_synthetic_embeddings(min(10000, size - len(index)), dim, num_classes, rng)
+            started_at = time.perf_counter()
+            index.add(vectors, [str(label) for label in labels])
+            add_seconds += time.perf_counter() - started_at
+        # Time searches on the trained index, not the exact scan used while it trains
+        index.wait_for_training()
+
+        # Queries near stored cases, as a new photo of a known disease would be
+        stored = widen(index._vectors(len(index)))
+        queries = stored[rng.choice(len(index), max(iterations, 50))] + rng.normal(scale=0.05, size=(max(iterations, 50), dim)).astype(np.float32)
+        latencies = []
+        for query in queries:
+            started_at = time.perf_counter()
+            index.search(query, k)
+            latencies.append(time.perf_counter() - started_at)
+
+        recalls = []
+        for query in queries[:recall_queries]:
+            exact = set(np.argpartition(-(stored @ normalize(query)[0]), k - 1)[:k].tolist())
+            recalls.append(len(exact & {case_id for case_id, _ in index.search(query, k)}) / k)
+        del stored
+
+        exact_latencies = time_calls(lambda: widen(index._vectors(len(index))) @ queries[0], 3, warmup=0)
+        stats = index.get_stats()
+        rows.append({
+            'suite': 'similarity',
+            'vectors': size,
+            'dim': dim,
+            'k': k,
+            'num_lists': stats['num_lists'],
+            'num_probes': stats['num_probes'],
+            **summarize(latencies),
+            'exact_scan_p50_ms': summarize(exact_latencies)['p50_ms'],
+            'recall_at_k': round(float(np.mean(recalls)), 4),
+            'add_vectors_per_second': round(len(index) / add_seconds, 1),
+            'train_ms': stats['train_ms']
+        })
+        print(f"   similarity {size} vectors: p50 {rows[-1]['p50_ms']:.2f} ms, p95 {rows[-1]['p95_ms']:.2f} ms "
+              f"(exact scan {rows[-1]['exact_scan_p50_ms']:.0f} ms), recall@{k} {rows[-1]['recall_at_k']}")
+    index.close()
+    return rows
+
+
+def case_key(row):
+    """Identify a result row independently of its measurements"""
+    measured = {'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'images_per_second',
+                'forward_p50_ms', 'forward_images_per_second', 'image_bytes', 'tta_applied_fraction',
+                'alloc_peak_kb_per_image', 'exact_scan_p50_ms', 'recall_at_k', 'add_vectors_per_second', 'train_ms'}
+    return json.dumps({key: value for key, value in row.items() if key not in measured}, sort_keys=True)
+
+
+def compare_reports(baseline, report):
+    """
+    Compare a report against a baseline run
+
+    Returns:
+        list: Per-case p50 latency and throughput changes, in percent
+    """
+    baseline_rows = {case_key(row): row for row in baseline['results']}
+    changes = []
+    for row in report['results']:
+        previous = baseline_rows.get(case_key(row))
+        if previous is None:
+            continue
+        change = {'case': json.loads(case_key(row))}
+        if previous['p50_ms']:
+            change['p50_change_pct'] = round((row['p50_ms'] / previous['p50_ms'] - 1.0) * 100.0, 1)
+        if previous.get('images_per_second') and row.get('images_per_second'):
+            change['throughput_change_pct'] = round((row['images_per_second'] / previous['images_per_second'] - 1.0) * 100.0, 1)
+        changes.append(change)
+    return changes
+
+
+def get_environment():
+    """Record what the numbers were measured on"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    import tensorflow as tf
+    return {
+        'git_commit': commit,
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'tensorflow': tf.__version__
+    }
+
+
+def parse_sizes(text):
+    """Parse '640x480,1600x1200' into [(640, 480), (1600, 1200)]"""
+    return [tuple(int(dim) for dim in size.lower().split('x')) for size in text.split(',') if size.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the plant disease service with a stand-in model')
+    parser.add_argument('--suites', nargs='+', default=list(SUITES), choices=SUITES)
+    parser.add_argument('--model-sizes', nargs='+', type=int, default=[224, 300], help='Model input sizes (224 basic, 300 advanced)')
+    parser.add_argument('--architecture', default='mobilenetv2', choices=STAND_IN_ARCHITECTURES, help='Stand-in model architecture')
+    parser.add_argument('--class-names', default='class_names.txt', help='Class names file, sets the number of outputs')
+    parser.add_argument('--image-sizes', type=parse_sizes, default=list(DEFAULT_IMAGE_SIZES), help='Synthetic photo sizes, e.g. 640x480,4032x3024')
+    parser.add_argument('--upload-size', type=parse_sizes, default=[(1600, 1200)], help='Photo size used for inference and routes')
+    parser.add_argument('--batch-sizes', type=lambda text: [int(size) for size in text.split(',')], default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument('--route-batch-sizes', type=lambda text: [int(size) for size in text.split(',')], default=[8, 32])
+    parser.add_argument('--similarity-sizes', type=lambda text: [int(size) for size in text.split(',')],
+                        default=list(DEFAULT_SIMILARITY_SIZES), help='Stored vectors for the similarity suite')
+    parser.add_argument('--iterations', type=int, default=10, help='Timed calls per case')
+    parser.add_argument('--quick', action='store_true', help='Few iterations, batch sizes 1 and 8, tiny stand-in model')
+    parser.add_argument('--output', help='Write the JSON report to this file (default: stdout)')
+    parser.add_argument('--baseline', help='Earlier JSON report to compare against')
+    args = parser.parse_args()
+
+    if args.quick:
+        args.iterations = min(args.iterations, 3)
+        args.batch_sizes = [1, 8]
+        args.route_batch_sizes = [8]
+        args.architecture = 'tiny'
+        args.similarity_sizes = [100000]
+
+    with open(args.class_names) as f:
+        class_names_path = os.path.abspath(args.class_names)
+        num_classes = len([line for line in f if line.strip()])
+
+    work_dir = tempfile.mkdtemp(prefix='krishivannai-bench-')
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, repo_dir)
+
+    # The app reads best_model.h5 and class_names.txt from the working directory;
+    # the prediction and heatmap caches are disabled so every request is really scored
+    os.environ['PREDICTION_CACHE_SIZE'] = '0'
+    os.environ['PREDICTION_CACHE_DB'] = ''
+    os.environ['HEATMAP_CACHE_SIZE'] = '0'
+    original_dir = os.getcwd()
+    os.chdir(work_dir)
+    shutil.copy(class_names_path, 'class_names.txt')
+
+    print(f"🏁 Benchmarking suites: {', '.join(args.suites)} ({args.architecture} stand-in, {num_classes} classes)", file=sys.stderr)
+    images = {size: make_synthetic_image(*size, seed=index) for index, size in enumerate(args.image_sizes)}
+    upload = make_synthetic_image(*args.upload_size[0], seed=99)
+
+    report = {
+        'environment': get_environment(),
+        'config': {
+            'suites': args.suites,
+            'model_sizes': args.model_sizes,
+            'architecture': args.architecture,
+            'num_classes': num_classes,
+            'image_sizes': [f"{width}x{height}" for width, height in args.image_sizes],
+            'upload_size': f"{args.upload_size[0][0]}x{args.upload_size[0][1]}",
+            'batch_sizes': args.batch_sizes,
+            'route_batch_sizes': args.route_batch_sizes,
+            'similarity_sizes': args.similarity_sizes,
+            'iterations': args.iterations
+        },
+        'results': []
+    }
+
+    # Benchmark output goes to stderr so the JSON report can be piped
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        from predict_advanced import AdvancedPlantDiseasePredictor
+
+        app_module = None
+        for model_size in args.model_sizes:
+            print(f"\n🧠 Stand-in model {model_size}x{model_size}", file=sys.stderr)
+            build_stand_in_model('best_model.h5', model_size, num_classes, args.architecture)
+
+            if {'preprocessing', 'inference', 'tiling'} & set(args.suites):
+                predictor = AdvancedPlantDiseasePredictor(
+                    model_path='best_model.h5', class_names_path='class_names.txt', fallback_model='best_model.h5'
+                )
+                if 'preprocessing' in args.suites:
+                    report['results'].extend(bench_preprocessing(predictor, images, args.iterations))
+                if 'inference' in args.suites:
+                    report['results'].extend(bench_inference(predictor, upload, args.batch_sizes, args.iterations))
+                if 'tiling' in args.suites:
+                    report['results'].extend(bench_tiling(predictor, images[max(images)], args.iterations))
+                del predictor
+
+            if 'routes' in args.suites:
+                if app_module is None:
+                    import app_advanced as app_module
+                    app_module.model_load_thread.join()
+                else:
+                    app_module.initialize_predictor()
+                if not app_module.is_predictor_ready():
+                    raise RuntimeError(f"App failed to load the stand-in model: {app_module.model_load_state['error']}")
+                report['results'].extend(bench_routes(app_module, upload, args.route_batch_sizes, args.iterations))
+
+        if 'similarity' in args.suites:
+            print("\n🔎 Similar-case search", file=sys.stderr)
+            report['results'].extend(bench_similarity(work_dir, sorted(args.similarity_sizes), args.iterations))
+    finally:
+        sys.stdout = stdout
+        os.chdir(original_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['comparison'] = {'baseline': args.baseline, 'changes': compare_reports(json.load(f), report)}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        print(f"💾 Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+Convert the Keras plant disease model to TensorFlow Lite
+Builds float32, float16 and int8-quantized variants and reports their
+latency and accuracy deltas against the Keras model
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from inference_backends import create_backend, with_uint8_input
+
+# Variants the converter can build
+TFLITE_VARIANTS = ('float32', 'float16', 'dynamic', 'int8')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def load_sample_images(image_dir, image_size, limit=100, seed=0):
+    """
+    Load model-sized sample images from a directory, or synthesize them
+
+    Args:
+        image_dir (str): Directory searched recursively for images, None for synthetic images
+        image_size (tuple): (width, height) of the model input
+        limit (int): Maximum number of images
+        seed (int): Seed for synthetic images
+
+    Returns:
+        np.array: uint8 array of shape (N, H, W, 3)
+    """
+    paths = []
+    if image_dir and os.path.isdir(image_dir):
+        for root, _, filenames in os.walk(image_dir):
+            paths.extend(os.path.join(root, name) for name in sorted(filenames) if name.lower().endswith(IMAGE_EXTENSIONS))
+        paths = sorted(paths)[:limit]
+
+    if not paths:
+        print("⚠️ No sample images found, using synthetic images (int8 calibration and accuracy numbers will be rough)")
+        rng = np.random.default_rng(seed)
+        return rng.integers(0, 256, (min(limit, 32), image_size[1], image_size[0], 3), dtype=np.uint8)
+
+    images = []
+    for path in paths:
+        image = Image.open(path).convert('RGB').resize(image_size, Image.Resampling.LANCZOS)
+        images.append(np.asarray(image, dtype=np.uint8))
+    return np.stack(images)
+
+
+def convert_model(model_path, output_dir, variants=TFLITE_VARIANTS, calibration_images=None):
+    """
+    Convert a Keras .h5 model into TFLite variants
+
+    Every variant takes uint8 pixels: the model is wrapped by with_uint8_input,
+    so the scaling to [0, 1] is converted with it.
+
+    Args:
+        model_path (str): Path to the Keras model
+        output_dir (str): Directory for the .tflite files
+        variants (tuple): Variants to build, from TFLITE_VARIANTS
+        calibration_images (np.array): Representative images for int8 calibration
+
+    Returns:
+        dict: Variant name -> output path
+    """
+    import tensorflow as tf
+
+    model = with_uint8_input(tf.keras.models.load_model(model_path, compile=False))
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    os.makedirs(output_dir, exist_ok=True)
+
+    outputs = {}
+    for variant in variants:
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+        if variant == 'float16':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif variant == 'dynamic':
+            # int8 weights, float activations
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        elif variant == 'int8':
+            if calibration_images is None:
+                raise ValueError('int8 conversion needs calibration images')
+
+            def representative_dataset():
+                for image in calibration_images:
+                    yield [image[np.newaxis]]
+
+            # Full integer kernels; the model keeps its uint8 pixel input and float output
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        elif variant != 'float32':
+            raise ValueError(f"Unknown variant '{variant}'. Available: {', '.join(TFLITE_VARIANTS)}")
+
+        output_path = os.path.join(output_dir, f"{stem}_{variant}.tflite")
+        with open(output_path, 'wb') as f:
+            f.write(converter.convert())
+
+        outputs[variant] = output_path
+        print(f"✅ {variant}: {output_path} ({os.path.getsize(output_path) / 1024 / 1024:.2f} MB)")
+
+    return outputs
+
+
+def measure_backend(backend, images, batch_size=1, repeats=3):
+    """
+    Score images with a backend and time it
+
+    Returns:
+        tuple: (predictions, mean latency per batch in ms)
+    """
+    # Warm-up
+    backend.predict(images[:batch_size])
+
+    timings = []
+    predictions = None
+    for _ in range(repeats):
+        outputs = []
+        for start in range(0, len(images), batch_size):
+            started_at = time.perf_counter()
+            outputs.append(backend.predict(images[start:start + batch_size]))
+            timings.append(time.perf_counter() - started_at)
+        predictions = np.concatenate(outputs)
+
+    return predictions, float(np.mean(timings) * 1000.0)
+
+
+def compare_backends(model_path, tflite_paths, images, batch_size=1, num_threads=None):
+    """
+    Report latency and accuracy deltas of TFLite variants against the Keras model
+
+    Args:
+        model_path (str): Keras reference model
+        tflite_paths (dict): Variant name -> .tflite path
+        images (np.array): Evaluation images
+        batch_size (int): Batch size for the latency measurement
+        num_threads (int): Interpreter threads for the TFLite backends
+
+    Returns:
+        dict: Per-backend report
+    """
+    reference = create_backend('keras', model_path)
+    reference_predictions, reference_latency = measure_backend(reference, images, batch_size)
+    reference_top1 = reference_predictions.argmax(axis=1)
+
+    report = {
+        'keras': {
+            'model_path': model_path,
+            'size_mb': round(os.path.getsize(model_path) / 1024 / 1024, 3),
+            'latency_ms': round(reference_latency, 3),
+            'speedup': 1.0,
+            'top1_agreement': 1.0,
+            'mean_abs_prob_diff': 0.0
+        }
+    }
+
+    for variant, path in tflite_paths.items():
+        backend = create_backend('tflite', path, num_threads=num_threads)
+        predictions, latency = measure_backend(backend, images, batch_size)
+        report[f'tflite_{variant}'] = {
+            'model_path': path,
+            'size_mb': round(os.path.getsize(path) / 1024 / 1024, 3),
+            'latency_ms': round(latency, 3),
+            'speedup': round(reference_latency / latency, 2) if latency > 0 else None,
+            'top1_agreement': round(float(np.mean(predictions.argmax(axis=1) == reference_top1)), 4),
+            'mean_abs_prob_diff': round(float(np.mean(np.abs(predictions - reference_predictions))), 6)
+        }
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the plant disease model to TensorFlow Lite')
+    parser.add_argument('--model', default='best_model.h5', help='Keras model to convert')
+    parser.add_argument('--output-dir', default='.', help='Directory for the .tflite files')
+    parser.add_argument('--variants', nargs='+', default=['float16', 'int8'], choices=TFLITE_VARIANTS)
+    parser.add_argument('--calibration-dir', help='Images used to calibrate int8 quantization')
+    parser.add_argument('--eval-dir', help='Images used for the accuracy comparison (defaults to the calibration images)')
+    parser.add_argument('--num-images', type=int, default=100, help='Maximum images for calibration and evaluation')
+    parser.add_argument('--batch-size', type=int, default=1, help='Batch size for the latency comparison')
+    parser.add_argument('--num-threads', type=int, default=None, help='TFLite interpreter threads')
+    parser.add_argument('--report', help='Write the comparison report to this JSON file')
+    parser.add_argument('--no-compare', action='store_true', help='Only convert, skip the comparison')
+    args = parser.parse_args()
+
+    print(f"🔄 Converting {args.model} to: {', '.join(args.variants)}")
+    reference = create_backend('keras', args.model)
+    image_size = (reference.input_shape[2], reference.input_shape[1])
+    del reference
+
+    calibration_images = load_sample_images(args.calibration_dir, image_size, args.num_images)
+    outputs = convert_model(args.model, args.output_dir, args.variants, calibration_images)
+
+    if args.no_compare:
+        return
+
+    eval_images = load_sample_images(args.eval_dir, image_size, args.num_images) if args.eval_dir else calibration_images
+    print(f"\n📊 Comparing backends on {len(eval_images)} images (batch size {args.batch_size})")
+    report = compare_backends(args.model, outputs, eval_images, args.batch_size, args.num_threads)
+
+    for name, row in report.items():
+        print(f"   {name:16s} {row['size_mb']:8.2f} MB  {row['latency_ms']:8.2f} ms  "
+              f"x{row['speedup']}  top-1 agreement {row['top1_agreement'] * 100:.1f}%  "
+              f"mean |Δp| {row['mean_abs_prob_diff']:.5f}")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,505 @@
+"""
+Similar-case store for the plant disease service
+Penultimate-layer embeddings of confirmed cases are appended to a float16
+file that is memory-mapped for search. An inverted-file (IVF) index groups
+them around k-means centroids, so a top-k lookup scans a few clusters
+instead of every stored vector; case details live in SQLite
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Clusters of the inverted-file index; about sqrt(expected vectors) suits up to a few million
+DEFAULT_NUM_LISTS = 1024
+
+# Clusters scanned per query; more is slower and closer to exact search
+DEFAULT_NUM_PROBES = 16
+
+# Vectors per cluster stored before the index is trained; until then search is exact
+TRAIN_VECTORS_PER_LIST = 32
+
+# Most vectors k-means is run on, per cluster
+MAX_TRAIN_VECTORS_PER_LIST = 256
+
+KMEANS_ITERATIONS = 10
+
+# Rows converted to float32 at a time by exact scans and bulk assignment
+SCAN_CHUNK_ROWS = 65536
+
+# Candidate rows gathered and scored at a time, small enough to stay in cache
+CANDIDATE_CHUNK_ROWS = 1024
+
+# New IDs collected per cluster before they are merged into its array
+TAIL_MERGE_SIZE = 1024
+
+# float32 value of every float16 bit pattern; a table lookup widens candidate
+# vectors about three times faster than numpy's float16 conversion
+FLOAT16_TO_FLOAT32 = np.arange(65536, dtype=np.uint16).view(np.float16).astype(np.float32)
+
+
+def widen(vectors):
+    """float16 rows to float32, through the lookup table"""
+    if vectors.dtype != np.float16:
+        return np.asarray(vectors, dtype=np.float32)
+    return np.take(FLOAT16_TO_FLOAT32, np.ascontiguousarray(vectors).view(np.uint16))
+
+
+def normalize(vectors):
+    """
+    L2-normalize embeddings so a dot product is their cosine similarity
+
+    Args:
+        vectors (np.array): Array of shape (N, dim) or (dim,)
+
+    Returns:
+        np.array: float32 array of shape (N, dim)
+    """
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def encode_embedding(vector):
+    """
+    Compact JSON form of an embedding: normalized float16, base64 encoded
+
+    Returns:
+        dict: {'dim', 'dtype', 'data'}
+    """
+    vector = normalize(vector)[0].astype(np.float16)
+    return {'dim': int(vector.size), 'dtype': 'float16', 'data': base64.b64encode(vector.tobytes()).decode('ascii')}
+
+
+def decode_embedding(value):
+    """
+    Read an embedding sent by a client
+
+    Args:
+        value (dict, str or list): Output of encode_embedding, its base64 'data' string,
+            or a plain list of numbers
+
+    Returns:
+        np.array: float32 vector
+    """
+    if isinstance(value, dict):
+        value = value.get('data')
+    if isinstance(value, str):
+        try:
+            return np.frombuffer(base64.b64decode(value, validate=True), dtype=np.float16).astype(np.float32)
+        except ValueError:
+            raise ValueError('embedding is not valid base64 float16 data')
+    if isinstance(value, (list, tuple)):
+        return np.asarray(value, dtype=np.float32)
+    raise ValueError('embedding must be an encoded embedding object, a base64 string or a list of numbers')
+
+
+class EmbeddingIndex:
+    def __init__(self, directory, dim, model_id=None, num_lists=DEFAULT_NUM_LISTS,
+                 num_probes=DEFAULT_NUM_PROBES, train_size=None, stats_window=1000):
+        """
+        Open (and create if needed) a similar-case store
+
+        Args:
+            directory (str): Directory holding the vector, index and case files
+            dim (int): Embedding size
+            model_id (str): Identity of the model producing the embeddings; a store
+                built with another model is refused, as its vectors are not comparable
+            num_lists (int): Clusters of the inverted-file index
+            num_probes (int): Clusters scanned per query
+            train_size (int): Vectors stored before the index is trained,
+                defaults to TRAIN_VECTORS_PER_LIST per cluster
+            stats_window (int): Number of recent searches kept for latency percentiles
+        """
+        self.directory = directory
+        self.dim = int(dim)
+        self.model_id = model_id
+        self.num_lists = max(1, int(num_lists))
+        self.num_probes = max(1, min(int(num_probes), self.num_lists))
+        self.train_size = int(train_size) if train_size else self.num_lists * TRAIN_VECTORS_PER_LIST
+        self.row_bytes = self.dim * np.dtype(np.float16).itemsize
+
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, 'vectors.f16')
+        self.assignments_path = os.path.join(directory, 'lists.i32')
+        self.centroids_path = os.path.join(directory, 'centroids.npy')
+        self.meta_path = os.path.join(directory, 'meta.json')
+
+        self._lock = threading.Lock()
+        self._count = 0
+        self._mapped = None
+        self._centroids = None
+        self._lists = []  # Cluster -> array of vector IDs
+        self._tails = []  # Cluster -> IDs added since its array was last merged
+        self._training = None  # Background k-means thread, while one runs
+        self._closed = False
+
+        # Counters
+        self._adds = 0
+        self._searches = 0
+        self._search_times = deque(maxlen=stats_window)
+        self._train_seconds = None
+
+        self._check_meta()
+        self._open_db()
+        self._open_vectors()
+        self._open_index()
+
+    def _check_meta(self):
+        """Record the store's shape and model, or check them against an existing store"""
+        meta = {'dim': self.dim, 'model_id': self.model_id, 'num_lists': self.num_lists}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                stored = json.load(f)
+            if stored['dim'] != self.dim or (self.model_id and stored.get('model_id') not in (None, self.model_id)):
+                raise ValueError(
+                    f"Embedding store {self.directory} holds {stored['dim']}-d vectors from "
+                    f"{stored.get('model_id')}, not {self.dim}-d vectors from {self.model_id}"
+                )
+            self.num_lists = stored.get('num_lists', self.num_lists)
+            self.num_probes = min(self.num_probes, self.num_lists)
+        else:
+            with open(self.meta_path, 'w') as f:
+                json.dump({**meta, 'created_at': time.time()}, f)
+
+    def _open_db(self):
+        """Open the case table; a case's ID is its row in the vector file"""
+        self._db = sqlite3.connect(os.path.join(self.directory, 'cases.sqlite3'), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS cases ('
+            'id INTEGER PRIMARY KEY, '
+            'class_name TEXT NOT NULL, '
+            'metadata TEXT NOT NULL, '
+            'created_at REAL NOT NULL)'
+        )
+        self._db.commit()
+
+    def _open_vectors(self):
+        """Count stored vectors, dropping any written after the last committed case"""
+        vector_count = os.path.getsize(self.vectors_path) // self.row_bytes if os.path.exists(self.vectors_path) else 0
+        case_count = self._db.execute('SELECT COALESCE(MAX(id) + 1, 0) FROM cases').fetchone()[0]
+        self._count = min(vector_count, case_count)
+
+        # Vectors are appended before their cases are committed, so an interrupted add leaves extras
+        with open(self.vectors_path, 'ab') as f:
+            f.truncate(self._count * self.row_bytes)
+        if case_count > self._count:
+            self._db.execute('DELETE FROM cases WHERE id >= ?', (self._count,))
+            self._db.commit()
+        self._vectors_file = open(self.vectors_path, 'ab')
+
+    def _open_index(self):
+        """Load the centroids and rebuild the cluster lists from the stored assignments"""
+        if not os.path.exists(self.centroids_path):
+            return
+        self._centroids = np.load(self.centroids_path)
+        self.num_lists = len(self._centroids)
+
+        assignments = np.fromfile(self.assignments_path, dtype=np.int32) if os.path.exists(self.assignments_path) else np.empty(0, np.int32)
+        assignments = assignments[:self._count]
+        if len(assignments) < self._count:
+            # Assign vectors whose assignments were not written before a restart
+            missing = self._assign(self._vectors(self._count)[len(assignments):])
+            assignments = np.concatenate([assignments, missing])
+        with open(self.assignments_path, 'wb') as f:
+            assignments.tofile(f)
+        self._assignments_file = open(self.assignments_path, 'ab')
+        self._build_lists(assignments)
+
+    def _build_lists(self, assignments):
+        """Group vector IDs by cluster"""
+        order = np.argsort(assignments, kind='stable')
+        bounds = np.cumsum(np.bincount(assignments, minlength=self.num_lists))[:-1]
+        self._lists = np.split(order.astype(np.int64), bounds)
+        self._tails = [[] for _ in range(self.num_lists)]
+
+    def _vectors(self, count):
+        """Memory-mapped view of the first count vectors, remapped as the file grows"""
+        if count == 0:
+            return np.empty((0, self.dim), dtype=np.float16)
+        if self._mapped is None or len(self._mapped) < count:
+            self._vectors_file.flush()
+            self._mapped = np.memmap(self.vectors_path, dtype=np.float16, mode='r', shape=(count, self.dim))
+        return self._mapped[:count]
+
+    def _assign(self, vectors, centroids=None):
+        """Nearest centroid (of the index by default) for each vector, in chunks"""
+        centroids = self._centroids if centroids is None else centroids
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), SCAN_CHUNK_ROWS):
+            chunk = widen(vectors[start:start + SCAN_CHUNK_ROWS])
+            assignments[start:start + len(chunk)] = (chunk @ centroids.T).argmax(axis=1)
+        return assignments
+
+    @property
+    def trained(self):
+        return self._centroids is not None
+
+    def __len__(self):
+        return self._count
+
+    def add(self, embeddings, class_names, metadata=None):
+        """
+        Append confirmed cases; the index is updated in place, never rebuilt
+
+        Once the store reaches train_size the index is trained in a background
+        thread; searches stay exact until it is ready
+
+        Args:
+            embeddings (np.array): Array of shape (N, dim)
+            class_names (list): Confirmed class of each case
+            metadata (list): Optional JSON-serialisable dict per case (note, confirmed_by, ...)
+
+        Returns:
+            list: Case IDs
+        """
+        vectors = normalize(embeddings)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d embeddings, got {vectors.shape[1]}-d")
+        if len(class_names) != len(vectors):
+            raise ValueError('One class name is needed per embedding')
+        metadata = metadata or [{}] * len(vectors)
+        now = time.time()
+
+        with self._lock:
+            first_id = self._count
+            ids = list(range(first_id, first_id + len(vectors)))
+            self._vectors_file.write(vectors.astype(np.float16).tobytes())
+            self._vectors_file.flush()
+            self._db.executemany(
+                'INSERT INTO cases (id, class_name, metadata, created_at) VALUES (?, ?, ?, ?)',
+                [(case_id, class_name, json.dumps(meta), now) for case_id, class_name, meta in zip(ids, class_names, metadata)]
+            )
+            self._db.commit()
+            self._count += len(vectors)
+            self._adds += len(vectors)
+
+            if self.trained:
+                self._index_new(vectors, ids)
+            elif self._count >= self.train_size and self._training is None:
+                self._training = threading.Thread(target=self._train, name='embedding-index-train', daemon=True)
+                self._training.start()
+        return ids
+
+    def wait_for_training(self, timeout=None):
+        """
+        Wait for a background training run to finish
+
+        Args:
+            timeout (float): Seconds to wait, None waits until it does
+
+        Returns:
+            bool: True once no training is running
+        """
+        training = self._training
+        if training is not None:
+            training.join(timeout)
+            return not training.is_alive()
+        return True
+
+    def _index_new(self, vectors, ids):
+        """Assign new vectors to their clusters (lock held)"""
+        assignments = self._assign(vectors)
+        assignments.tofile(self._assignments_file)
+        self._assignments_file.flush()
+        for case_id, cluster in zip(ids, assignments):
+            tail = self._tails[cluster]
+            tail.append(case_id)
+            if len(tail) >= TAIL_MERGE_SIZE:
+                self._lists[cluster] = np.concatenate([self._lists[cluster], np.array(tail, dtype=np.int64)])
+                tail.clear()
+
+    def _train(self):
+        """
+        Spherical k-means on a sample of the stored vectors, then assign them all
+
+        Runs in a background thread on the vectors stored when it starts; the lock
+        is only held to take that snapshot and to swap the index in, so adds and
+        (exact) searches carry on meanwhile
+        """
+        try:
+            started_at = time.perf_counter()
+            with self._lock:
+                count = self._count
+                # Stored rows never change, so this view stays valid while more are appended
+                vectors = self._vectors(count)
+
+            rng = np.random.default_rng(0)
+            sample_size = min(count, self.num_lists * MAX_TRAIN_VECTORS_PER_LIST)
+            sample = normalize(vectors[np.sort(rng.choice(count, sample_size, replace=False))])
+            num_lists = min(self.num_lists, sample_size)
+
+            centroids = sample[rng.choice(sample_size, num_lists, replace=False)]
+            for _ in range(KMEANS_ITERATIONS):
+                labels = (sample @ centroids.T).argmax(axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                counts = np.bincount(labels, minlength=num_lists)
+                # Empty clusters restart from random vectors
+                empty = counts == 0
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+                centroids = normalize(sums)
+            assignments = self._assign(vectors, centroids)
+
+            with self._lock:
+                if self._closed:
+                    return
+                # Vectors added while training are assigned before the index is swapped in
+                if self._count > count:
+                    assignments = np.concatenate([assignments, self._assign(self._vectors(self._count)[count:], centroids)])
+                with open(self.assignments_path, 'wb') as f:
+                    assignments.tofile(f)
+                # The centroids file marks the store as trained, so it is written last
+                np.save(self.centroids_path, centroids)
+                self._assignments_file = open(self.assignments_path, 'ab')
+                self.num_lists = num_lists
+                self._build_lists(assignments)
+                self._centroids = centroids
+                self._train_seconds = time.perf_counter() - started_at
+            print(f"🧭 Embedding index trained: {num_lists} clusters over {count} vectors "
+                  f"in {self._train_seconds * 1000.0:.0f} ms")
+        except Exception as e:
+            print(f"❌ Embedding index training failed, search stays exact: {e}")
+        finally:
+            with self._lock:
+                self._training = None
+
+    def search(self, query, k=5, num_probes=None):
+        """
+        Find the stored vectors most similar to a query
+
+        Args:
+            query (np.array): Embedding of shape (dim,)
+            k (int): Number of neighbours
+            num_probes (int): Clusters scanned, defaults to the index setting
+
+        Returns:
+            list: (case ID, cosine similarity) pairs, most similar first
+        """
+        query = normalize(query)[0]
+        if query.size != self.dim:
+            raise ValueError(f"Expected a {self.dim}-d embedding, got {query.size}-d")
+        started_at = time.perf_counter()
+
+        with self._lock:
+            count = self._count
+            vectors = self._vectors(count)
+            centroids = self._centroids
+            if centroids is not None:
+                probes = min(int(num_probes or self.num_probes), len(centroids))
+                nearest = np.argpartition(-(centroids @ query), probes - 1)[:probes]
+                candidates = np.concatenate(
+                    [self._lists[cluster] for cluster in nearest]
+                    + [np.array(self._tails[cluster], dtype=np.int64) for cluster in nearest]
+                )
+
+        if count == 0:
+            return []
+
+        if centroids is None:
+            # Exact scan until the index is trained
+            candidates = None
+            scores = np.empty(count, dtype=np.float32)
+            for start in range(0, count, SCAN_CHUNK_ROWS):
+                chunk = vectors[start:start + SCAN_CHUNK_ROWS]
+                scores[start:start + len(chunk)] = widen(chunk) @ query
+        else:
+            # Sorted IDs read the memory map in file order
+            candidates.sort()
+            scores = np.empty(len(candidates), dtype=np.float32)
+            for start in range(0, len(candidates), CANDIDATE_CHUNK_ROWS):
+                chunk = candidates[start:start + CANDIDATE_CHUNK_ROWS]
+                scores[start:start + len(chunk)] = widen(vectors[chunk]) @ query
+
+        k = min(int(k), len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        ids = top if candidates is None else candidates[top]
+
+        elapsed = time.perf_counter() - started_at
+        with self._lock:
+            self._searches += 1
+            self._search_times.append(elapsed)
+        return [(int(case_id), float(scores[index])) for case_id, index in zip(ids, top)]
+
+    def get_cases(self, ids):
+        """
+        Case details by ID
+
+        Returns:
+            dict: Case ID -> {'class_name', 'created_at', **metadata}
+        """
+        if not ids:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, class_name, metadata, created_at FROM cases WHERE id IN ({','.join('?' * len(ids))})",
+                list(ids)
+            ).fetchall()
+        return {
+            case_id: {'class_name': class_name, 'created_at': created_at, **json.loads(metadata)}
+            for case_id, class_name, metadata, created_at in rows
+        }
+
+    def search_cases(self, query, k=5):
+        """
+        Most similar confirmed cases with their details
+
+        Returns:
+            list: Dicts with case_id, similarity, class_name, created_at and the case metadata
+        """
+        matches = self.search(query, k)
+        cases = self.get_cases([case_id for case_id, _ in matches])
+        return [
+            # float16 rounding can put a near-duplicate just above 1
+            {'case_id': case_id, 'similarity': round(min(similarity, 1.0), 4), **cases.get(case_id, {})}
+            for case_id, similarity in matches
+        ]
+
+    def close(self):
+        """Close the open files; a training run still in progress is abandoned"""
+        with self._lock:
+            self._closed = True
+            self._vectors_file.close()
+            if self.trained:
+                self._assignments_file.close()
+            self._db.close()
+
+    def get_stats(self):
+        """Store size, index state and search latency"""
+        with self._lock:
+            times_ms = np.array(self._search_times) * 1000.0
+            sizes = [len(self._lists[cluster]) + len(self._tails[cluster]) for cluster in range(len(self._lists))]
+            return {
+                'directory': self.directory,
+                'model_id': self.model_id,
+                'dim': self.dim,
+                'vectors': self._count,
+                'vector_file_mb': round(self._count * self.row_bytes / 1048576, 2),
+                'trained': self.trained,
+                'training': self._training is not None,
+                'train_size': self.train_size,
+                'train_ms': round(self._train_seconds * 1000.0, 3) if self._train_seconds is not None else None,
+                'num_lists': self.num_lists,
+                'num_probes': self.num_probes,
+                'largest_list': max(sizes) if sizes else 0,
+                'added': self._adds,
+                'searches': self._searches,
+                'search_ms': {
+                    'mean': round(float(times_ms.mean()), 3) if len(times_ms) else 0.0,
+                    'p50': round(float(np.percentile(times_ms, 50)), 3) if len(times_ms) else 0.0,
+                    'p95': round(float(np.percentile(times_ms, 95)), 3) if len(times_ms) else 0.0,
+                    'max': round(float(times_ms.max()), 3) if len(times_ms) else 0.0
+                }
+            }
@@ -0,0 +1,53 @@
+"""
+Gunicorn configuration for the plant disease service
+
+Scales HTTP workers across all cores without loading the model in each of them:
+the model lives in one inference process (inference_server.py) started by the
+gunicorn master, and the workers send it batches over a Unix socket.
+
+    gunicorn -c gunicorn.conf.py app_advanced:app
+
+TensorFlow is not fork-safe once initialised, so the app is not preloaded in
+the master. Set INFERENCE_BACKEND=tflite instead to give every worker its own
+TFLite interpreter; the .tflite file is memory-mapped, so the weights are still
+shared through the page cache.
+"""
+
+import multiprocessing
+import os
+import secrets
+import subprocess
+import sys
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = 120
+preload_app = False
+
+# Workers inherit these from the master
+os.environ.setdefault('INFERENCE_BACKEND', 'remote')
+os.environ.setdefault('INFERENCE_SOCKET', '/tmp/krishivannai-inference.sock')
+os.environ.setdefault('INFERENCE_AUTHKEY', secrets.token_hex(16))
+
+inference_process = None
+
+
+def on_starting(server):
+    """Start the shared inference process before any worker boots"""
+    global inference_process
+    if os.environ['INFERENCE_BACKEND'] != 'remote':
+        return
+    inference_process = subprocess.Popen(
+        [sys.executable, 'inference_server.py', '--socket', os.environ['INFERENCE_SOCKET']],
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    server.log.info(f"Started inference server (pid {inference_process.pid})")
+
+
+def on_exit(server):
+    """Stop the shared inference process with the master"""
+    if inference_process is not None and inference_process.poll() is None:
+        inference_process.terminate()
+        inference_process.wait(timeout=30)
@@ -0,0 +1,223 @@
+"""
+Cheap image-quality gate for the plant disease service
+Scores blur, exposure and leaf coverage on the model-sized uint8 array, so
+blurry, badly exposed or leafless uploads can be turned away before they
+cost a forward pass
+"""
+
+import threading
+import time
+
+import numpy as np
+
+QUALITY_GATE_MODES = ('off', 'warn', 'reject')
+
+# Luminance weights (ITU-R BT.601) in 1/256ths, for integer grayscale
+LUMA_WEIGHTS = np.array([77, 150, 29], dtype=np.uint16)
+
+# Grayscale levels counted as crushed shadows / blown highlights
+DARK_LEVEL = 16
+BRIGHT_LEVEL = 240
+
+# Excess green (2G - R - B) above which a pixel counts as leaf
+GREEN_MARGIN = 20
+
+QUALITY_MESSAGES = {
+    'blurry': 'The photo is out of focus. Hold the camera steady and tap the leaf to focus.',
+    'too_dark': 'The photo is too dark. Take it in daylight or turn on the flash.',
+    'overexposed': 'The photo is too bright. Avoid direct sun on the leaf or shade it.',
+    'no_leaf': 'No leaf was found. Fill the frame with the affected leaf.'
+}
+
+
+def assess_quality(image_array):
+    """
+    Measure blur, exposure and green coverage of a model-sized image
+
+    Args:
+        image_array (np.array): uint8 RGB array of shape (H, W, 3) or (1, H, W, 3)
+
+    Returns:
+        dict: sharpness (Laplacian variance), brightness (mean gray level),
+            dark_fraction, bright_fraction and green_coverage
+    """
+    image = image_array[0] if image_array.ndim == 4 else image_array
+
+    gray = (np.dot(image, LUMA_WEIGHTS) >> 8).astype(np.uint8)
+
+    # Exposure from the 256-bin histogram
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    pixels = gray.size
+    brightness = float(np.dot(histogram, np.arange(256))) / pixels
+
+    # Blur: variance of the 4-neighbour Laplacian
+    levels = gray.astype(np.float32)
+    laplacian = (levels[:-2, 1:-1] + levels[2:, 1:-1] + levels[1:-1, :-2] + levels[1:-1, 2:]
+                 - 4.0 * levels[1:-1, 1:-1])
+
+    # Leaf presence: share of pixels where green clearly dominates
+    green = image[..., 1].astype(np.int16)
+    excess_green = 2 * green - image[..., 0] - image[..., 2]
+
+    return {
+        'sharpness': round(float(laplacian.var()), 2),
+        'brightness': round(brightness, 2),
+        'dark_fraction': round(float(histogram[:DARK_LEVEL].sum()) / pixels, 4),
+        'bright_fraction': round(float(histogram[BRIGHT_LEVEL:].sum()) / pixels, 4),
+        'green_coverage': round(float(np.count_nonzero(excess_green > GREEN_MARGIN)) / pixels, 4)
+    }
+
+
+class QualityGate:
+    def __init__(self, mode='warn', min_sharpness=10.0, min_brightness=35.0, max_brightness=230.0,
+                 max_clipped_fraction=0.6, min_green_coverage=0.05):
+        """
+        Initialize the quality gate
+
+        Args:
+            mode (str): 'off', 'warn' (score and flag issues) or 'reject' (skip the model)
+            min_sharpness (float): Laplacian variance below which an image is blurry
+            min_brightness (float): Mean gray level (0-255) below which an image is too dark
+            max_brightness (float): Mean gray level above which an image is overexposed
+            max_clipped_fraction (float): Share of crushed or blown pixels that also fails exposure
+            min_green_coverage (float): Share of green pixels below which no leaf is assumed
+        """
+        if mode not in QUALITY_GATE_MODES:
+            raise ValueError(f"Unknown quality gate mode '{mode}', expected one of {QUALITY_GATE_MODES}")
+        self.mode = mode
+        self.min_sharpness = float(min_sharpness)
+        self.min_brightness = float(min_brightness)
+        self.max_brightness = float(max_brightness)
+        self.max_clipped_fraction = float(max_clipped_fraction)
+        self.min_green_coverage = float(min_green_coverage)
+
+        self._lock = threading.Lock()
+        self._checked = 0
+        self._passed = 0
+        self._warned = 0
+        self._rejected = 0
+        self._issues = {issue: 0 for issue in QUALITY_MESSAGES}
+        self._check_seconds = 0.0
+        # Measured inference time per image, by TTA mode, to price what a rejection saves
+        self._inference_seconds = {}
+        self._inference_images = {}
+        self._seconds_saved = 0.0
+
+    def settings(self, mode=None):
+        """
+        Mode and thresholds in effect for a request, for keying cached results
+        that were (or were not) checked under them
+
+        Args:
+            mode (str): Per-request override of the gate mode
+        """
+        mode = mode or self.mode
+        if mode == 'off':
+            return {'mode': mode}
+        return {
+            'mode': mode,
+            'min_sharpness': self.min_sharpness,
+            'min_brightness': self.min_brightness,
+            'max_brightness': self.max_brightness,
+            'max_clipped_fraction': self.max_clipped_fraction,
+            'min_green_coverage': self.min_green_coverage
+        }
+
+    def issues(self, measures):
+        """Names of the checks the measures fail"""
+        found = []
+        if measures['sharpness'] < self.min_sharpness:
+            found.append('blurry')
+        if measures['brightness'] < self.min_brightness or measures['dark_fraction'] > self.max_clipped_fraction:
+            found.append('too_dark')
+        elif measures['brightness'] > self.max_brightness or measures['bright_fraction'] > self.max_clipped_fraction:
+            found.append('overexposed')
+        if measures['green_coverage'] < self.min_green_coverage:
+            found.append('no_leaf')
+        return found
+
+    def check(self, image_array, use_tta=False, mode=None):
+        """
+        Assess an image and decide whether it should reach the model
+
+        Args:
+            image_array (np.array): Model-sized uint8 RGB array
+            use_tta (bool or str): TTA option the image would be scored with, to price a rejection
+            mode (str): Per-request override of the gate mode
+
+        Returns:
+            dict: Quality report with the measures, the issues found, their
+                messages and whether the image is rejected, or None when the gate is off
+        """
+        mode = mode or self.mode
+        if mode == 'off':
+            return None
+
+        started_at = time.perf_counter()
+        measures = assess_quality(image_array)
+        found = self.issues(measures)
+        elapsed = time.perf_counter() - started_at
+
+        rejected = bool(found) and mode == 'reject'
+        with self._lock:
+            self._checked += 1
+            self._check_seconds += elapsed
+            if not found:
+                self._passed += 1
+            elif rejected:
+                self._rejected += 1
+                self._seconds_saved += self._inference_cost(use_tta)
+            else:
+                self._warned += 1
+            for issue in found:
+                self._issues[issue] += 1
+
+        return {
+            'passed': not found,
+            'rejected': rejected,
+            'issues': found,
+            'messages': [QUALITY_MESSAGES[issue] for issue in found],
+            'measures': measures
+        }
+
+    def record_inference(self, seconds, images, use_tta):
+        """Record how long scoring took, so rejections can be priced"""
+        key = str(use_tta)
+        with self._lock:
+            self._inference_seconds[key] = self._inference_seconds.get(key, 0.0) + seconds
+            self._inference_images[key] = self._inference_images.get(key, 0) + images
+
+    def _inference_cost(self, use_tta):
+        """Mean measured seconds per image for a TTA mode; call with the lock held"""
+        key = str(use_tta)
+        images = self._inference_images.get(key)
+        if images:
+            return self._inference_seconds[key] / images
+        # Nothing scored with this mode yet; fall back to the overall mean
+        total_images = sum(self._inference_images.values())
+        return sum(self._inference_seconds.values()) / total_images if total_images else 0.0
+
+    def get_stats(self):
+        """Gate outcomes, issue counts, check cost and inference time saved"""
+        with self._lock:
+            checked = self._checked
+            stats = {
+                'mode': self.mode,
+                'thresholds': {
+                    'min_sharpness': self.min_sharpness,
+                    'min_brightness': self.min_brightness,
+                    'max_brightness': self.max_brightness,
+                    'max_clipped_fraction': self.max_clipped_fraction,
+                    'min_green_coverage': self.min_green_coverage
+                },
+                'checked': checked,
+                'passed': self._passed,
+                'warned': self._warned,
+                'rejected': self._rejected,
+                'issues': dict(self._issues),
+                'check_ms_per_image': round(self._check_seconds * 1000.0 / checked, 3) if checked else 0.0,
+                'check_seconds': round(self._check_seconds, 3),
+                'inference_seconds_saved': round(self._seconds_saved, 3),
+                'net_seconds_saved': round(self._seconds_saved - self._check_seconds, 3)
+            }
+        return stats
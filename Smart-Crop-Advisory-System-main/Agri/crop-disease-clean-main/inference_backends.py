@@ -0,0 +1,808 @@
+"""
+Inference backends for the plant disease predictor
+Keras (.h5) and TensorFlow Lite (.tflite) runtimes behind one interface
+"""
+
+import hashlib
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Client
+
+import numpy as np
+
+
+# Batch sizes with a dedicated compiled inference path
+DEFAULT_BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+# uint8 pixels are scaled to [0, 1] by this factor, inside the model where possible
+PIXEL_SCALE = np.float32(1.0 / 255.0)
+
+
+def with_uint8_input(model):
+    """
+    Wrap a Keras model that expects float pixels in [0, 1] so it takes uint8 pixels
+
+    The scaling is a Rescaling layer on a uint8 Input, so it is part of the model
+    graph: compiled functions, converted .tflite files and the inference server
+    all take the pixels as uint8.
+
+    Args:
+        model: Keras model with one float NHWC input in [0, 1]
+
+    Returns:
+        Keras model with the same outputs and a uint8 input in [0, 255]
+    """
+    import tensorflow as tf
+
+    pixels = tf.keras.Input(shape=tuple(model.input_shape[1:]), dtype='uint8', name='pixels')
+    scaled = tf.keras.layers.Rescaling(float(PIXEL_SCALE), name='pixel_scaling')(pixels)
+    return tf.keras.Model(pixels, model(scaled, training=False), name=f"{model.name}_uint8")
+
+
+def configure_tensorflow_threads(intra_op_threads=None, inter_op_threads=None):
+    """
+    Size TensorFlow's thread pools; only possible before the runtime starts
+
+    Args:
+        intra_op_threads (int): Threads used inside one op, None keeps the default (all cores)
+        inter_op_threads (int): Ops run concurrently, None keeps the default
+
+    Returns:
+        bool: False if TensorFlow was already initialised and the setting was ignored
+    """
+    if not intra_op_threads and not inter_op_threads:
+        return True
+
+    import tensorflow as tf
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(int(intra_op_threads))
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(int(inter_op_threads))
+    except RuntimeError as e:
+        print(f"⚠️ TensorFlow thread pools already created, keeping their size: {e}")
+        return False
+    return True
+
+
+class InferenceBackend:
+    """Base class: loads a model file and scores uint8 or float32 NHWC batches"""
+
+    name = 'base'
+
+    # Whether predict_with_embeddings is available
+    supports_embeddings = False
+
+    # Whether predict_with_activations and class_activation_maps are available
+    supports_heatmaps = False
+
+    def __init__(self, model_path, batch_buckets=DEFAULT_BATCH_BUCKETS):
+        self.model_path = model_path
+        self.input_shape = None
+        self.batch_buckets = tuple(sorted(set(int(size) for size in batch_buckets))) if batch_buckets else ()
+        self._padding_buffers = threading.local()
+        self._content_hash = None
+
+    def predict(self, image_batch):
+        """
+        Score a batch of images
+
+        Args:
+            image_batch (np.array): uint8 array of shape (N, H, W, 3) in [0, 255],
+                or float32 in [0, 1] (TTA views)
+
+        Returns:
+            np.array: Class probabilities of shape (N, num_classes)
+        """
+        raise NotImplementedError
+
+    def predict_with_embeddings(self, image_batch):
+        """
+        Score a batch and return the penultimate-layer features from the same forward pass
+
+        Args:
+            image_batch (np.array): As for predict
+
+        Returns:
+            tuple: (class probabilities of shape (N, num_classes),
+                float32 embeddings of shape (N, embedding_dim))
+        """
+        raise NotImplementedError(f"The {self.name} backend cannot return embeddings")
+
+    def predict_with_activations(self, image_batch):
+        """
+        Score a batch and return the last convolutional feature maps from the same forward pass
+
+        Args:
+            image_batch (np.array): As for predict
+
+        Returns:
+            tuple: (class probabilities of shape (N, num_classes),
+                float32 embeddings of shape (N, embedding_dim),
+                float32 feature maps of shape (N, height, width, channels))
+        """
+        raise NotImplementedError(f"The {self.name} backend cannot return activations")
+
+    def class_activation_maps(self, activations, class_indices):
+        """
+        Grad-CAM heatmaps from feature maps returned by predict_with_activations
+
+        Only the classifier head after the feature maps is differentiated,
+        so the backbone is not run again.
+
+        Args:
+            activations (np.array): Feature maps of shape (N, height, width, channels)
+            class_indices (np.array): Class to explain for each image, shape (N,)
+
+        Returns:
+            np.array: float32 heatmaps of shape (N, height, width), scaled to [0, 1]
+        """
+        raise NotImplementedError(f"The {self.name} backend cannot compute heatmaps")
+
+    def _padded(self, chunk, bucket):
+        """Copy a short chunk into this thread's reusable, zero-padded bucket buffer"""
+        key = (bucket, chunk.shape[1:], chunk.dtype.str)
+        buffers = getattr(self._padding_buffers, 'buffers', None)
+        if buffers is None:
+            buffers = self._padding_buffers.buffers = {}
+        buffer = buffers.get(key)
+        if buffer is None:
+            buffer = buffers[key] = np.zeros((bucket,) + chunk.shape[1:], dtype=chunk.dtype)
+        buffer[:len(chunk)] = chunk
+        buffer[len(chunk):] = 0
+        return buffer
+
+    def iter_bucketed(self, image_batch):
+        """
+        Split a batch into chunks padded up to the batch-size buckets
+
+        Yields:
+            tuple: (padded chunk, number of real images in it)
+        """
+        if not self.batch_buckets:
+            yield image_batch, len(image_batch)
+            return
+
+        max_bucket = self.batch_buckets[-1]
+        for start in range(0, len(image_batch), max_bucket):
+            chunk = image_batch[start:start + max_bucket]
+            count = len(chunk)
+            bucket = next(size for size in self.batch_buckets if size >= count)
+            if bucket != count:
+                chunk = self._padded(chunk, bucket)
+            yield chunk, count
+
+    def warm_up(self, batch_sizes=None):
+        """
+        Run each batch-size bucket once so no request pays for tracing or allocation
+
+        Args:
+            batch_sizes (tuple): Batch sizes to warm up, defaults to the buckets
+
+        Returns:
+            dict: Batch size -> first-call and steady-state latency in ms
+        """
+        timings = {}
+        for batch_size in batch_sizes or self.batch_buckets or (1,):
+            # Requests arrive as uint8; TTA views as float32
+            for dtype in (np.uint8, np.float32):
+                batch = np.zeros((batch_size,) + tuple(self.input_shape[1:]), dtype=dtype)
+                timing = self._time_twice(lambda: self.predict(batch))
+                if dtype is np.uint8:
+                    timings[str(batch_size)] = timing
+        return timings
+
+    def warm_up_features(self, batch_size=None):
+        """
+        Run the embedding and activation passes, and Grad-CAM, once at one batch size
+
+        Each output set has its own compiled functions, which warm_up does not reach.
+
+        Args:
+            batch_size (int): Batch size to warm up, defaults to the smallest bucket
+
+        Returns:
+            dict: Output set ('embeddings', 'activations', 'heatmaps') -> first-call
+                and steady-state latency in ms; empty when the backend has neither
+        """
+        batch_size = batch_size or (self.batch_buckets[0] if self.batch_buckets else 1)
+        timings = {}
+        for dtype in (np.uint8, np.float32):
+            batch = np.zeros((batch_size,) + tuple(self.input_shape[1:]), dtype=dtype)
+            if self.supports_embeddings:
+                timing = self._time_twice(lambda: self.predict_with_embeddings(batch))
+                if dtype is np.uint8:
+                    timings['embeddings'] = timing
+            if self.supports_heatmaps:
+                timing = self._time_twice(lambda: self.predict_with_activations(batch))
+                if dtype is np.uint8:
+                    timings['activations'] = timing
+
+        if self.supports_heatmaps:
+            _, _, activations = self.predict_with_activations(batch)
+            class_indices = np.zeros(batch_size, dtype=np.int32)
+            timings['heatmaps'] = self._time_twice(lambda: self.class_activation_maps(activations, class_indices))
+        return timings
+
+    @staticmethod
+    def _time_twice(call):
+        """Time a first and a second call, in ms"""
+        started_at = time.perf_counter()
+        call()
+        first_call = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        call()
+        steady = time.perf_counter() - started_at
+        return {
+            'first_call_ms': round(first_call * 1000.0, 3),
+            'steady_ms': round(steady * 1000.0, 3)
+        }
+
+    def fingerprint(self):
+        """Identify the model file by name, size and modification time"""
+        stat = os.stat(self.model_path)
+        return f"{os.path.basename(self.model_path)}:{stat.st_size}:{int(stat.st_mtime)}:{self.name}"
+
+    def content_hash(self):
+        """SHA-256 of the model file (or of every file in a model directory), computed once"""
+        if self._content_hash is None:
+            if os.path.isdir(self.model_path):
+                paths = sorted(
+                    os.path.join(root, name) for root, _, names in os.walk(self.model_path) for name in names
+                )
+            else:
+                paths = [self.model_path]
+            digest = hashlib.sha256()
+            for path in paths:
+                with open(path, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+            self._content_hash = digest.hexdigest()
+        return self._content_hash
+
+    def embedding_fingerprint(self):
+        """
+        Identify the embedding space by the weights alone, so stored vectors stay
+        usable after the file is copied or redeployed, or served by another backend
+        """
+        return f"sha256:{self.content_hash()}"
+
+    def memory_bytes(self):
+        """Approximate memory held by the model, for memory budgets: the model file size"""
+        return os.path.getsize(self.model_path)
+
+    def get_info(self):
+        """Get information about the loaded backend"""
+        return {
+            'backend': self.name,
+            'model_path': self.model_path,
+            'input_shape': list(self.input_shape) if self.input_shape else None,
+            'batch_buckets': list(self.batch_buckets)
+        }
+
+
+class KerasBackend(InferenceBackend):
+    """
+    Full TensorFlow runtime running a Keras model
+
+    model.predict builds a data adapter and callbacks on every call, which
+    dominates single-image latency. Instead each batch-size bucket gets a
+    tf.function with a fixed input signature, traced once and reused.
+    uint8 batches run through the model wrapped by with_uint8_input, so they
+    are scaled to [0, 1] inside that graph and no float32 copy of the pixels
+    is made in Python; float32 batches (TTA views) use the model as loaded.
+    """
+
+    name = 'keras'
+    supports_embeddings = True
+
+    # Largest difference allowed between the model's output and the head replayed on its
+    # feature maps; beyond it the head is not a plain chain and heatmaps are unavailable
+    HEAD_REPLAY_TOLERANCE = 1e-4
+
+    def __init__(self, model_path, batch_buckets=DEFAULT_BATCH_BUCKETS):
+        super().__init__(model_path, batch_buckets)
+        import tensorflow as tf
+
+        self._tf = tf
+        self.model = tf.keras.models.load_model(model_path, compile=False)
+        self.input_shape = tuple(self.model.input_shape)
+
+        self._functions = {}
+        self._functions_lock = threading.Lock()
+        self._uint8_models = {}
+        self._embedding_model = None
+        self._activation_model = None
+        self._heatmap_head = None
+        self._heatmap_function = None
+        self._heatmap_error = None
+        self.heatmap_layer = None
+
+    def _classifier(self):
+        """The classifier (last weighted) layer; its input is the embedding"""
+        return next(layer for layer in reversed(self.model.layers) if layer.weights)
+
+    def embedding_fingerprint(self):
+        return f"{super().embedding_fingerprint()}:{self._classifier().name}"
+
+    def _get_embedding_model(self):
+        """The model with the input of its classifier (last weighted) layer as a second output"""
+        if self._embedding_model is None:
+            with self._functions_lock:
+                if self._embedding_model is None:
+                    classifier = self._classifier()
+                    self._embedding_model = self._tf.keras.Model(
+                        self.model.inputs[0], [self.model.outputs[0], classifier.input]
+                    )
+        return self._embedding_model
+
+    def _get_activation_model(self):
+        """
+        The model with embeddings and the last 4-D feature maps as extra outputs
+
+        The feature maps are the input of the pooling layer that starts the
+        classifier head; the head is replayed on them once to check that it
+        is a plain chain of layers, which Grad-CAM differentiates.
+
+        Raises:
+            NotImplementedError: The model has no head that can be replayed
+        """
+        if self._activation_model is None and self._heatmap_error is None:
+            with self._functions_lock:
+                if self._activation_model is None and self._heatmap_error is None:
+                    try:
+                        self._build_activation_model()
+                    except NotImplementedError as e:
+                        self._heatmap_error = str(e)
+        if self._heatmap_error is not None:
+            raise NotImplementedError(self._heatmap_error)
+        return self._activation_model
+
+    def _build_activation_model(self):
+        """Build the activation model and the heatmap head; call with the functions lock held"""
+        tf = self._tf
+        layers = self.model.layers
+        pooling_index = max(
+            (i for i, layer in enumerate(layers)
+             if i > 0 and not isinstance(layer, tf.keras.layers.InputLayer)
+             and len(getattr(layer.input, 'shape', ())) == 4),
+            default=None
+        )
+        if pooling_index is None or pooling_index == len(layers) - 1:
+            raise NotImplementedError('The model has no convolutional feature maps before its classifier head')
+
+        head = layers[pooling_index:]
+        classifier = self._classifier()
+        model = tf.keras.Model(self.model.inputs[0], [self.model.outputs[0], classifier.input, head[0].input])
+
+        # The head must reproduce the model's output from the feature maps alone
+        blank = np.zeros((1,) + tuple(self.input_shape[1:]), dtype=np.float32)
+        predictions, _, activations = model(blank, training=False)
+        replayed = activations
+        for layer in head:
+            replayed = layer(replayed, training=False)
+        if float(np.abs(np.asarray(replayed) - np.asarray(predictions)).max()) > self.HEAD_REPLAY_TOLERANCE:
+            raise NotImplementedError('The classifier head is not a plain chain of layers')
+
+        self._activation_model = model
+        self._heatmap_head = head
+        self.heatmap_layer = layers[pooling_index - 1].name
+
+    def _class_scores(self, activations):
+        """Pre-softmax class scores from feature maps, through the heatmap head"""
+        outputs = activations
+        for layer in self._heatmap_head[:-1]:
+            outputs = layer(outputs, training=False)
+        classifier = self._heatmap_head[-1]
+        if isinstance(classifier, self._tf.keras.layers.Dense):
+            # Grad-CAM uses the logits; softmax gradients vanish for confident predictions
+            logits = self._tf.matmul(outputs, classifier.kernel)
+            return logits + classifier.bias if classifier.use_bias else logits
+        return classifier(outputs, training=False)
+
+    def _grad_cam(self, activations, class_indices):
+        """Class-weighted, rectified sum of the feature maps, scaled to [0, 1] per image"""
+        tf = self._tf
+        with tf.GradientTape() as tape:
+            tape.watch(activations)
+            scores = tf.gather(self._class_scores(activations), class_indices, batch_dims=1)
+        weights = tf.reduce_mean(tape.gradient(scores, activations), axis=(1, 2))
+        heatmaps = tf.nn.relu(tf.einsum('nhwc,nc->nhw', activations, weights))
+        return tf.math.divide_no_nan(heatmaps, tf.reduce_max(heatmaps, axis=(1, 2), keepdims=True))
+
+    @property
+    def supports_heatmaps(self):
+        try:
+            self._get_activation_model()
+        except NotImplementedError:
+            return False
+        return True
+
+    def _get_model(self, dtype, outputs='predictions'):
+        """
+        Get the model for an input dtype and set of outputs; for uint8 it is wrapped
+        (once) by with_uint8_input
+
+        Args:
+            outputs (str): 'predictions', 'embeddings' or 'activations', as for _get_function
+        """
+        model = {
+            'predictions': lambda: self.model,
+            'embeddings': self._get_embedding_model,
+            'activations': self._get_activation_model
+        }[outputs]()
+        if np.dtype(dtype) != np.uint8:
+            return model
+
+        uint8_model = self._uint8_models.get(outputs)
+        if uint8_model is None:
+            with self._functions_lock:
+                uint8_model = self._uint8_models.get(outputs)
+                if uint8_model is None:
+                    uint8_model = self._uint8_models[outputs] = with_uint8_input(model)
+        return uint8_model
+
+    def _get_function(self, batch_size, dtype, outputs='predictions'):
+        """
+        Get (tracing on first use) the inference function for a bucket, input dtype and outputs
+
+        Args:
+            outputs (str): 'predictions', 'embeddings' (predictions and embeddings) or
+                'activations' (predictions, embeddings and feature maps)
+        """
+        key = (batch_size, dtype.str, outputs)
+        function = self._functions.get(key)
+        if function is None:
+            model = self._get_model(dtype, outputs)
+            with self._functions_lock:
+                function = self._functions.get(key)
+                if function is None:
+                    tf = self._tf
+                    signature = tf.TensorSpec((batch_size,) + tuple(self.input_shape[1:]), tf.as_dtype(dtype))
+                    if outputs == 'predictions':
+                        def model_function(images):
+                            return model(images, training=False)
+                    else:
+                        def model_function(images):
+                            return tuple(model(images, training=False))
+                    function = tf.function(model_function, input_signature=[signature]).get_concrete_function()
+                    self._functions[key] = function
+        return function
+
+    def _get_heatmap_function(self):
+        """Get (tracing on first use) Grad-CAM over the heatmap head, for any batch size"""
+        if self._heatmap_function is None:
+            self._get_activation_model()
+            with self._functions_lock:
+                if self._heatmap_function is None:
+                    tf = self._tf
+                    _, _, activations = self._activation_model.outputs
+                    signature = [
+                        tf.TensorSpec((None,) + tuple(activations.shape[1:]), tf.float32),
+                        tf.TensorSpec((None,), tf.int32)
+                    ]
+                    self._heatmap_function = tf.function(self._grad_cam, input_signature=signature)
+        return self._heatmap_function
+
+    def predict(self, image_batch):
+        if image_batch.dtype != np.uint8:
+            image_batch = np.asarray(image_batch, dtype=np.float32)
+        if not self.batch_buckets:
+            return self._get_model(image_batch.dtype).predict(image_batch, verbose=0)
+
+        outputs = []
+        for chunk, count in self.iter_bucketed(image_batch):
+            predictions = self._get_function(len(chunk), chunk.dtype)(self._tf.constant(chunk))
+            outputs.append(predictions.numpy()[:count])
+        return np.concatenate(outputs) if len(outputs) > 1 else outputs[0]
+
+    def predict_with_embeddings(self, image_batch):
+        if image_batch.dtype != np.uint8:
+            image_batch = np.asarray(image_batch, dtype=np.float32)
+        if not self.batch_buckets:
+            predictions, embeddings = self._get_model(image_batch.dtype, 'embeddings').predict(image_batch, verbose=0)
+            return predictions, embeddings
+
+        outputs, embedding_outputs = [], []
+        for chunk, count in self.iter_bucketed(image_batch):
+            predictions, embeddings = self._get_function(len(chunk), chunk.dtype, 'embeddings')(self._tf.constant(chunk))
+            outputs.append(predictions.numpy()[:count])
+            embedding_outputs.append(embeddings.numpy()[:count])
+        if len(outputs) == 1:
+            return outputs[0], embedding_outputs[0]
+        return np.concatenate(outputs), np.concatenate(embedding_outputs)
+
+    def predict_with_activations(self, image_batch):
+        if image_batch.dtype != np.uint8:
+            image_batch = np.asarray(image_batch, dtype=np.float32)
+        if not self.batch_buckets:
+            return tuple(self._get_model(image_batch.dtype, 'activations').predict(image_batch, verbose=0))
+
+        outputs = ([], [], [])
+        for chunk, count in self.iter_bucketed(image_batch):
+            chunk_outputs = self._get_function(len(chunk), chunk.dtype, 'activations')(self._tf.constant(chunk))
+            for output, chunk_output in zip(outputs, chunk_outputs):
+                output.append(chunk_output.numpy()[:count])
+        return tuple(output[0] if len(output) == 1 else np.concatenate(output) for output in outputs)
+
+    def class_activation_maps(self, activations, class_indices):
+        heatmaps = self._get_heatmap_function()(
+            self._tf.constant(activations, dtype=self._tf.float32),
+            self._tf.constant(np.asarray(class_indices, dtype=np.int32))
+        )
+        return heatmaps.numpy()
+
+    def memory_bytes(self):
+        """Size of the model weights once loaded"""
+        return int(sum(np.prod(weight.shape) * np.dtype(weight.dtype).itemsize for weight in self.model.weights))
+
+
+def _load_tflite_interpreter_class():
+    """Find a TFLite interpreter, preferring the standalone runtimes over full TensorFlow"""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteBackend(InferenceBackend):
+    """
+    TensorFlow Lite interpreter, for float32, float16 and int8-quantized models
+
+    Models built by convert_tflite.py take uint8 pixels and scale them in the
+    graph; older conversions with a float [0, 1] input are still accepted.
+    """
+
+    name = 'tflite'
+
+    def __init__(self, model_path, batch_buckets=DEFAULT_BATCH_BUCKETS, num_threads=None):
+        super().__init__(model_path, batch_buckets)
+        interpreter_class = _load_tflite_interpreter_class()
+
+        self.num_threads = num_threads
+        self.interpreter = interpreter_class(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(int(dim) for dim in self._input['shape'][1:])
+        self._batch_size = int(self._input['shape'][0])
+
+        # The interpreter holds mutable tensor state, so calls are serialised
+        self._lock = threading.Lock()
+
+    @property
+    def quantized_input(self):
+        """The input is an integer tensor quantized from [0, 1]"""
+        return self._input['dtype'] in (np.int8, np.uint8) and self._input['quantization'][0] != 0
+
+    @property
+    def pixel_input(self):
+        """The input takes raw uint8 pixels, scaled inside the model (see with_uint8_input)"""
+        return self._input['dtype'] == np.uint8 and self._input['quantization'][0] == 0
+
+    def _resize_batch(self, batch_size):
+        """Resize the input tensor to a new batch size (lock held)"""
+        if batch_size == self._batch_size:
+            return
+        self.interpreter.resize_tensor_input(
+            self._input['index'], [batch_size] + list(self.input_shape[1:]), strict=False
+        )
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = batch_size
+
+    def predict(self, image_batch):
+        outputs = []
+        for chunk, count in self.iter_bucketed(image_batch):
+            outputs.append(self._invoke(chunk)[:count])
+        return np.concatenate(outputs) if len(outputs) > 1 else outputs[0]
+
+    def _invoke(self, image_batch):
+        """Run the interpreter on one batch"""
+        with self._lock:
+            self._resize_batch(len(image_batch))
+
+            if self.pixel_input:
+                input_tensor = self.interpreter.tensor(self._input['index'])()
+                if image_batch.dtype == np.uint8:
+                    input_tensor[...] = image_batch
+                else:
+                    # TTA views are rounded back to pixels
+                    input_tensor[...] = np.clip(np.rint(image_batch * 255.0), 0, 255)
+                del input_tensor
+            elif self.quantized_input:
+                if image_batch.dtype == np.uint8:
+                    image_batch = image_batch * PIXEL_SCALE
+                scale, zero_point = self._input['quantization']
+                info = np.iinfo(self._input['dtype'])
+                image_batch = np.clip(np.round(image_batch / scale + zero_point), info.min, info.max)
+                self.interpreter.set_tensor(self._input['index'], image_batch.astype(self._input['dtype']))
+            else:
+                # Scale (or copy) straight into the interpreter's own input tensor
+                input_tensor = self.interpreter.tensor(self._input['index'])()
+                if image_batch.dtype == np.uint8:
+                    np.multiply(image_batch, PIXEL_SCALE, out=input_tensor, casting='unsafe')
+                else:
+                    input_tensor[...] = image_batch
+                del input_tensor  # The interpreter refuses to run while a view is held
+            self.interpreter.invoke()
+            predictions = self.interpreter.get_tensor(self._output['index'])
+
+            if self._output['dtype'] in (np.int8, np.uint8):
+                scale, zero_point = self._output['quantization']
+                predictions = (predictions.astype('float32') - zero_point) * scale
+
+        return predictions
+
+    def get_info(self):
+        info = super().get_info()
+        info['input_dtype'] = np.dtype(self._input['dtype']).name
+        info['num_threads'] = self.num_threads
+        return info
+
+
+class RemoteBackend(InferenceBackend):
+    """
+    Forward passes run in a separate inference process (see inference_server.py)
+
+    Serving processes keep preprocessing, TTA and formatting local and only
+    ship batches over a Unix socket, so the model and the TensorFlow runtime
+    are loaded once no matter how many HTTP workers there are.
+    """
+
+    name = 'remote'
+
+    def __init__(self, model_path, batch_buckets=DEFAULT_BATCH_BUCKETS, authkey=None, connect_timeout=60.0,
+                 call_timeout=60.0):
+        # model_path is the inference server's socket path
+        super().__init__(model_path, batch_buckets)
+        self.authkey = authkey.encode() if isinstance(authkey, str) else authkey
+        self.connect_timeout = connect_timeout
+        # Longest wait for a reply, so a stalled or dead inference process cannot hang a worker; 0 waits forever
+        self.call_timeout = call_timeout
+
+        # Connections are not thread-safe, so each call borrows one from the pool
+        self._connections = queue.LifoQueue()
+
+        self.server_info = self._call('info', timeout=connect_timeout)
+        self.input_shape = tuple(self.server_info['input_shape'])
+        self.supports_embeddings = self.server_info.get('supports_embeddings', False)
+        self.supports_heatmaps = self.server_info.get('supports_heatmaps', False)
+        self.heatmap_layer = self.server_info.get('heatmap_layer')
+
+    def _connect(self, timeout):
+        """Open a connection, retrying while the inference server is still starting"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return Client(self.model_path, family='AF_UNIX', authkey=self.authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() >= deadline:
+                    raise ConnectionError(f"Inference server not reachable at {self.model_path}")
+                time.sleep(0.2)
+
+    def _call(self, command, payload=None, timeout=None):
+        """
+        Send one request and wait for its reply
+
+        Args:
+            command (str): Server command
+            payload: Command arguments
+            timeout (float): Seconds to wait for the connection and for the reply,
+                defaults to connect_timeout and call_timeout
+
+        Raises:
+            TimeoutError: No reply in time; the connection is discarded, not reused
+        """
+        try:
+            connection = self._connections.get_nowait()
+        except queue.Empty:
+            connection = self._connect(self.connect_timeout if timeout is None else timeout)
+
+        reply_timeout = self.call_timeout if timeout is None else timeout
+        try:
+            connection.send((command, payload))
+            if reply_timeout and not connection.poll(reply_timeout):
+                raise TimeoutError(f"Inference server did not answer '{command}' within {reply_timeout:g} s")
+            status, result = connection.recv()
+        except Exception:
+            # A late reply must not be read by the next call, so the connection is dropped
+            connection.close()
+            raise
+
+        self._connections.put(connection)
+        if status != 'ok':
+            raise RuntimeError(f"Inference server error: {result}")
+        return result
+
+    def predict(self, image_batch):
+        # uint8 batches travel as uint8, a quarter of the float32 size
+        if image_batch.dtype != np.uint8:
+            image_batch = np.ascontiguousarray(image_batch, dtype=np.float32)
+        return self._call('predict', np.ascontiguousarray(image_batch))
+
+    def predict_with_embeddings(self, image_batch):
+        if not self.supports_embeddings:
+            return super().predict_with_embeddings(image_batch)
+        if image_batch.dtype != np.uint8:
+            image_batch = np.ascontiguousarray(image_batch, dtype=np.float32)
+        return self._call('predict_embeddings', np.ascontiguousarray(image_batch))
+
+    def predict_with_activations(self, image_batch):
+        if not self.supports_heatmaps:
+            return super().predict_with_activations(image_batch)
+        if image_batch.dtype != np.uint8:
+            image_batch = np.ascontiguousarray(image_batch, dtype=np.float32)
+        return self._call('predict_activations', np.ascontiguousarray(image_batch))
+
+    def class_activation_maps(self, activations, class_indices):
+        if not self.supports_heatmaps:
+            return super().class_activation_maps(activations, class_indices)
+        return self._call('heatmaps', (np.ascontiguousarray(activations, dtype=np.float32),
+                                       np.asarray(class_indices, dtype=np.int32)))
+
+    def warm_up(self, batch_sizes=None):
+        # The inference server warms up its own model at startup
+        return self.server_info.get('warmup', {})
+
+    def warm_up_features(self, batch_size=None):
+        # The server warmed its feature passes when it loaded
+        return self.server_info.get('feature_warmup', {})
+
+    def fingerprint(self):
+        return f"{self.server_info['fingerprint']}:{self.name}"
+
+    def embedding_fingerprint(self):
+        # The server's model defines the embedding space, not the socket it is reached through
+        if not self.server_info.get('embedding_fingerprint'):
+            raise RuntimeError('The inference server does not report an embedding fingerprint; restart it')
+        return self.server_info['embedding_fingerprint']
+
+    def memory_bytes(self):
+        # The weights live in the inference process
+        return 0
+
+    def get_info(self):
+        info = super().get_info()
+        info['server'] = {key: value for key, value in self.server_info.items() if key not in ('warmup', 'feature_warmup')}
+        return info
+
+
+# Backend name -> class, used by create_backend and the predictor
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    RemoteBackend.name: RemoteBackend
+}
+
+
+def create_backend(name, model_path, **options):
+    """
+    Instantiate a registered backend
+
+    Args:
+        name (str): Backend name, one of BACKENDS
+        model_path (str): Model file for the backend (socket path for remote)
+        **options: Backend-specific options (e.g. num_threads for tflite)
+
+    Returns:
+        InferenceBackend: The loaded backend
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}'. Available: {', '.join(sorted(BACKENDS))}")
+    if name != RemoteBackend.name and not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+    return BACKENDS[name](model_path, **options)
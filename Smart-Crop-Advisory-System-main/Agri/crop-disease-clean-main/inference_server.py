@@ -0,0 +1,166 @@
+"""
+Shared inference process for the plant disease service
+Loads the model once and serves forward passes to HTTP workers over a Unix socket
+"""
+
+import argparse
+import os
+import threading
+import time
+from multiprocessing.connection import Listener
+from multiprocessing import AuthenticationError
+
+from inference_backends import create_backend, configure_tensorflow_threads, DEFAULT_BATCH_BUCKETS
+from autotune import load_tuning_profile
+
+DEFAULT_SOCKET_PATH = '/tmp/krishivannai-inference.sock'
+
+
+class InferenceServer:
+    def __init__(self, socket_path, backend='keras', model_path='best_model.h5', authkey=None,
+                 batch_buckets=DEFAULT_BATCH_BUCKETS, backend_options=None):
+        """
+        Initialize the inference server
+
+        Args:
+            socket_path (str): Unix socket the HTTP workers connect to
+            backend (str): Backend that runs the model ('keras' or 'tflite')
+            model_path (str): Model file for the backend
+            authkey (bytes): Shared secret clients must present
+            batch_buckets (tuple): Batch sizes with a compiled inference path
+            backend_options (dict): Extra options for the backend
+        """
+        self.socket_path = socket_path
+        self.backend_name = backend
+        self.model_path = model_path
+        self.authkey = authkey
+        self.batch_buckets = batch_buckets
+        self.backend_options = backend_options or {}
+        self.backend = None
+        self.info = None
+
+        self._requests = 0
+        self._images = 0
+        self._stats_lock = threading.Lock()
+
+    def load(self):
+        """Load and warm up the model"""
+        started_at = time.perf_counter()
+        self.backend = create_backend(
+            self.backend_name, self.model_path, batch_buckets=self.batch_buckets, **self.backend_options
+        )
+        load_ms = (time.perf_counter() - started_at) * 1000.0
+
+        warmup = self.backend.warm_up()
+        feature_warmup = self.backend.warm_up_features()
+        self.info = {
+            'backend': self.backend.name,
+            'model_path': self.model_path,
+            'input_shape': list(self.backend.input_shape),
+            'fingerprint': self.backend.fingerprint(),
+            'supports_embeddings': self.backend.supports_embeddings,
+            'embedding_fingerprint': self.backend.embedding_fingerprint() if self.backend.supports_embeddings else None,
+            'supports_heatmaps': self.backend.supports_heatmaps,
+            'heatmap_layer': getattr(self.backend, 'heatmap_layer', None),
+            'pid': os.getpid(),
+            'load_ms': round(load_ms, 3),
+            'warmup': warmup,
+            'feature_warmup': feature_warmup
+        }
+        print(f"✅ Inference server loaded {self.model_path} ({self.backend.name}) in {load_ms:.0f} ms")
+
+    def serve_forever(self):
+        """Accept worker connections until the process is stopped"""
+        # The socket only appears once the model is ready, so its presence means "ready"
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.load()
+
+        listener = Listener(self.socket_path, family='AF_UNIX', authkey=self.authkey)
+        print(f"🔌 Inference server listening on {self.socket_path}")
+        try:
+            while True:
+                try:
+                    connection = listener.accept()
+                except AuthenticationError:
+                    print("⚠️ Rejected a connection with a bad authkey")
+                    continue
+                threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+        finally:
+            listener.close()
+
+    def _handle(self, connection):
+        """Serve requests from one worker connection"""
+        try:
+            while True:
+                try:
+                    command, payload = connection.recv()
+                except (EOFError, OSError):
+                    break
+
+                try:
+                    if command == 'predict':
+                        result = self.backend.predict(payload)
+                        with self._stats_lock:
+                            self._requests += 1
+                            self._images += len(payload)
+                    elif command == 'predict_embeddings':
+                        result = self.backend.predict_with_embeddings(payload)
+                        with self._stats_lock:
+                            self._requests += 1
+                            self._images += len(payload)
+                    elif command == 'predict_activations':
+                        result = self.backend.predict_with_activations(payload)
+                        with self._stats_lock:
+                            self._requests += 1
+                            self._images += len(payload)
+                    elif command == 'heatmaps':
+                        result = self.backend.class_activation_maps(*payload)
+                    elif command == 'info':
+                        result = self.get_info()
+                    else:
+                        raise ValueError(f"Unknown command '{command}'")
+                    connection.send(('ok', result))
+                except Exception as e:
+                    connection.send(('error', str(e)))
+        finally:
+            connection.close()
+
+    def get_info(self):
+        """Model information plus request counters"""
+        with self._stats_lock:
+            return {**self.info, 'requests': self._requests, 'images': self._images}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shared inference process for the plant disease service')
+    parser.add_argument('--socket', default=os.environ.get('INFERENCE_SOCKET', DEFAULT_SOCKET_PATH))
+    parser.add_argument('--backend', default=os.environ.get('INFERENCE_SERVER_BACKEND', 'keras'), choices=['keras', 'tflite'])
+    parser.add_argument('--model', default=os.environ.get('INFERENCE_SERVER_MODEL', 'best_model.h5'))
+    parser.add_argument('--batch-buckets', default=os.environ.get('INFERENCE_BATCH_BUCKETS', '1,2,4,8,16,32,64'))
+    parser.add_argument('--num-threads', type=int, default=None, help='TFLite interpreter threads')
+    args = parser.parse_args()
+
+    # Thread pools measured by autotune.py, unless set explicitly
+    load_tuning_profile(os.environ.get('TUNING_PROFILE', 'tuning_profile.json'))
+    if args.backend == 'keras':
+        configure_tensorflow_threads(os.environ.get('TF_INTRA_OP_THREADS'), os.environ.get('TF_INTER_OP_THREADS'))
+
+    authkey = os.environ.get('INFERENCE_AUTHKEY')
+    if not authkey:
+        raise SystemExit('❌ Set INFERENCE_AUTHKEY to the secret shared with the HTTP workers')
+
+    backend_options = {'num_threads': args.num_threads} if args.backend == 'tflite' else {}
+    server = InferenceServer(
+        args.socket,
+        backend=args.backend,
+        model_path=args.model,
+        authkey=authkey.encode(),
+        batch_buckets=tuple(int(size) for size in args.batch_buckets.split(',') if size.strip()),
+        backend_options=backend_options
+    )
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
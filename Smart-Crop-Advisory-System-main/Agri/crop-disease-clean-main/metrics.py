@@ -0,0 +1,148 @@
+"""
+Lightweight per-stage latency metrics for the plant disease service
+Histograms rendered in the Prometheus text exposition format
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from sub-millisecond stages up to slow TTA requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Labels every stage observation carries
+STAGE_LABELS = ('stage', 'model_type', 'tta', 'enhance')
+
+# Request-scoped label values (model type and options), set once per request
+_request_labels = contextvars.ContextVar('metric_request_labels', default={})
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        """
+        Initialize a labelled histogram
+
+        Args:
+            name (str): Metric name
+            documentation (str): HELP text
+            labelnames (tuple): Label names, in exposition order
+            buckets (tuple): Sorted bucket upper bounds
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels):
+        """
+        Record one observation
+
+        Args:
+            value (float): Observed value
+            labels (tuple): Label values, in labelnames order
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (plus +Inf), sum, count
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        """Render the histogram in the Prometheus text format"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: (list(series[0]), series[1], series[2]) for labels, series in self._series.items()}
+
+        for labels, (counts, total, count) in sorted(snapshot.items()):
+            label_text = ','.join(f'{name}="{value}"' for name, value in zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return '\n'.join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+STAGE_SECONDS = Histogram(
+    'krishivannai_stage_duration_seconds',
+    'Time spent in each stage of image processing and prediction',
+    STAGE_LABELS
+)
+
+
+def label_value(value):
+    """Render an option as a label value"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+@contextmanager
+def request_labels(**labels):
+    """Set label values (model_type, tta, enhance) for the stages timed in this context"""
+    token = _request_labels.set({**_request_labels.get(), **{key: label_value(value) for key, value in labels.items()}})
+    try:
+        yield
+    finally:
+        _request_labels.reset(token)
+
+
+def observe_stage(stage, seconds, **labels):
+    """Record a stage duration measured elsewhere"""
+    values = _request_labels.get()
+    STAGE_SECONDS.observe(seconds, (
+        stage,
+        label_value(labels['model_type']) if 'model_type' in labels else values.get('model_type', 'unknown'),
+        label_value(labels['tta']) if 'tta' in labels else values.get('tta', 'n/a'),
+        label_value(labels['enhance']) if 'enhance' in labels else values.get('enhance', 'n/a')
+    ))
+
+
+@contextmanager
+def stage_timer(stage, **labels):
+    """
+    Time a block as one stage
+
+    Args:
+        stage (str): Stage name, e.g. 'decode' or 'inference'
+        **labels: Label values overriding the request-scoped ones
+    """
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started_at, **labels)
+
+
+def render_metric(name, metric_type, documentation, samples):
+    """
+    Render a gauge or counter in the Prometheus text format
+
+    Args:
+        name (str): Metric name
+        metric_type (str): 'gauge' or 'counter'
+        documentation (str): HELP text
+        samples (list): (labels dict, value) pairs
+
+    Returns:
+        str: Exposition text
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        label_text = ','.join(f'{key}="{label_value(val)}"' for key, val in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return '\n'.join(lines)
@@ -0,0 +1,372 @@
+"""
+Dynamic micro-batching for the plant disease predictor
+Collects concurrent single-image requests into one forward pass, on a fixed
+number of workers fed by a bounded queue
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from metrics import observe_stage
+
+
+class QueueFullError(Exception):
+    """The inference queue is full; the caller should shed the request"""
+
+
+class SchedulerClosedError(RuntimeError):
+    """The scheduler was shut down (its model replaced or evicted); the caller should retry"""
+
+
+class _PendingPrediction:
+    """A single queued request waiting for its batch to be scored"""
+
+    def __init__(self, image_array, top_n, use_tta, enhanced_image, timeout=None, raw=False, embedding=False,
+                 heatmap=False):
+        self.image_array = image_array
+        self.top_n = top_n
+        self.use_tta = use_tta
+        self.enhanced_image = enhanced_image
+        self.embedding = embedding
+        self.heatmap = heatmap
+        self.enqueued_at = time.perf_counter()
+        self.deadline = self.enqueued_at + timeout if timeout is not None else None
+        # Raw items are whole pre-batched arrays returned as (predictions, details)
+        self.raw = raw
+        self.cancelled = False
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def expired(self, now):
+        return self.cancelled or (self.deadline is not None and now >= self.deadline)
+
+
+class MicroBatchScheduler:
+    # How often idle workers check whether shutdown was requested
+    STOP_POLL_SECONDS = 0.1
+
+    def __init__(self, predictor, max_batch_size=8, max_wait_ms=10, stats_window=1000,
+                 num_workers=1, max_queue_size=64):
+        """
+        Initialize the micro-batching scheduler
+
+        Args:
+            predictor (AdvancedPlantDiseasePredictor): Loaded predictor to run batches on
+            max_batch_size (int): Maximum number of images scored in one forward pass
+            max_wait_ms (float): Maximum time the first request in a batch waits for company
+            stats_window (int): Number of recent requests kept for queue-wait percentiles
+            num_workers (int): Threads running forward passes concurrently
+            max_queue_size (int): Requests allowed to wait; submit raises QueueFullError beyond it
+        """
+        self.predictor = predictor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.num_workers = max(1, int(num_workers))
+        self.max_queue_size = max(1, int(max_queue_size))
+
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._workers = []
+        self._running = False
+        self._closed = False
+        self._state_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        # Statistics
+        self._stats_lock = threading.Lock()
+        self._total_requests = 0
+        self._total_batches = 0
+        self._batch_size_counts = {}
+        self._queue_waits = deque(maxlen=stats_window)
+        self._max_queue_wait = 0.0
+        self._rejected = 0
+        self._expired = 0
+        self._timed_out = 0
+
+    def start(self):
+        """
+        Start the background batching threads
+
+        Raises:
+            SchedulerClosedError: The scheduler was shut down; it is never restarted
+        """
+        with self._state_lock:
+            if self._closed:
+                raise SchedulerClosedError('The inference scheduler has been shut down')
+            if self._running:
+                return
+            self._running = True
+            self._workers = [
+                threading.Thread(target=self._run, name=f'micro-batcher-{index}', daemon=True)
+                for index in range(self.num_workers)
+            ]
+            for worker in self._workers:
+                worker.start()
+
+    def shutdown(self, timeout=None):
+        """
+        Stop the background threads after the queue drains
+
+        Never blocks on the queue, so a full queue or a stuck worker cannot hang it.
+        A shut-down scheduler refuses new work rather than restarting, so callers
+        still holding it cannot keep a replaced or evicted model alive
+
+        Args:
+            timeout (float): Seconds to wait for each worker to finish, None waits until they do
+        """
+        with self._state_lock:
+            self._closed = True
+            if not self._running:
+                return
+            self._running = False
+            self._stop.set()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def is_saturated(self):
+        """Whether new work would be rejected right now"""
+        return self._queue.full()
+
+    def _enqueue(self, pending, timeout):
+        """Queue an item without blocking and wait for it within the timeout"""
+        if not self._running:
+            # Starts a scheduler that was never started; raises for one that was shut down
+            self.start()
+
+        # Under the state lock, so an item is either refused or queued before shutdown and drained by the workers
+        with self._state_lock:
+            if self._closed:
+                raise SchedulerClosedError('The inference scheduler has been shut down')
+            try:
+                self._queue.put_nowait(pending)
+            except queue.Full:
+                with self._stats_lock:
+                    self._rejected += 1
+                raise QueueFullError(f'Inference queue is full ({self.max_queue_size} waiting)')
+
+        if not pending.done.wait(timeout):
+            # The caller gives up. Cancelling only covers queued work: a worker skips the
+            # item when collecting or before scoring, but a forward pass already running finishes
+            pending.cancelled = True
+            with self._stats_lock:
+                self._timed_out += 1
+            raise TimeoutError('Timed out waiting for batched prediction')
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def submit(self, image_array, top_n=5, use_tta=True, enhanced_image=False, timeout=None, embedding=False,
+               heatmap=False):
+        """
+        Queue an image and block until its batch has been scored
+
+        Args:
+            image_array (np.array): Image array, as accepted by predict_image_from_array
+            top_n (int): Number of top predictions to return
+            use_tta (bool or str): Whether to use test-time augmentation, or 'adaptive'
+            enhanced_image (bool): Whether the image was enhanced during preprocessing
+            timeout (float): Seconds the caller will wait (its deadline), None waits forever
+            embedding (bool): Also return the image's embedding from the same forward pass
+            heatmap (bool): Also return a Grad-CAM heatmap of the top class from the same forward pass
+
+        Returns:
+            dict: Comprehensive prediction results, with an 'embedding' array and a 'heatmap' if requested
+
+        Raises:
+            QueueFullError: The queue is full, nothing was queued
+            SchedulerClosedError: The scheduler was shut down, nothing was queued
+            TimeoutError: The deadline passed; the request is cancelled
+        """
+        pending = _PendingPrediction(
+            self.predictor.prepare_image_array(image_array), top_n, use_tta, enhanced_image, timeout=timeout,
+            embedding=embedding, heatmap=heatmap
+        )
+        return self._enqueue(pending, timeout)
+
+    def submit_batch(self, image_batch, use_tta=False, timeout=None):
+        """
+        Queue an already stacked batch, scored on its own by the same workers
+
+        Args:
+            image_batch (np.array): Array of shape (N, IMG_HEIGHT, IMG_WIDTH, 3)
+            use_tta (bool or str): Whether to use test-time augmentation, or 'adaptive'
+            timeout (float): Seconds the caller will wait (its deadline), None waits forever
+
+        Returns:
+            tuple: (class probabilities, per-image details) as from predict_batch(return_details=True)
+        """
+        pending = _PendingPrediction(image_batch, None, use_tta, False, timeout=timeout, raw=True)
+        return self._enqueue(pending, timeout)
+
+    def _collect_batch(self):
+        """
+        Block for the first request, then gather more until full or the wait expires
+
+        Returns:
+            tuple: (batch, whether shutdown was requested and the queue is drained)
+        """
+        while True:
+            try:
+                first = self._queue.get(timeout=self.STOP_POLL_SECONDS)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return [], True
+                continue
+            if not self._discard_cancelled(first):
+                break
+
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size and not first.raw:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            # Cancelled items do not take a place in the batch
+            if not self._discard_cancelled(item):
+                batch.append(item)
+        return batch, False
+
+    def _discard_cancelled(self, item):
+        """Release an item whose caller has given up (already counted as timed out)"""
+        if not item.cancelled:
+            return False
+        item.error = TimeoutError('Cancelled before the prediction started')
+        item.done.set()
+        return True
+
+    def _drop_expired(self, batch):
+        """Fail items whose caller has given up or whose deadline passed, without scoring them"""
+        now = time.perf_counter()
+        live = []
+        for item in batch:
+            if self._discard_cancelled(item):
+                continue
+            if item.expired(now):
+                item.error = TimeoutError('Deadline passed before the prediction started')
+                item.done.set()
+                with self._stats_lock:
+                    self._expired += 1
+            else:
+                live.append(item)
+        return live
+
+    def _run(self):
+        """Worker loop: collect, score and dispatch batches"""
+        # Each worker stacks its batches into one preallocated buffer, reused for its lifetime
+        buffer = None
+        while True:
+            batch, stop = self._collect_batch()
+            batch = self._drop_expired(batch)
+
+            if batch:
+                started_at = time.perf_counter()
+                self._record_batch(batch, started_at)
+                buffer = self._score(batch, buffer)
+
+            if stop:
+                break
+
+    def _stack(self, items, buffer):
+        """
+        Copy single-image items into the leading rows of a reusable batch buffer
+
+        Returns:
+            tuple: (view of the filled rows, the buffer to keep for the next batch)
+        """
+        image_shape = items[0].image_array.shape[1:]
+        dtype = items[0].image_array.dtype
+        if buffer is None or buffer.shape[1:] != image_shape or buffer.dtype != dtype:
+            buffer = np.empty((self.max_batch_size,) + image_shape, dtype=dtype)
+        for row, item in enumerate(items):
+            buffer[row] = item.image_array[0]
+        return buffer[:len(items)], buffer
+
+    def _score(self, batch, buffer=None):
+        """
+        Score one collected batch and wake its callers
+
+        Returns:
+            np.array: The stacking buffer, for the next batch
+        """
+        # TTA changes the forward pass, so requests are grouped by mode (off, full, adaptive)
+        # and by the extra outputs (embeddings, heatmaps) returned; raw batches are scored on their own
+        groups = {}
+        for index, item in enumerate(batch):
+            tta_mode = item.use_tta if item.use_tta == 'adaptive' else bool(item.use_tta)
+            groups.setdefault(('raw', index) if item.raw else (tta_mode, item.embedding, item.heatmap), []).append(item)
+
+        for key, items in groups.items():
+            use_tta = items[0].use_tta
+            try:
+                if items[0].raw:
+                    items[0].result = self.predictor.predict_batch(items[0].image_array, use_tta=use_tta, return_details=True)
+                    continue
+
+                image_batch, buffer = self._stack(items, buffer)
+                predictions, details = self.predictor.predict_batch(
+                    image_batch, use_tta=use_tta, return_details=True,
+                    return_embeddings=items[0].embedding, return_heatmaps=items[0].heatmap
+                )
+                for item, item_predictions, item_details in zip(items, predictions, details):
+                    results = self.predictor.get_top_predictions(item_predictions, item.top_n)
+                    item.result = self.predictor.format_comprehensive_results(
+                        results, item.use_tta, item.enhanced_image, item_details
+                    )
+            except Exception as e:
+                for item in items:
+                    item.error = e
+            finally:
+                for item in items:
+                    item.done.set()
+        return buffer
+
+    def _record_batch(self, batch, started_at):
+        """Update batch-size and queue-wait statistics"""
+        with self._stats_lock:
+            self._total_batches += 1
+            self._total_requests += len(batch)
+            self._batch_size_counts[len(batch)] = self._batch_size_counts.get(len(batch), 0) + 1
+            for item in batch:
+                wait = started_at - item.enqueued_at
+                self._queue_waits.append(wait)
+                self._max_queue_wait = max(self._max_queue_wait, wait)
+
+        for item in batch:
+            observe_stage(
+                'queue_wait', started_at - item.enqueued_at,
+                model_type=self.predictor.model_type, tta=item.use_tta, enhance=item.enhanced_image
+            )
+
+    def get_stats(self):
+        """Get batch-size and queue-wait statistics"""
+        with self._stats_lock:
+            waits_ms = np.array(self._queue_waits) * 1000.0
+            stats = {
+                'running': self._running,
+                'closed': self._closed,
+                'num_workers': self.num_workers,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_size': self.max_queue_size,
+                'rejected': self._rejected,
+                'expired': self._expired,
+                'timed_out': self._timed_out,
+                'total_requests': self._total_requests,
+                'total_batches': self._total_batches,
+                'avg_batch_size': round(self._total_requests / self._total_batches, 2) if self._total_batches else 0.0,
+                'batch_size_histogram': {str(size): count for size, count in sorted(self._batch_size_counts.items())},
+                'queue_wait_ms': {
+                    'mean': round(float(waits_ms.mean()), 3) if len(waits_ms) else 0.0,
+                    'p50': round(float(np.percentile(waits_ms, 50)), 3) if len(waits_ms) else 0.0,
+                    'p95': round(float(np.percentile(waits_ms, 95)), 3) if len(waits_ms) else 0.0,
+                    'max': round(self._max_queue_wait * 1000.0, 3)
+                }
+            }
+        return stats
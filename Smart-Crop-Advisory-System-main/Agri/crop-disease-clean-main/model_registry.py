@@ -0,0 +1,245 @@
+"""
+Lazy registry of crop-specialised disease models
+Models are loaded on first use, kept in LRU order and evicted when the
+resident set exceeds a memory budget
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+
+# Longest an evicted model's scheduler is waited for; its daemon workers finish on their own
+SCHEDULER_SHUTDOWN_SECONDS = 30.0
+
+
+class UnknownModelError(KeyError):
+    """No model is registered under the requested ID"""
+
+
+def load_registry_specs(path):
+    """
+    Read the registry file
+
+    Format: {"models": {"tomato": {"model_path": "tomato_model.h5",
+    "class_names_path": "tomato_classes.txt", "crops": ["Tomato"]}, ...}}.
+    "crops" defaults to the model ID; other keys are passed to the loader.
+
+    Args:
+        path (str): JSON registry file
+
+    Returns:
+        dict: Model ID -> spec, empty if the file does not exist
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        specs = json.load(f).get('models', {})
+    for model_id, spec in specs.items():
+        if 'model_path' not in spec:
+            raise ValueError(f"Registry model '{model_id}' has no model_path")
+    return specs
+
+
+class _ResidentModel:
+    """A loaded model with its scheduler and usage bookkeeping"""
+
+    def __init__(self, model_id, predictor, scheduler, memory_bytes, load_seconds):
+        self.model_id = model_id
+        self.predictor = predictor
+        self.scheduler = scheduler
+        self.memory_bytes = memory_bytes
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.uses = 0
+        self.leases = 0
+
+
+class ModelRegistry:
+    def __init__(self, specs, load_predictor, make_scheduler=None, memory_budget_mb=1024):
+        """
+        Initialize the registry; nothing is loaded until first use
+
+        Args:
+            specs (dict): Model ID -> spec, as read by load_registry_specs
+            load_predictor (callable): (model_id, spec) -> loaded AdvancedPlantDiseasePredictor
+            make_scheduler (callable): predictor -> started MicroBatchScheduler, None to score directly
+            memory_budget_mb (float): Resident models are evicted, least recently used first, beyond this
+        """
+        self.specs = dict(specs)
+        self.load_predictor = load_predictor
+        self.make_scheduler = make_scheduler
+        self.memory_budget_bytes = int(float(memory_budget_mb) * 1024 * 1024)
+
+        # Crop name (lower case) -> model ID
+        self.crops = {}
+        for model_id, spec in self.specs.items():
+            for crop in spec.get('crops') or [model_id]:
+                self.crops[crop.lower()] = model_id
+
+        self._lock = threading.Lock()
+        self._resident = OrderedDict()  # Model ID -> _ResidentModel, least recently used first
+        self._load_locks = {model_id: threading.Lock() for model_id in self.specs}
+
+        # Counters
+        self._hits = 0
+        self._loads = 0
+        self._load_failures = 0
+        self._evictions = 0
+        self._load_seconds_total = 0.0
+        self._load_seconds_max = 0.0
+        self._last_load_seconds = 0.0
+
+    def model_for_crop(self, crop):
+        """Model ID serving a crop, or None when the general model should"""
+        return self.crops.get(crop.lower()) if crop else None
+
+    @contextmanager
+    def lease(self, model_id):
+        """
+        Use a model, loading it on first use
+
+        A leased model is never evicted, so requests in flight keep their
+        scheduler; the budget is enforced again when the lease ends.
+
+        Args:
+            model_id (str): Registered model ID
+
+        Yields:
+            tuple: (predictor, scheduler or None)
+        """
+        if model_id not in self.specs:
+            raise UnknownModelError(model_id)
+
+        entry = self._acquire(model_id)
+        try:
+            yield entry.predictor, entry.scheduler
+        finally:
+            with self._lock:
+                entry.leases -= 1
+                evicted = self._evict_over_budget()
+            self._unload(evicted)
+
+    def _acquire(self, model_id):
+        """Get a resident model with its lease taken, loading it if needed"""
+        with self._lock:
+            entry = self._touch(model_id)
+            if entry is not None:
+                self._hits += 1
+                return entry
+
+        # One load per model at a time; other models keep serving meanwhile
+        with self._load_locks[model_id]:
+            with self._lock:
+                entry = self._touch(model_id)
+                if entry is not None:
+                    self._hits += 1
+                    return entry
+
+            started_at = time.perf_counter()
+            try:
+                predictor = self.load_predictor(model_id, self.specs[model_id])
+                scheduler = self.make_scheduler(predictor) if self.make_scheduler else None
+            except Exception:
+                with self._lock:
+                    self._load_failures += 1
+                raise
+            load_seconds = time.perf_counter() - started_at
+
+            entry = _ResidentModel(model_id, predictor, scheduler, predictor.memory_bytes(), load_seconds)
+            with self._lock:
+                self._resident[model_id] = entry
+                self._loads += 1
+                self._load_seconds_total += load_seconds
+                self._load_seconds_max = max(self._load_seconds_max, load_seconds)
+                self._last_load_seconds = load_seconds
+                self._touch(model_id)
+                evicted = self._evict_over_budget()
+            self._unload(evicted)
+            print(f"📦 Registry loaded '{model_id}' in {load_seconds * 1000.0:.0f} ms "
+                  f"({entry.memory_bytes / 1048576:.1f} MB)")
+            return entry
+
+    def _touch(self, model_id):
+        """Mark a resident model used and take a lease; call with the lock held"""
+        entry = self._resident.get(model_id)
+        if entry is not None:
+            self._resident.move_to_end(model_id)
+            entry.last_used = time.time()
+            entry.uses += 1
+            entry.leases += 1
+        return entry
+
+    def _evict_over_budget(self):
+        """Drop least recently used, unleased models until within budget; call with the lock held"""
+        evicted = []
+        resident_bytes = sum(entry.memory_bytes for entry in self._resident.values())
+        for model_id in list(self._resident):
+            if resident_bytes <= self.memory_budget_bytes:
+                break
+            entry = self._resident[model_id]
+            if entry.leases:
+                continue
+            del self._resident[model_id]
+            resident_bytes -= entry.memory_bytes
+            self._evictions += 1
+            evicted.append(entry)
+        return evicted
+
+    def _unload(self, entries):
+        """Stop evicted models' schedulers; the models are freed with their last reference"""
+        for entry in entries:
+            if entry.scheduler is not None:
+                entry.scheduler.shutdown(timeout=SCHEDULER_SHUTDOWN_SECONDS)
+            print(f"♻️ Registry evicted '{entry.model_id}' ({entry.memory_bytes / 1048576:.1f} MB)")
+
+    def shutdown(self):
+        """Unload every resident model"""
+        with self._lock:
+            entries = list(self._resident.values())
+            self._resident.clear()
+        self._unload(entries)
+
+    def get_stats(self):
+        """Resident models, load and eviction counts, and load latency"""
+        with self._lock:
+            resident = [
+                {
+                    'model_id': entry.model_id,
+                    'model_path': entry.predictor.loaded_model_path,
+                    'model_type': entry.predictor.model_type,
+                    'num_classes': len(entry.predictor.class_names),
+                    'memory_mb': round(entry.memory_bytes / 1048576, 2),
+                    'load_ms': round(entry.load_seconds * 1000.0, 3),
+                    'loaded_at': datetime.fromtimestamp(entry.loaded_at).isoformat(),
+                    'last_used': datetime.fromtimestamp(entry.last_used).isoformat(),
+                    'uses': entry.uses,
+                    'in_use': entry.leases
+                }
+                for entry in reversed(self._resident.values())  # Most recently used first
+            ]
+            loads = self._loads
+            resident_bytes = sum(entry.memory_bytes for entry in self._resident.values())
+            stats = {
+                'registered': sorted(self.specs),
+                'crops': dict(sorted(self.crops.items())),
+                'memory_budget_mb': round(self.memory_budget_bytes / 1048576, 2),
+                'resident_mb': round(resident_bytes / 1048576, 2),
+                'resident_bytes': resident_bytes,
+                'resident': resident,
+                'hits': self._hits,
+                'loads': self._loads,
+                'load_failures': self._load_failures,
+                'evictions': self._evictions,
+                'load_ms': {
+                    'mean': round(self._load_seconds_total * 1000.0 / loads, 3) if loads else 0.0,
+                    'max': round(self._load_seconds_max * 1000.0, 3),
+                    'last': round(self._last_load_seconds * 1000.0, 3)
+                }
+            }
+        return stats
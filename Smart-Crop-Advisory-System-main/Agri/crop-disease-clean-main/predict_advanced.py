@@ -1,12 +1,21 @@
-import tensorflow as tf
 import numpy as np
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image, ImageEnhance, ImageFilter, ImageOps
 import os
 import json
+import time
+import threading
 from datetime import datetime
+from inference_backends import create_backend, DEFAULT_BATCH_BUCKETS
+from metrics import stage_timer
 
 class AdvancedPlantDiseasePredictor:
-    def __init__(self, model_path='best_model_advanced.h5', class_names_path='class_names_advanced.txt', fallback_model='best_model.h5'):
+    def __init__(self, model_path='best_model_advanced.h5', class_names_path='class_names_advanced.txt', fallback_model='best_model.h5',
+                 tta_views=5, tta_seed=42, backend='keras', backend_options=None,
+                 batch_buckets=DEFAULT_BATCH_BUCKETS, warmup=True,
+                 tta_confidence_threshold=0.95, tta_margin_threshold=0.5,
+                 screening_model_path=None, cascade_confidence_threshold=0.8,
+                 escalation_severities=('High', 'Critical'), screening_backend_name=None,
+                 screening_backend_options=None):
         """
         Initialize the advanced plant disease predictor with fallback support
         
@@ -14,13 +23,60 @@ class AdvancedPlantDiseasePredictor:
             model_path (str): Path to the advanced trained model
             class_names_path (str): Path to the class names file
             fallback_model (str): Fallback model if advanced model not available
+            tta_views (int): Number of views scored by TTA, including the original
+            tta_seed (int): Seed for the fixed TTA augmentation set
+            backend (str): Inference backend for model_path ('keras' or 'tflite')
+            backend_options (dict): Extra options for the backend, e.g. num_threads
+            batch_buckets (tuple): Batch sizes with a compiled inference path; other sizes are padded up
+            warmup (bool): Whether to run every batch bucket once at load time
+            tta_confidence_threshold (float): Adaptive TTA adds augmented views when top-1 confidence is below this
+            tta_margin_threshold (float): ... or when the top-1/top-2 confidence margin is below this
+            screening_model_path (str): Smaller model (e.g. the 224x224 basic model) that scores every
+                image first in cascade mode; model_path then only sees escalated images
+            cascade_confidence_threshold (float): Escalate when screening confidence is below this
+            escalation_severities (tuple): Escalate when the screening class has one of these severities
+            screening_backend_name (str): Inference backend for screening_model_path, None picks
+                'tflite' or 'keras' by file extension
+            screening_backend_options (dict): Extra options for the screening backend, None reuses
+                backend_options when both models run on the same backend
         """
         self.model_path = model_path
         self.class_names_path = class_names_path
         self.fallback_model = fallback_model
-        self.model = None
+        self.tta_views = max(1, int(tta_views))
+        self.tta_seed = tta_seed
+        self._tta_augmentations = {}
+        self._tta_buffers = threading.local()
+        self.tta_confidence_threshold = tta_confidence_threshold
+        self.tta_margin_threshold = tta_margin_threshold
+        self._adaptive_tta_stats = {'images': 0, 'triggered': 0}
+        self._adaptive_tta_lock = threading.Lock()
+        self.screening_model_path = screening_model_path
+        self.cascade_confidence_threshold = cascade_confidence_threshold
+        self.escalation_severities = tuple(escalation_severities or ())
+        self.screening_backend_name = screening_backend_name
+        self.screening_backend_options = screening_backend_options
+        self.screening_backend = None
+        self.screening_model_type = None
+        self._cascade_stats = {
+            'images': 0, 'escalated': 0, 'low_confidence': 0, 'high_severity': 0,
+            'screening_seconds': 0.0, 'escalation_seconds': 0.0
+        }
+        self._cascade_lock = threading.Lock()
+        self._heatmap_stats = {'images': 0, 'seconds': 0.0}
+        self._heatmap_lock = threading.Lock()
+        self.backend_name = backend
+        self.backend_options = backend_options or {}
+        self.batch_buckets = tuple(batch_buckets or ())
+        self.warmup_enabled = warmup
+        self.warmup_info = {'status': 'pending'}
+        self.load_timings = {}
+        self.backend = None
+        self.model = None  # Keras model, when the keras backend is in use
+        self.loaded_model_path = None
         self.class_names = []
         self.model_type = 'unknown'
+        self.model_fingerprint = None
         self.IMG_HEIGHT = 300  # Default for advanced model
         self.IMG_WIDTH = 300
         
@@ -28,8 +84,25 @@ class AdvancedPlantDiseasePredictor:
         self.disease_info = self._load_disease_info()
         
         # Load model and class names
+        started_at = time.perf_counter()
         self.load_model()
+        self.load_timings['model_ms'] = round((time.perf_counter() - started_at) * 1000.0, 3)
+        
+        if self.screening_model_path:
+            started_at = time.perf_counter()
+            self.load_screening_model()
+            self.load_timings['screening_model_ms'] = round((time.perf_counter() - started_at) * 1000.0, 3)
+        
+        started_at = time.perf_counter()
         self.load_class_names()
+        self.load_timings['class_names_ms'] = round((time.perf_counter() - started_at) * 1000.0, 3)
+        
+        # Trace and run every batch bucket before the first real request
+        if self.warmup_enabled:
+            self.warm_up()
+            self.load_timings['warmup_ms'] = self.warmup_info.get('total_ms')
+        else:
+            self.warmup_info = {'status': 'disabled'}
     
     def _load_disease_info(self):
         """Load disease information database"""
@@ -76,35 +149,98 @@ class AdvancedPlantDiseasePredictor:
     def load_model(self):
         """Load the trained model with fallback support"""
         try:
-            if os.path.exists(self.model_path):
-                self.model = tf.keras.models.load_model(self.model_path, compile=False)
-                
-                # Check the actual input shape to determine model type
-                input_shape = self.model.input_shape
-                if input_shape[1] == 300 and input_shape[2] == 300:
-                    self.model_type = 'advanced'
-                    self.IMG_HEIGHT = 300
-                    self.IMG_WIDTH = 300
-                    print(f"✅ Advanced model loaded from {self.model_path} (300x300)")
-                else:
-                    self.model_type = 'basic'
-                    self.IMG_HEIGHT = 224
-                    self.IMG_WIDTH = 224
-                    print(f"✅ Basic model loaded from {self.model_path} (224x224)")
-                    
+            # A remote backend's model_path is a socket; the backend waits for the server
+            if self.backend_name == 'remote' or os.path.exists(self.model_path):
+                self.backend = create_backend(
+                    self.backend_name, self.model_path, batch_buckets=self.batch_buckets, **self.backend_options
+                )
+                self.loaded_model_path = self.model_path
             elif os.path.exists(self.fallback_model):
-                self.model = tf.keras.models.load_model(self.fallback_model, compile=False)
-                self.model_type = 'basic'
-                self.IMG_HEIGHT = 224
-                self.IMG_WIDTH = 224
+                # The fallback is always the Keras .h5 model
+                self.backend = create_backend('keras', self.fallback_model, batch_buckets=self.batch_buckets)
+                self.loaded_model_path = self.fallback_model
                 print(f"⚠️ Using fallback model from {self.fallback_model}")
             else:
                 raise FileNotFoundError("No model file found")
+            
+            self.model = getattr(self.backend, 'model', None)
+            
+            # Check the actual input shape to determine model type
+            input_shape = self.backend.input_shape
+            if input_shape[1] == 300 and input_shape[2] == 300:
+                self.model_type = 'advanced'
+                self.IMG_HEIGHT = 300
+                self.IMG_WIDTH = 300
+                print(f"✅ Advanced model loaded from {self.loaded_model_path} (300x300, {self.backend.name})")
+            else:
+                self.model_type = 'basic'
+                self.IMG_HEIGHT = 224
+                self.IMG_WIDTH = 224
+                print(f"✅ Basic model loaded from {self.loaded_model_path} (224x224, {self.backend.name})")
+            
+            self.model_fingerprint = f"{self.backend.fingerprint()}:{self.model_type}"
                 
         except Exception as e:
             print(f"❌ Error loading model: {e}")
             raise
     
+    def load_screening_model(self):
+        """Load the first-stage model of the cascade; both models stay resident"""
+        try:
+            backend_name = self.screening_backend_name or (
+                'tflite' if self.screening_model_path.endswith('.tflite') else 'keras'
+            )
+            backend_options = self.screening_backend_options
+            if backend_options is None:
+                backend_options = self.backend_options if backend_name == self.backend_name else {}
+            self.screening_backend = create_backend(
+                backend_name, self.screening_model_path, batch_buckets=self.batch_buckets, **backend_options
+            )
+            
+            input_shape = self.screening_backend.input_shape
+            self.screening_model_type = 'advanced' if input_shape[1] == 300 and input_shape[2] == 300 else 'basic'
+            if input_shape[1] * input_shape[2] >= self.IMG_HEIGHT * self.IMG_WIDTH:
+                print(f"⚠️ Screening model input {input_shape[2]}x{input_shape[1]} is not smaller than the main model's")
+            
+            # Cached results depend on both models and the escalation rule
+            self.model_fingerprint = (
+                f"{self.model_fingerprint}|cascade:{self.screening_backend.fingerprint()}:"
+                f"{self.cascade_confidence_threshold}:{','.join(self.escalation_severities)}"
+            )
+            print(f"✅ Cascade screening model loaded from {self.screening_model_path} "
+                  f"({input_shape[2]}x{input_shape[1]}, {self.screening_backend.name})")
+        except Exception as e:
+            print(f"❌ Error loading screening model: {e}")
+            raise
+    
+    def warm_up(self):
+        """
+        Run warm-up passes for every batch-size bucket, and for the embedding,
+        activation and Grad-CAM functions at the smallest bucket
+        
+        Returns:
+            dict: Warm-up status, per-bucket timings and per-output-set timings
+        """
+        self.warmup_info = {'status': 'running'}
+        started_at = time.perf_counter()
+        try:
+            timings = self.backend.warm_up()
+            self.warmup_info = {
+                'status': 'complete',
+                'batch_sizes': timings,
+                'outputs': self.backend.warm_up_features()
+            }
+            if self.screening_backend is not None:
+                self.warmup_info['screening_batch_sizes'] = self.screening_backend.warm_up()
+                self.warmup_info['screening_outputs'] = self.screening_backend.warm_up_features()
+            self.warmup_info['total_ms'] = round((time.perf_counter() - started_at) * 1000.0, 3)
+            print(f"🔥 Warm-up complete in {self.warmup_info['total_ms']:.0f} ms ({len(timings)} batch sizes, "
+                  f"outputs: {', '.join(self.warmup_info['outputs']) or 'predictions only'})")
+        except Exception as e:
+            self.warmup_info = {'status': 'failed', 'error': str(e)}
+            print(f"⚠️ Warm-up failed: {e}")
+        return self.warmup_info
+    
     def load_class_names(self):
         """Load class names from file with fallback support"""
         try:
@@ -138,6 +274,49 @@ class AdvancedPlantDiseasePredictor:
         
         return image
     
+    def load_image(self, source, enhance=False):
+        """
+        Decode an image straight to model input size
+        
+        JPEGs are decoded at reduced scale in the DCT domain (PIL draft mode),
+        EXIF orientation is applied, and enhancement runs on the resized image
+        so no step touches the full-resolution pixels more than once.
+        
+        Args:
+            source (str or file): Path or file-like object of the encoded image
+            enhance (bool): Whether to apply image enhancement
+            
+        Returns:
+            tuple: (resized RGB PIL image, image_info dict with the original format, mode and size)
+        """
+        with stage_timer('decode', model_type=self.model_type, enhance=enhance):
+            image = Image.open(source)
+            image_info = {
+                'format': image.format,
+                'mode': image.mode,
+                'size': image.size
+            }
+            
+            # Only JPEG honours draft; the decoded size stays >= the requested size
+            target_size = (self.IMG_WIDTH, self.IMG_HEIGHT)
+            image.draft('RGB', target_size)
+            image.load()
+            image = ImageOps.exif_transpose(image)
+            
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+        
+        # Resize to model input size
+        with stage_timer('resize', model_type=self.model_type, enhance=enhance):
+            image = image.resize(target_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        
+        # Apply enhancement if requested
+        if enhance:
+            with stage_timer('enhance', model_type=self.model_type, enhance=enhance):
+                image = self.enhance_image(image)
+        
+        return image, image_info
+    
     def preprocess_image(self, image_path, enhance=True):
         """
         Advanced image preprocessing with enhancement options
@@ -147,26 +326,16 @@ class AdvancedPlantDiseasePredictor:
             enhance (bool): Whether to apply image enhancement
             
         Returns:
-            np.array: Preprocessed image array
+            np.array: uint8 array of shape (1, IMG_HEIGHT, IMG_WIDTH, 3); scaling
+                to [0, 1] happens in the backend
         """
         try:
-            # Load and resize image
-            image = Image.open(image_path)
-            image = image.convert('RGB')
+            # Decode, orient, resize and enhance in one pass
+            image, _ = self.load_image(image_path, enhance=enhance)
             
-            # Apply enhancement if requested
-            if enhance:
-                image = self.enhance_image(image)
-            
-            # Resize to model input size
-            image = image.resize((self.IMG_WIDTH, self.IMG_HEIGHT), Image.Resampling.LANCZOS)
-            
-            # Convert to array and normalize
-            image_array = np.array(image)
-            image_array = image_array.astype('float32') / 255.0
-            
-            # Add batch dimension
-            image_array = np.expand_dims(image_array, axis=0)
+            # One copy out of PIL, plus a batch dimension (a view)
+            with stage_timer('to_array', model_type=self.model_type, enhance=enhance):
+                image_array = np.asarray(image)[np.newaxis]
             
             return image_array
             
@@ -174,43 +343,180 @@ class AdvancedPlantDiseasePredictor:
             print(f"❌ Error preprocessing image: {e}")
             raise
     
-    def test_time_augmentation(self, image_array, num_augmentations=5):
-        """Apply test-time augmentation for better predictions"""
-        predictions = []
+    def _get_tta_augmentations(self, num_views, image_shape):
+        """
+        Get the fixed augmentation parameters for a number of TTA views
         
-        # Original image
-        pred = self.model.predict(image_array, verbose=0)
-        predictions.append(pred)
+        The set is drawn once from a seeded generator and reused, so the
+        same image always receives the same augmented views.
         
-        # Create augmented versions
-        original_image = image_array[0]
+        Args:
+            num_views (int): Total number of views, including the original
+            image_shape (tuple): Shape of a single image (H, W, C)
+            
+        Returns:
+            tuple: (brightness factors, flip mask, noise) for the augmented views
+        """
+        key = (num_views, tuple(image_shape))
+        if key not in self._tta_augmentations:
+            rng = np.random.default_rng(self.tta_seed)
+            num_augmented = num_views - 1
+            
+            # Brightness jitter in [0.9, 1.1], flip every other view, small gaussian noise
+            brightness = rng.uniform(0.9, 1.1, size=num_augmented).astype('float32')
+            flips = np.arange(num_augmented) % 2 == 0
+            noise = rng.normal(0, 0.01, size=(num_augmented,) + tuple(image_shape)).astype('float32')
+            
+            self._tta_augmentations[key] = (brightness, flips, noise)
+        
+        return self._tta_augmentations[key]
+    
+    def _get_tta_buffer(self, num_views, num_images, image_shape):
+        """
+        This thread's reusable float32 buffer for TTA views, laid out view-major
+        
+        Returns:
+            np.array: Array of shape (num_views, num_images) + image_shape
+        """
+        buffer = getattr(self._tta_buffers, 'views', None)
+        if (buffer is None or buffer.shape[0] != num_views or buffer.shape[1] < num_images
+                or buffer.shape[2:] != tuple(image_shape)):
+            buffer = np.empty((num_views, num_images) + tuple(image_shape), dtype='float32')
+            self._tta_buffers.views = buffer
+        return buffer[:, :num_images]
+    
+    def test_time_augmentation(self, image_array, num_augmentations=None, base_predictions=None, features=()):
+        """
+        Apply test-time augmentation for better predictions
         
-        for _ in range(num_augmentations - 1):
-            # Random transformations
-            augmented = original_image.copy()
+        All augmented views of every image in the batch, plus the originals,
+        are written into a reusable buffer and scored in a single model call.
+        
+        Args:
+            image_array (np.array): uint8 array of shape (N, IMG_HEIGHT, IMG_WIDTH, 3),
+                or float in [0, 1]
+            num_augmentations (int): Total views per image, defaults to self.tta_views
+            base_predictions (np.array): Already computed predictions for the original
+                images; only the augmented views are scored then
+            features (tuple): Extra outputs to return for the original views from the
+                same model call, see forward (not with base_predictions)
             
-            # Random brightness adjustment
-            brightness_factor = np.random.uniform(0.9, 1.1)
-            augmented = np.clip(augmented * brightness_factor, 0, 1)
+        Returns:
+            np.array: View-averaged class probabilities of shape (N, num_classes),
+                plus a dict of the requested features when features are given
+        """
+        num_views = max(1, int(num_augmentations or self.tta_views))
+        num_images = len(image_array)
+        image_shape = image_array.shape[1:]
+        
+        if base_predictions is not None and num_views == 1:
+            return base_predictions
+        
+        with stage_timer('tta_augment', model_type=self.model_type, tta=True):
+            # View-major, so the augmented views alone are one contiguous block
+            views = self._get_tta_buffer(num_views, num_images, image_shape)
+            original = views[0]
+            scale = np.float32(1.0 / 255.0) if image_array.dtype == np.uint8 else np.float32(1.0)
+            np.multiply(image_array, scale, out=original, casting='unsafe')
             
-            # Random rotation (small angles)
-            if np.random.random() > 0.5:
-                # Simple flip augmentation
-                if np.random.random() > 0.5:
-                    augmented = np.fliplr(augmented)
+            if num_views > 1:
+                brightness, flips, noise = self._get_tta_augmentations(num_views, image_shape)
+                
+                # Each view is computed in place from the (flipped) original
+                for i in range(num_views - 1):
+                    view = views[i + 1]
+                    source = original[:, :, ::-1] if flips[i] else original
+                    np.multiply(source, brightness[i], out=view)
+                    np.minimum(view, 1, out=view)
+                    view += noise[i]
+                    np.clip(view, 0, 1, out=view)
+        
+        # One forward pass over every view of every image
+        if base_predictions is not None:
+            with stage_timer('inference', model_type=self.model_type, tta=True):
+                augmented_predictions = self.backend.predict(views[1:].reshape((-1,) + image_shape))
+            augmented_predictions = augmented_predictions.reshape(num_views - 1, num_images, -1)
+            return (base_predictions + augmented_predictions.sum(axis=0)) / num_views
+        
+        with stage_timer('inference', model_type=self.model_type, tta=True):
+            predictions, outputs = self.forward(self.backend, views.reshape((-1,) + image_shape), features)
+        predictions = predictions.reshape(num_views, num_images, -1)
+        
+        # Average all predictions; view-major, so the originals' features come first
+        if features:
+            return predictions.mean(axis=0), {name: output[:num_images] for name, output in outputs.items()}
+        return predictions.mean(axis=0)
+    
+    def needs_tta(self, predictions):
+        """
+        Gate for adaptive TTA: which predictions are too uncertain to trust
+        
+        Args:
+            predictions (np.array): Class probabilities of shape (N, num_classes)
             
-            # Add noise
-            noise = np.random.normal(0, 0.01, augmented.shape)
-            augmented = np.clip(augmented + noise, 0, 1)
+        Returns:
+            np.array: Boolean mask of shape (N,)
+        """
+        if predictions.shape[1] < 2:
+            return predictions[:, 0] < self.tta_confidence_threshold
+        top_two = np.partition(predictions, -2, axis=1)[:, -2:]
+        top1, top2 = top_two[:, 1], top_two[:, 0]
+        return (top1 < self.tta_confidence_threshold) | (top1 - top2 < self.tta_margin_threshold)
+    
+    def adaptive_test_time_augmentation(self, image_array, features=()):
+        """
+        Score the original images, then add augmented views only for uncertain ones
+        
+        Args:
+            image_array (np.array): uint8 array of shape (N, IMG_HEIGHT, IMG_WIDTH, 3)
+            features (tuple): Extra outputs to return from the plain pass, see forward
             
-            # Predict on augmented image
-            augmented_batch = np.expand_dims(augmented, axis=0)
-            pred = self.model.predict(augmented_batch, verbose=0)
-            predictions.append(pred)
+        Returns:
+            tuple: (class probabilities of shape (N, num_classes), boolean mask of images that got TTA),
+                plus a dict of the requested features when features are given
+        """
+        with stage_timer('inference', model_type=self.model_type, tta='adaptive'):
+            predictions, outputs = self.forward(self.backend, image_array, features)
+            predictions = np.array(predictions)
         
-        # Average all predictions
-        final_prediction = np.mean(predictions, axis=0)
-        return final_prediction
+        triggered = self.needs_tta(predictions)
+        if triggered.any():
+            predictions[triggered] = self.test_time_augmentation(
+                image_array[triggered], base_predictions=predictions[triggered]
+            )
+        
+        with self._adaptive_tta_lock:
+            self._adaptive_tta_stats['images'] += len(image_array)
+            self._adaptive_tta_stats['triggered'] += int(triggered.sum())
+        
+        if features:
+            return predictions, triggered, outputs
+        return predictions, triggered
+    
+    def get_tta_stats(self):
+        """
+        Adaptive TTA gate statistics
+        
+        Compute is counted in model views: full TTA scores tta_views views per
+        image, the gate scores one plus tta_views - 1 for triggered images.
+        """
+        with self._adaptive_tta_lock:
+            images = self._adaptive_tta_stats['images']
+            triggered = self._adaptive_tta_stats['triggered']
+        
+        full_views = images * self.tta_views
+        views_saved = (images - triggered) * (self.tta_views - 1)
+        return {
+            'confidence_threshold': self.tta_confidence_threshold,
+            'margin_threshold': self.tta_margin_threshold,
+            'tta_views': self.tta_views,
+            'adaptive_images': images,
+            'adaptive_triggered': triggered,
+            'trigger_rate': round(triggered / images, 4) if images else 0.0,
+            'views_scored': full_views - views_saved,
+            'views_saved': views_saved,
+            'compute_saved_pct': round(views_saved / full_views * 100.0, 2) if full_views else 0.0
+        }
     
     def predict(self, image_path, top_n=5, use_tta=True, enhance_image=True):
         """
@@ -230,24 +536,13 @@ class AdvancedPlantDiseasePredictor:
             processed_image = self.preprocess_image(image_path, enhance=enhance_image)
             
             # Make prediction (with or without TTA)
-            if use_tta and self.model_type == 'advanced':
-                predictions = self.test_time_augmentation(processed_image)
-                predictions = predictions[0]  # Remove batch dimension
-            else:
-                predictions = self.model.predict(processed_image, verbose=0)
-                predictions = predictions[0]  # Remove batch dimension
+            predictions, details = self.predict_batch(processed_image, use_tta=use_tta, return_details=True)
             
             # Get top N predictions
-            top_indices = np.argsort(predictions)[-top_n:][::-1]
-            
-            results = []
-            for idx in top_indices:
-                class_name = self.class_names[idx]
-                confidence = float(predictions[idx])
-                results.append((class_name, confidence))
+            results = self.get_top_predictions(predictions[0], top_n)
             
             # Format comprehensive results
-            formatted_results = self.format_comprehensive_results(results, use_tta, enhance_image)
+            formatted_results = self.format_comprehensive_results(results, use_tta, enhance_image, details[0])
             
             return formatted_results
             
@@ -255,6 +550,353 @@ class AdvancedPlantDiseasePredictor:
             print(f"❌ Error making prediction: {e}")
             raise
     
+    def prepare_image_array(self, image_array):
+        """
+        Bring a single image array to the model input layout
+
+        uint8 input at model size passes through as a view; float input
+        (legacy callers, [0, 1] or [0, 255]) is converted to uint8 once.
+
+        Args:
+            image_array (np.array): HWC or 1xHWC image array, uint8 or float
+
+        Returns:
+            np.array: uint8 array of shape (1, IMG_HEIGHT, IMG_WIDTH, 3)
+        """
+        with stage_timer('prepare', model_type=self.model_type):
+            # Ensure proper shape
+            if len(image_array.shape) == 3:
+                image_array = image_array[np.newaxis]
+            
+            if image_array.dtype != np.uint8:
+                scale = 255.0 if image_array.max() <= 1.0 else 1.0
+                image_array = np.clip(np.rint(image_array * scale), 0, 255).astype(np.uint8)
+            
+            # Resize if needed, straight from the uint8 pixels
+            if image_array.shape[1] != self.IMG_HEIGHT or image_array.shape[2] != self.IMG_WIDTH:
+                img = Image.fromarray(image_array[0])
+                img = img.resize((self.IMG_WIDTH, self.IMG_HEIGHT), Image.Resampling.LANCZOS)
+                image_array = np.asarray(img)[np.newaxis]
+        
+        return image_array
+    
+    def forward(self, backend, image_batch, features=()):
+        """
+        One forward pass, with extra outputs taken from the same pass
+        
+        Args:
+            backend (InferenceBackend): Backend to run
+            image_batch (np.array): Batch as accepted by backend.predict
+            features (tuple): Any of 'embeddings' (penultimate-layer features) and
+                'activations' (last convolutional feature maps, for heatmaps)
+            
+        Returns:
+            tuple: (class probabilities, dict of the requested features)
+        """
+        if 'activations' in features:
+            predictions, embeddings, activations = backend.predict_with_activations(image_batch)
+            outputs = {'embeddings': embeddings, 'activations': activations}
+            return predictions, {name: outputs[name] for name in features}
+        if 'embeddings' in features:
+            predictions, embeddings = backend.predict_with_embeddings(image_batch)
+            return predictions, {'embeddings': embeddings}
+        return backend.predict(image_batch), {}
+    
+    @property
+    def embedding_backend(self):
+        """Backend providing embeddings and heatmaps: the screening model, which sees every image, under the cascade"""
+        return self.screening_backend if self.screening_backend is not None else self.backend
+    
+    @property
+    def supports_embeddings(self):
+        return self.embedding_backend is not None and self.embedding_backend.supports_embeddings
+    
+    @property
+    def supports_heatmaps(self):
+        return self.embedding_backend is not None and self.embedding_backend.supports_heatmaps
+    
+    @property
+    def embedding_fingerprint(self):
+        """Identify the embedding space; vectors from different models are not comparable"""
+        return self.embedding_backend.embedding_fingerprint()
+    
+    def get_embedding_dim(self):
+        """Size of the embeddings, from one forward pass on a blank image"""
+        _, height, width, channels = self.embedding_backend.input_shape
+        _, embeddings = self.embedding_backend.predict_with_embeddings(np.zeros((1, height, width, channels), dtype=np.uint8))
+        return embeddings.shape[1]
+    
+    def class_activation_maps(self, activations, class_indices, backend=None):
+        """
+        Grad-CAM heatmaps from the feature maps of a forward pass already made
+        
+        Args:
+            activations (np.array): Feature maps from forward(..., features=('activations',))
+            class_indices (np.array): Class to explain for each image
+            backend (InferenceBackend): Backend whose pass produced the feature maps,
+                defaults to embedding_backend
+            
+        Returns:
+            np.array: Heatmaps of shape (N, height, width) in [0, 1]
+        """
+        backend = backend or self.embedding_backend
+        started_at = time.perf_counter()
+        with stage_timer('heatmap', model_type=self.model_type):
+            heatmaps = backend.class_activation_maps(activations, class_indices)
+        with self._heatmap_lock:
+            self._heatmap_stats['images'] += len(heatmaps)
+            self._heatmap_stats['seconds'] += time.perf_counter() - started_at
+        return heatmaps
+    
+    def format_heatmap(self, heatmap, class_name, backend=None):
+        """
+        JSON-ready heatmap: the Grad-CAM grid over the model input, row-major from the
+        top-left corner, and the centre of its hottest cell in relative coordinates
+        (None when no region supports the class)
+        """
+        backend = backend or self.embedding_backend
+        height, width = heatmap.shape
+        row, col = np.unravel_index(int(np.argmax(heatmap)), heatmap.shape)
+        peak = {'x': round((col + 0.5) / width, 4), 'y': round((row + 0.5) / height, 4)} if heatmap.max() > 0 else None
+        return {
+            'method': 'grad-cam',
+            'class_name': class_name,
+            'layer': backend.heatmap_layer,
+            'shape': [height, width],
+            'grid': np.round(heatmap, 3).tolist(),
+            'peak': peak
+        }
+    
+    def get_heatmap_stats(self):
+        """Heatmaps computed and the Grad-CAM cost per image (the forward pass is shared with the prediction)"""
+        with self._heatmap_lock:
+            stats = dict(self._heatmap_stats)
+        images = stats['images']
+        return {
+            'supported': self.supports_heatmaps,
+            'layer': getattr(self.embedding_backend, 'heatmap_layer', None),
+            'images': images,
+            'ms_per_image': round(stats['seconds'] * 1000.0 / images, 3) if images else 0.0
+        }
+    
+    def predict_batch(self, image_batch, use_tta=False, return_details=False, return_embeddings=False,
+                      return_heatmaps=False):
+        """
+        Score a stacked batch of preprocessed images
+        
+        Args:
+            image_batch (np.array): uint8 array of shape (N, IMG_HEIGHT, IMG_WIDTH, 3)
+            use_tta (bool or str): Whether to use test-time augmentation, or 'adaptive'
+                to add augmented views only for images the plain pass is unsure about
+            return_details (bool): Also return per-image details (TTA applied, cascade stage)
+            return_embeddings (bool): Add each image's penultimate-layer features, taken from
+                the forward pass that scores it, to the details as 'embedding'
+            return_heatmaps (bool): Add a Grad-CAM heatmap for each image's top class, from the
+                feature maps of that same forward pass, to the details as 'heatmap'
+            
+        Returns:
+            np.array: Class probabilities of shape (N, num_classes), plus a list of
+                per-image detail dicts for format_comprehensive_results when return_details is set
+        """
+        features = tuple(name for name, wanted in (('embeddings', return_embeddings), ('activations', return_heatmaps))
+                         if wanted)
+        if self.screening_backend is not None:
+            predictions, details, outputs = self.cascade_predict(image_batch, use_tta, features)
+        else:
+            predictions, tta_modes, outputs = self._score_batch(image_batch, use_tta, features)
+            details = [{'tta_applied': mode == 'full', 'tta_mode': mode} for mode in tta_modes]
+        
+        if return_embeddings:
+            for item_details, embedding in zip(details, outputs['embeddings']):
+                item_details['embedding'] = embedding
+        if return_heatmaps:
+            self._add_heatmaps(predictions, details, outputs)
+        
+        return (predictions, details) if return_details else predictions
+    
+    def _add_heatmaps(self, predictions, details, outputs):
+        """
+        Explain each image's final class with the feature maps of the model that chose it:
+        the screening model, or under the cascade the main model for escalated images
+        """
+        class_indices = np.argmax(predictions, axis=1)
+        escalated = np.array([item.get('cascade', {}).get('stage') == 'escalated' for item in details], dtype=bool)
+        sources = [(self.embedding_backend, np.flatnonzero(~escalated), outputs['activations'][~escalated])]
+        if escalated.any():
+            if 'escalated_activations' in outputs:
+                sources.append((self.backend, np.flatnonzero(escalated), outputs['escalated_activations']))
+            else:
+                for row in np.flatnonzero(escalated):
+                    details[row]['heatmap'] = None
+                    details[row]['heatmap_error'] = (
+                        f"The image was escalated to the {self.model_type} model, which cannot give heatmaps"
+                    )
+        
+        for backend, rows, activations in sources:
+            if not len(rows):
+                continue
+            heatmaps = self.class_activation_maps(activations, class_indices[rows], backend)
+            for row, heatmap in zip(rows, heatmaps):
+                details[row]['heatmap'] = self.format_heatmap(heatmap, self.class_names[class_indices[row]], backend)
+    
+    def _score_batch(self, image_batch, use_tta=False, features=()):
+        """
+        Score a batch with the main model
+        
+        Returns:
+            tuple: (class probabilities, what TTA did for each image ('full', 'adaptive-skipped'
+                when the plain pass was confident enough, or 'none'), dict of the requested features)
+        """
+        # The basic model never gets TTA, whatever was asked
+        tta_modes = np.full(len(image_batch), 'none', dtype=object)
+        outputs = {}
+        if use_tta == 'adaptive' and self.model_type == 'advanced':
+            if features:
+                predictions, tta_applied, outputs = self.adaptive_test_time_augmentation(image_batch, features)
+            else:
+                predictions, tta_applied = self.adaptive_test_time_augmentation(image_batch)
+            tta_modes[:] = 'adaptive-skipped'
+            tta_modes[tta_applied] = 'full'
+        elif use_tta and self.model_type == 'advanced':
+            if features:
+                predictions, outputs = self.test_time_augmentation(image_batch, features=features)
+            else:
+                predictions = self.test_time_augmentation(image_batch)
+            tta_modes[:] = 'full'
+        else:
+            with stage_timer('inference', model_type=self.model_type, tta=use_tta):
+                predictions, outputs = self.forward(self.backend, image_batch, features)
+        
+        return predictions, tta_modes, outputs
+    
+    def _resize_batch(self, image_batch, height, width):
+        """Resize a uint8 batch to another model's input size"""
+        resized = np.empty((len(image_batch), height, width, 3), dtype=np.uint8)
+        for i, image in enumerate(image_batch):
+            resized[i] = Image.fromarray(image).resize((width, height), Image.Resampling.LANCZOS)
+        return resized
+    
+    def cascade_predict(self, image_batch, use_tta=False, features=()):
+        """
+        Two-stage cascade: the screening model scores every image and only
+        uncertain or high-severity ones are escalated to the main model
+        
+        Args:
+            image_batch (np.array): uint8 array of shape (N, IMG_HEIGHT, IMG_WIDTH, 3) at the main model's size
+            use_tta (bool or str): TTA option, applied to escalated images
+            features (tuple): Extra outputs to return from the screening pass (every image has one), see forward
+            
+        Returns:
+            tuple: (class probabilities of shape (N, num_classes), per-image detail dicts,
+                dict of the requested features; with 'activations' also 'escalated_activations',
+                the main model's feature maps for the escalated images, when it supports heatmaps)
+        """
+        started_at = time.perf_counter()
+        with stage_timer('cascade_screening', model_type=self.screening_model_type, tta=use_tta):
+            _, height, width, _ = self.screening_backend.input_shape
+            if (height, width) != image_batch.shape[1:3]:
+                screening_batch = self._resize_batch(image_batch, height, width)
+            else:
+                screening_batch = image_batch
+            predictions, outputs = self.forward(self.screening_backend, screening_batch, features)
+            predictions = np.array(predictions)
+        screening_seconds = time.perf_counter() - started_at
+        
+        top_indices = predictions.argmax(axis=1)
+        top_confidences = predictions.max(axis=1)
+        reasons = []
+        for index, confidence in zip(top_indices, top_confidences):
+            severity = self.disease_info.get(self.class_names[index], {}).get('severity')
+            if confidence < self.cascade_confidence_threshold:
+                reasons.append('low_confidence')
+            elif severity in self.escalation_severities:
+                reasons.append('high_severity')
+            else:
+                reasons.append(None)
+        escalated = np.array([reason is not None for reason in reasons], dtype=bool)
+        
+        # Images answered by the screening model get no TTA
+        tta_modes = np.full(len(image_batch), 'none', dtype=object)
+        escalation_seconds = 0.0
+        if escalated.any():
+            started_at = time.perf_counter()
+            # Heatmaps explain the escalated class, so they need the main model's own feature maps
+            escalation_features = ('activations',) if 'activations' in features and self.backend.supports_heatmaps else ()
+            predictions[escalated], tta_modes[escalated], escalation_outputs = self._score_batch(
+                image_batch[escalated], use_tta, escalation_features
+            )
+            if escalation_features:
+                outputs['escalated_activations'] = escalation_outputs['activations']
+            escalation_seconds = time.perf_counter() - started_at
+        
+        with self._cascade_lock:
+            self._cascade_stats['images'] += len(image_batch)
+            self._cascade_stats['escalated'] += int(escalated.sum())
+            self._cascade_stats['low_confidence'] += reasons.count('low_confidence')
+            self._cascade_stats['high_severity'] += reasons.count('high_severity')
+            self._cascade_stats['screening_seconds'] += screening_seconds
+            self._cascade_stats['escalation_seconds'] += escalation_seconds
+        
+        details = []
+        for i, reason in enumerate(reasons):
+            details.append({
+                'tta_applied': tta_modes[i] == 'full',
+                'tta_mode': tta_modes[i],
+                'cascade': {
+                    'stage': 'escalated' if reason else 'screening',
+                    'model_type': self.model_type if reason else self.screening_model_type,
+                    'screening_prediction': self.class_names[top_indices[i]],
+                    'screening_confidence': float(top_confidences[i]),
+                    'escalation_reason': reason
+                }
+            })
+        return predictions, details, outputs
+    
+    def get_cascade_stats(self):
+        """Cascade escalation rate and per-stage latency"""
+        if self.screening_backend is None:
+            return {'enabled': False}
+        
+        with self._cascade_lock:
+            stats = dict(self._cascade_stats)
+        images, escalated = stats['images'], stats['escalated']
+        return {
+            'enabled': True,
+            'screening_model': self.screening_model_path,
+            'confidence_threshold': self.cascade_confidence_threshold,
+            'escalation_severities': list(self.escalation_severities),
+            'images': images,
+            'escalated': escalated,
+            'escalation_rate': round(escalated / images, 4) if images else 0.0,
+            'escalation_reasons': {
+                'low_confidence': stats['low_confidence'],
+                'high_severity': stats['high_severity']
+            },
+            'screening_ms_per_image': round(stats['screening_seconds'] * 1000.0 / images, 3) if images else 0.0,
+            'escalation_ms_per_image': round(stats['escalation_seconds'] * 1000.0 / escalated, 3) if escalated else 0.0
+        }
+    
+    def get_top_predictions(self, predictions, top_n=5):
+        """
+        Pick the top N classes from a single probability vector
+        
+        Args:
+            predictions (np.array): Class probabilities of shape (num_classes,)
+            top_n (int): Number of top predictions to return
+            
+        Returns:
+            list: List of tuples (class_name, confidence)
+        """
+        top_indices = np.argsort(predictions)[-top_n:][::-1]
+        
+        results = []
+        for idx in top_indices:
+            class_name = self.class_names[idx]
+            confidence = float(predictions[idx])
+            results.append((class_name, confidence))
+        
+        return results
+    
     def predict_image_from_array(self, image_array, top_n=5, use_tta=True):
         """
         Make prediction on an image array (for web uploads)
@@ -268,40 +910,16 @@ class AdvancedPlantDiseasePredictor:
             dict: Comprehensive prediction results
         """
         try:
-            # Ensure proper shape and type
-            if len(image_array.shape) == 3:
-                image_array = np.expand_dims(image_array, axis=0)
-            
-            # Normalize if needed
-            if image_array.max() > 1.0:
-                image_array = image_array.astype('float32') / 255.0
-            
-            # Resize if needed
-            if image_array.shape[1] != self.IMG_HEIGHT or image_array.shape[2] != self.IMG_WIDTH:
-                # Convert to PIL Image for resizing
-                img = Image.fromarray((image_array[0] * 255).astype(np.uint8))
-                img = img.resize((self.IMG_WIDTH, self.IMG_HEIGHT), Image.Resampling.LANCZOS)
-                image_array = np.expand_dims(np.array(img).astype('float32') / 255.0, axis=0)
+            image_array = self.prepare_image_array(image_array)
             
             # Make prediction
-            if use_tta and self.model_type == 'advanced':
-                predictions = self.test_time_augmentation(image_array)
-                predictions = predictions[0]
-            else:
-                predictions = self.model.predict(image_array, verbose=0)
-                predictions = predictions[0]
+            predictions, details = self.predict_batch(image_array, use_tta=use_tta, return_details=True)
             
             # Get top N predictions
-            top_indices = np.argsort(predictions)[-top_n:][::-1]
-            
-            results = []
-            for idx in top_indices:
-                class_name = self.class_names[idx]
-                confidence = float(predictions[idx])
-                results.append((class_name, confidence))
+            results = self.get_top_predictions(predictions[0], top_n)
             
             # Format comprehensive results
-            formatted_results = self.format_comprehensive_results(results, use_tta, False)
+            formatted_results = self.format_comprehensive_results(results, use_tta, False, details[0])
             
             return formatted_results
             
@@ -309,14 +927,16 @@ class AdvancedPlantDiseasePredictor:
             print(f"❌ Error making prediction: {e}")
             raise
     
-    def format_comprehensive_results(self, results, used_tta=False, enhanced_image=False):
+    def format_comprehensive_results(self, results, used_tta=False, enhanced_image=False, details=None):
         """
         Format prediction results with comprehensive information
         
         Args:
             results (list): List of tuples (class_name, confidence)
-            used_tta (bool): Whether TTA was used
+            used_tta (bool or str): The TTA option requested: True, False or 'adaptive'
             enhanced_image (bool): Whether image was enhanced
+            details (dict): Per-image details from predict_batch(return_details=True); its
+                'tta_mode' (what was actually done) sets used_tta and tta_mode in the results
             
         Returns:
             dict: Comprehensive formatted results
@@ -324,6 +944,30 @@ class AdvancedPlantDiseasePredictor:
         if not results:
             return {'error': 'No predictions available'}
         
+        details = details or {}
+        with stage_timer('format', model_type=self.model_type, tta=used_tta, enhance=enhanced_image):
+            formatted_results = self._format_results(results, used_tta, enhanced_image)
+        
+        # What was done, not what was asked: the basic model and the cascade's screening stage skip TTA
+        tta_mode = details.get('tta_mode', 'full' if details.get('tta_applied') else 'none')
+        formatted_results['used_tta'] = tta_mode == 'full'
+        formatted_results['tta_mode'] = tta_mode
+        if used_tta == 'adaptive':
+            formatted_results['tta_triggered'] = tta_mode == 'full'
+        
+        if 'cascade' in details:
+            formatted_results['model_type'] = details['cascade']['model_type']
+            formatted_results['cascade'] = details['cascade']
+        if 'embedding' in details:
+            formatted_results['embedding'] = details['embedding']
+        if 'heatmap' in details:
+            formatted_results['heatmap'] = details['heatmap']
+        if 'heatmap_error' in details:
+            formatted_results['heatmap_error'] = details['heatmap_error']
+        return formatted_results
+    
+    def _format_results(self, results, used_tta, enhanced_image):
+        """Build the result dict for format_comprehensive_results"""
         top_prediction = results[0]
         top_class = top_prediction[0]
         top_confidence = top_prediction[1]
@@ -379,14 +1023,34 @@ class AdvancedPlantDiseasePredictor:
         
         return formatted_results
     
+    def memory_bytes(self):
+        """Approximate memory held by the loaded model(s), screening model included"""
+        total = self.backend.memory_bytes() if self.backend else 0
+        if self.screening_backend is not None:
+            total += self.screening_backend.memory_bytes()
+        return total
+    
     def get_model_info(self):
         """Get information about the loaded model"""
         return {
             'model_type': self.model_type,
-            'model_path': self.model_path if self.model_type == 'advanced' else self.fallback_model,
+            'model_path': self.loaded_model_path,
+            'backend': self.backend.name if self.backend else None,
             'input_size': f"{self.IMG_WIDTH}x{self.IMG_HEIGHT}",
             'num_classes': len(self.class_names),
-            'supports_tta': self.model_type == 'advanced'
+            'supports_tta': self.model_type == 'advanced',
+            'cascade': {
+                'screening_model': self.screening_model_path,
+                'screening_model_type': self.screening_model_type,
+                'confidence_threshold': self.cascade_confidence_threshold,
+                'escalation_severities': list(self.escalation_severities)
+            } if self.screening_backend is not None else None,
+            'tta_views': self.tta_views,
+            'adaptive_tta': {
+                'confidence_threshold': self.tta_confidence_threshold,
+                'margin_threshold': self.tta_margin_threshold
+            },
+            'model_fingerprint': self.model_fingerprint
         }
 
 # Test function for the advanced predictor
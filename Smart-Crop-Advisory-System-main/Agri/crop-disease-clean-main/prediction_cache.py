@@ -0,0 +1,191 @@
+"""
+Content-addressed cache for plant disease predictions
+Bounded in-memory LRU tier backed by a persistent SQLite tier
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    def __init__(self, max_entries=1024, db_path=None, max_disk_entries=100000):
+        """
+        Initialize the prediction cache
+
+        Args:
+            max_entries (int): Maximum number of results kept in memory, 0 disables the memory tier
+            db_path (str): SQLite file for the persistent tier, None disables it
+            max_disk_entries (int): Maximum number of results kept on disk
+        """
+        self.max_entries = max(0, int(max_entries))
+        self.db_path = db_path
+        self.max_disk_entries = max(1, int(max_disk_entries))
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._db = None
+
+        # Counters
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._disk_evictions = 0
+        self._writes = 0
+
+        if db_path:
+            self._open_db()
+
+    def _open_db(self):
+        """Open (and create if needed) the SQLite tier"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS predictions ('
+            'key TEXT PRIMARY KEY, '
+            'result TEXT NOT NULL, '
+            'created_at REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS predictions_created_at ON predictions (created_at)')
+        self._db.commit()
+
+    @staticmethod
+    def make_key(image_bytes, model_id, **options):
+        """
+        Build the cache key for an image under a model and prediction options
+
+        Args:
+            image_bytes (bytes): Encoded image exactly as uploaded
+            model_id (str): Identity of the model that scores the image
+            **options: Prediction options that change the result (use_tta, top_n, ...)
+
+        Returns:
+            str: Hex SHA-256 key
+        """
+        digest = hashlib.sha256(image_bytes)
+        digest.update(b'\0')
+        digest.update(str(model_id).encode())
+        digest.update(b'\0')
+        digest.update(json.dumps(options, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or self._db is not None
+
+    def get(self, key):
+        """
+        Look up a cached result
+
+        Args:
+            key (str): Key from make_key
+
+        Returns:
+            dict: A fresh copy of the cached result, or None on a miss
+        """
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+                return json.loads(payload)
+
+            if self._db is not None:
+                row = self._db.execute('SELECT result FROM predictions WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    self._disk_hits += 1
+                    self._remember(key, row[0])
+                    return json.loads(row[0])
+
+            self._misses += 1
+            return None
+
+    def put(self, key, result):
+        """
+        Store a result in both tiers
+
+        Args:
+            key (str): Key from make_key
+            result (dict): JSON-serialisable prediction result
+        """
+        if not self.enabled:
+            return
+
+        payload = json.dumps(result)
+        with self._lock:
+            self._writes += 1
+            self._remember(key, payload)
+
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO predictions (key, result, created_at) VALUES (?, ?, ?)',
+                    (key, payload, time.time())
+                )
+                # Prune in steps so the count query doesn't run on every write
+                if self._writes % 100 == 0:
+                    self._prune_disk()
+                self._db.commit()
+
+    def _remember(self, key, payload):
+        """Insert into the memory tier, evicting least-recently-used entries (lock held)"""
+        if self.max_entries == 0:
+            return
+        self._memory[key] = payload
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._evictions += 1
+
+    def _prune_disk(self):
+        """Drop the oldest disk entries beyond max_disk_entries (lock held)"""
+        count = self._db.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            self._db.execute(
+                'DELETE FROM predictions WHERE key IN '
+                '(SELECT key FROM predictions ORDER BY created_at LIMIT ?)',
+                (excess,)
+            )
+            self._disk_evictions += excess
+
+    def clear(self):
+        """Empty both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM predictions')
+                self._db.commit()
+
+    def get_stats(self):
+        """Get hit, miss and eviction counters"""
+        with self._lock:
+            hits = self._memory_hits + self._disk_hits
+            lookups = hits + self._misses
+            disk_entries = None
+            if self._db is not None:
+                disk_entries = self._db.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+            return {
+                'enabled': self.enabled,
+                'memory_entries': len(self._memory),
+                'max_memory_entries': self.max_entries,
+                'disk_entries': disk_entries,
+                'max_disk_entries': self.max_disk_entries if self._db is not None else None,
+                'hits': hits,
+                'memory_hits': self._memory_hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'disk_evictions': self._disk_evictions,
+                'writes': self._writes
+            }
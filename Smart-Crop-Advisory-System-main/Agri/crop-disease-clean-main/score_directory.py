@@ -0,0 +1,344 @@
+"""
+Offline bulk scoring of an image directory
+Walks a directory tree, decodes images in a prefetching worker pool, scores
+them in large model batches and appends results to a CSV or JSONL file
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from predict_advanced import AdvancedPlantDiseasePredictor
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp')
+
+OUTPUT_FORMATS = ('csv', 'jsonl')
+
+CSV_FIELDS = ('path', 'top_prediction', 'confidence', 'plant', 'disease', 'is_healthy',
+              'severity', 'model_type', 'used_tta', 'enhanced_image', 'predictions', 'error')
+
+
+def find_images(input_dir):
+    """
+    Recursively list image files in a stable order
+
+    Args:
+        input_dir (str): Root directory
+
+    Returns:
+        list: Paths relative to input_dir
+    """
+    paths = []
+    for root, dirs, filenames in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.relpath(os.path.join(root, name), input_dir))
+    return paths
+
+
+def load_completed(output_path, output_format):
+    """
+    Paths that already have a result in an existing output file
+
+    Rows recording an error, and partial rows from an interrupted write,
+    are not counted, so those files are retried.
+
+    Args:
+        output_path (str): Output file from an earlier run
+        output_format (str): 'csv' or 'jsonl'
+
+    Returns:
+        set: Relative paths to skip
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, newline='') as f:
+        if output_format == 'csv':
+            rows = csv.DictReader(f)
+        else:
+            rows = []
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A run killed mid-write can leave a truncated last line
+                    continue
+        for row in rows:
+            if row.get('path') and row.get('top_prediction') and not row.get('error'):
+                completed.add(row['path'])
+    return completed
+
+
+def result_row(path, results=None, error=None):
+    """
+    Flatten a formatted prediction into one output row
+
+    Args:
+        path (str): Relative image path
+        results (dict): Output of format_comprehensive_results
+        error (str): Error message if the image could not be scored
+
+    Returns:
+        dict: Output row
+    """
+    if error is not None:
+        return {'path': path, 'error': error}
+    return {
+        'path': path,
+        'top_prediction': results['top_prediction'],
+        'confidence': round(results['confidence'], 6),
+        'plant': results['plant'],
+        'disease': results['disease'],
+        'is_healthy': results['is_healthy'],
+        'severity': results['disease_info']['severity'],
+        'model_type': results['model_type'],
+        'used_tta': results['used_tta'],
+        'enhanced_image': results['enhanced_image'],
+        'predictions': [
+            {'class': prediction['full_name'], 'confidence': round(prediction['confidence'], 6)}
+            for prediction in results['all_predictions']
+        ],
+        'error': None
+    }
+
+
+class ResultWriter:
+    """Append rows to a CSV or JSONL file, flushing after every batch"""
+
+    def __init__(self, output_path, output_format):
+        self.output_format = output_format
+        write_header = output_format == 'csv' and (not os.path.exists(output_path) or os.path.getsize(output_path) == 0)
+
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(output_path, 'a+', newline='')
+
+        # A run killed mid-write can leave a partial last line; start on a fresh one
+        if self._file.tell() > 0:
+            self._file.seek(self._file.tell() - 1)
+            if self._file.read(1) != '\n':
+                self._file.write('\n')
+
+        if output_format == 'csv':
+            self._writer = csv.DictWriter(self._file, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            if write_header:
+                self._writer.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self.output_format == 'csv':
+                row = dict(row)
+                if 'predictions' in row:
+                    row['predictions'] = json.dumps(row['predictions'])
+                self._writer.writerow(row)
+            else:
+                self._file.write(json.dumps(row) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def decode_image(predictor, path, enhance):
+    """Decode and resize one image in a worker thread"""
+    return predictor.preprocess_image(path, enhance=enhance)[0]
+
+
+def iter_decoded(predictor, input_dir, paths, enhance=False, workers=4, prefetch=2, batch_size=64):
+    """
+    Decode images in a thread pool, keeping a bounded window of work in flight
+
+    Pillow releases the GIL while decoding and resizing, so threads scale
+    across cores. At most (prefetch + 1) batches are queued or held, so
+    memory stays flat however large the directory is.
+
+    Yields:
+        tuple: (relative path, uint8 HWC array or None, error message or None), in input order
+    """
+    window = max(1, (prefetch + 1) * batch_size)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = deque()
+        remaining = iter(paths)
+
+        def fill():
+            for path in remaining:
+                pending.append((path, executor.submit(decode_image, predictor, os.path.join(input_dir, path), enhance)))
+                if len(pending) >= window:
+                    break
+
+        while True:
+            # Top up once a whole batch has been consumed
+            if len(pending) <= window - batch_size:
+                fill()
+            if not pending:
+                break
+
+            path, future = pending.popleft()
+            try:
+                yield path, future.result(), None
+            except Exception as e:
+                yield path, None, str(e)
+
+
+def score_directory(predictor, input_dir, output_path, output_format='csv', batch_size=64, workers=4,
+                    prefetch=2, use_tta=False, enhance=False, top_n=3, resume=True, progress_every=5.0):
+    """
+    Score every image under a directory
+
+    Args:
+        predictor (AdvancedPlantDiseasePredictor): Loaded predictor
+        input_dir (str): Directory searched recursively for images
+        output_path (str): CSV or JSONL file the results are appended to
+        output_format (str): 'csv' or 'jsonl'
+        batch_size (int): Images per model call
+        workers (int): Decode threads
+        prefetch (int): Batches decoded ahead of the model
+        use_tta (bool or str): Whether to use test-time augmentation, or 'adaptive'
+        enhance (bool): Whether to apply image enhancement
+        top_n (int): Predictions kept per image
+        resume (bool): Skip images that already have a result in output_path
+        progress_every (float): Seconds between progress lines
+
+    Returns:
+        dict: Run summary
+    """
+    paths = find_images(input_dir)
+    completed = load_completed(output_path, output_format) if resume else set()
+    if not resume and os.path.exists(output_path):
+        os.remove(output_path)
+    todo = [path for path in paths if path not in completed]
+
+    print(f"🗂️ {len(paths)} images found, {len(paths) - len(todo)} already scored, {len(todo)} to score", file=sys.stderr)
+
+    writer = ResultWriter(output_path, output_format)
+    started_at = time.perf_counter()
+    last_report = started_at
+    scored = 0
+    failed = 0
+
+    def flush(batch):
+        nonlocal scored
+        rows = []
+        if batch:
+            image_batch = np.stack([image for _, image in batch])
+            predictions, details = predictor.predict_batch(image_batch, use_tta=use_tta, return_details=True)
+            for (path, _), item_predictions, item_details in zip(batch, predictions, details):
+                results = predictor.get_top_predictions(item_predictions, top_n)
+                rows.append(result_row(path, predictor.format_comprehensive_results(results, use_tta, enhance, item_details)))
+            scored += len(batch)
+        return rows
+
+    try:
+        batch = []
+        errors = []
+        for path, image, error in iter_decoded(predictor, input_dir, todo, enhance, workers, prefetch, batch_size):
+            if error is not None:
+                failed += 1
+                errors.append(result_row(path, error=error))
+            else:
+                batch.append((path, image))
+
+            if len(batch) >= batch_size:
+                writer.write(flush(batch) + errors)
+                batch, errors = [], []
+
+            now = time.perf_counter()
+            if now - last_report >= progress_every:
+                last_report = now
+                done = scored + failed
+                rate = scored / (now - started_at)
+                eta = (len(todo) - done) / rate if rate > 0 else float('inf')
+                print(f"📈 {done}/{len(todo)} images, {rate:.1f} img/s, ETA {eta:.0f}s", file=sys.stderr)
+
+        writer.write(flush(batch) + errors)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started_at
+    summary = {
+        'found': len(paths),
+        'skipped': len(paths) - len(todo),
+        'scored': scored,
+        'failed': failed,
+        'elapsed_seconds': round(elapsed, 3),
+        'images_per_second': round(scored / elapsed, 2) if elapsed > 0 else 0.0,
+        'output': output_path
+    }
+    if use_tta == 'adaptive':
+        summary['adaptive_tta'] = predictor.get_tta_stats()
+    if predictor.screening_backend is not None:
+        summary['cascade'] = predictor.get_cascade_stats()
+    print(f"✅ Scored {scored} images ({failed} failed) in {elapsed:.1f}s - {summary['images_per_second']} img/s", file=sys.stderr)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score every image under a directory with the plant disease model')
+    parser.add_argument('input_dir', help='Directory searched recursively for images')
+    parser.add_argument('output', help='Results file (.csv or .jsonl), appended to on resume')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, help='Output format (default: from the output extension)')
+    parser.add_argument('--model', default='best_model_advanced.h5', help='Model file')
+    parser.add_argument('--fallback-model', default='best_model.h5', help='Keras model used if --model is missing')
+    parser.add_argument('--class-names', default='class_names_advanced.txt', help='Class names file')
+    parser.add_argument('--backend', default='keras', choices=['keras', 'tflite'], help='Inference backend for --model')
+    parser.add_argument('--num-threads', type=int, default=None, help='TFLite interpreter threads')
+    parser.add_argument('--batch-size', type=int, default=64, help='Images per model call')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Decode threads')
+    parser.add_argument('--prefetch', type=int, default=2, help='Batches decoded ahead of the model')
+    parser.add_argument('--top-n', type=int, default=3, help='Predictions kept per image')
+    parser.add_argument('--use-tta', action='store_true', help='Use test-time augmentation (advanced model only)')
+    parser.add_argument('--adaptive-tta', action='store_true', help='Add TTA views only for uncertain images')
+    parser.add_argument('--tta-confidence-threshold', type=float, default=0.95, help='Adaptive TTA top-1 confidence threshold')
+    parser.add_argument('--tta-margin-threshold', type=float, default=0.5, help='Adaptive TTA top-1/top-2 margin threshold')
+    parser.add_argument('--enhance', action='store_true', help='Apply image enhancement')
+    parser.add_argument('--screening-model', help='Smaller model that scores every image first (cascade mode)')
+    parser.add_argument('--cascade-confidence-threshold', type=float, default=0.8, help='Escalate below this screening confidence')
+    parser.add_argument('--no-resume', action='store_true', help='Overwrite the output instead of skipping scored files')
+    parser.add_argument('--progress-every', type=float, default=5.0, help='Seconds between progress lines')
+    args = parser.parse_args()
+
+    output_format = args.format or ('jsonl' if args.output.lower().endswith(('.jsonl', '.ndjson')) else 'csv')
+    if not os.path.isdir(args.input_dir):
+        raise SystemExit(f"❌ Not a directory: {args.input_dir}")
+
+    backend_options = {'num_threads': args.num_threads} if args.backend == 'tflite' else {}
+    predictor = AdvancedPlantDiseasePredictor(
+        model_path=args.model,
+        class_names_path=args.class_names,
+        fallback_model=args.fallback_model,
+        backend=args.backend,
+        backend_options=backend_options,
+        tta_confidence_threshold=args.tta_confidence_threshold,
+        tta_margin_threshold=args.tta_margin_threshold,
+        screening_model_path=args.screening_model,
+        cascade_confidence_threshold=args.cascade_confidence_threshold
+    )
+
+    summary = score_directory(
+        predictor, args.input_dir, args.output,
+        output_format=output_format,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        prefetch=args.prefetch,
+        use_tta='adaptive' if args.adaptive_tta else args.use_tta,
+        enhance=args.enhance,
+        top_n=args.top_n,
+        resume=not args.no_resume,
+        progress_every=args.progress_every
+    )
+    print(json.dumps(summary))
+
+
+if __name__ == '__main__':
+    main()
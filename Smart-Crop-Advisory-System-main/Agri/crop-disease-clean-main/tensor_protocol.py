@@ -0,0 +1,128 @@
+"""
+Framed binary format for raw image tensors and their predictions
+Lets clients that already hold resized RGB arrays skip image codecs entirely
+
+Request body:
+    16-byte header: magic b'KVT1', uint32 count, uint16 height, uint16 width,
+    uint8 channels (3), uint8 dtype code (1 = uint8), 2 reserved bytes
+    followed by count * height * width * channels bytes, NHWC row-major
+
+Binary response:
+    12-byte header: magic b'KVR1', uint32 count, uint16 top_n, uint16 num_classes
+    followed by count * top_n records of (uint16 class index, float32 confidence)
+
+All integers are little-endian.
+"""
+
+import struct
+
+import numpy as np
+
+TENSOR_MIME_TYPE = 'application/x-krishivannai-tensor'
+RESULT_MIME_TYPE = 'application/x-krishivannai-result'
+
+REQUEST_MAGIC = b'KVT1'
+RESULT_MAGIC = b'KVR1'
+
+REQUEST_HEADER = struct.Struct('<4sIHHBB2x')
+RESULT_HEADER = struct.Struct('<4sIHH')
+
+DTYPE_CODES = {1: np.uint8}
+
+RESULT_RECORD = np.dtype([('class_index', '<u2'), ('confidence', '<f4')])
+
+
+class TensorFormatError(ValueError):
+    """The request body is not a valid tensor frame"""
+
+
+def parse_tensor_request(body, height=None, width=None, max_count=None):
+    """
+    View a framed request body as an image batch, without copying the pixels
+
+    Args:
+        body (bytes): Request body
+        height (int): Required tensor height, None accepts any
+        width (int): Required tensor width, None accepts any
+        max_count (int): Most tensors accepted in one frame, None accepts any
+
+    Returns:
+        np.array: Read-only uint8 array of shape (count, height, width, channels) backed by body
+    """
+    if len(body) < REQUEST_HEADER.size:
+        raise TensorFormatError(f'Body is shorter than the {REQUEST_HEADER.size}-byte header')
+
+    magic, count, tensor_height, tensor_width, channels, dtype_code = REQUEST_HEADER.unpack_from(body)
+    if magic != REQUEST_MAGIC:
+        raise TensorFormatError(f'Bad magic {magic!r}, expected {REQUEST_MAGIC!r}')
+    if dtype_code not in DTYPE_CODES:
+        raise TensorFormatError(f'Unsupported dtype code {dtype_code}, only 1 (uint8) is accepted')
+    if channels != 3:
+        raise TensorFormatError(f'Tensors must have 3 (RGB) channels, got {channels}')
+    if count == 0:
+        raise TensorFormatError('Frame holds no tensors')
+    if max_count is not None and count > max_count:
+        raise TensorFormatError(f'Frame holds {count} tensors, at most {max_count} are accepted per request')
+    if (height is not None and tensor_height != height) or (width is not None and tensor_width != width):
+        raise TensorFormatError(f'Tensors are {tensor_width}x{tensor_height}, the model takes {width}x{height}')
+
+    expected = REQUEST_HEADER.size + count * tensor_height * tensor_width * channels
+    if len(body) != expected:
+        raise TensorFormatError(f'Body is {len(body)} bytes, the header describes {expected}')
+
+    return np.frombuffer(body, dtype=DTYPE_CODES[dtype_code], offset=REQUEST_HEADER.size).reshape(
+        count, tensor_height, tensor_width, channels
+    )
+
+
+def encode_tensor_request(images):
+    """
+    Frame a uint8 image batch for POST /tensor_predict
+
+    Args:
+        images (np.array): uint8 array of shape (N, H, W, 3) or (H, W, 3)
+
+    Returns:
+        bytes: Request body
+    """
+    images = np.asarray(images)
+    if images.ndim == 3:
+        images = images[np.newaxis]
+    if images.dtype != np.uint8 or images.ndim != 4 or images.shape[3] != 3:
+        raise TensorFormatError('Expected a uint8 array of shape (N, H, W, 3)')
+    count, height, width, channels = images.shape
+    return REQUEST_HEADER.pack(REQUEST_MAGIC, count, height, width, channels, 1) + np.ascontiguousarray(images).tobytes()
+
+
+def encode_binary_results(predictions, top_n):
+    """
+    Pack the top classes of each image into a binary result frame
+
+    Args:
+        predictions (np.array): Class probabilities of shape (N, num_classes)
+        top_n (int): Classes kept per image, best first
+
+    Returns:
+        bytes: Response body
+    """
+    count, num_classes = predictions.shape
+    top_n = min(top_n, num_classes)
+    top_indices = np.argsort(predictions, axis=1)[:, ::-1][:, :top_n]
+
+    records = np.empty((count, top_n), dtype=RESULT_RECORD)
+    records['class_index'] = top_indices
+    records['confidence'] = np.take_along_axis(predictions, top_indices, axis=1)
+    return RESULT_HEADER.pack(RESULT_MAGIC, count, top_n, num_classes) + records.tobytes()
+
+
+def decode_binary_results(data):
+    """
+    Read a binary result frame
+
+    Returns:
+        np.array: Structured array of shape (count, top_n) with class_index and confidence fields
+    """
+    magic, count, top_n, _ = RESULT_HEADER.unpack_from(data)
+    if magic != RESULT_MAGIC:
+        raise TensorFormatError(f'Bad magic {magic!r}, expected {RESULT_MAGIC!r}')
+    return np.frombuffer(data, dtype=RESULT_RECORD, offset=RESULT_HEADER.size).reshape(count, top_n)
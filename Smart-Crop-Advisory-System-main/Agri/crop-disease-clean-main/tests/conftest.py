@@ -0,0 +1,38 @@
+"""
+Make the service modules importable from the tests, and build small stand-in models
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Class names given to stand-in models; their disease_info severities differ
+STAND_IN_CLASS_NAMES = ('Tomato___healthy', 'Tomato___Early_blight', 'Tomato___Late_blight', 'Potato___healthy')
+
+
+@pytest.fixture(scope='session')
+def stand_in_model(tmp_path_factory):
+    """
+    Build a 'tiny' untrained model with benchmark.build_stand_in_model, once per input size
+
+    Returns:
+        callable: image_size -> (model path, class names path)
+    """
+    pytest.importorskip('tensorflow')
+    from benchmark import build_stand_in_model
+
+    directory = tmp_path_factory.mktemp('stand_in_models')
+    class_names_path = directory / 'class_names.txt'
+    class_names_path.write_text('\n'.join(STAND_IN_CLASS_NAMES) + '\n')
+    models = {}
+
+    def build(image_size=300):
+        if image_size not in models:
+            model_path = str(directory / f'stand_in_{image_size}.h5')
+            models[image_size] = build_stand_in_model(model_path, image_size, len(STAND_IN_CLASS_NAMES), 'tiny')
+        return models[image_size], str(class_names_path)
+
+    return build
@@ -0,0 +1,141 @@
+"""
+Tests for the similar-case store: exact search, IVF training and reopening
+"""
+
+import numpy as np
+import pytest
+
+from embedding_index import EmbeddingIndex, decode_embedding, encode_embedding, normalize
+
+DIM = 16
+NUM_LISTS = 4
+TRAIN_SIZE = 64
+
+
+def make_vectors(count, seed=0):
+    """Vectors around NUM_LISTS well-separated directions, so k-means finds them"""
+    rng = np.random.default_rng(seed)
+    centres = normalize(rng.normal(size=(NUM_LISTS, DIM)))
+    labels = rng.integers(0, NUM_LISTS, count)
+    return normalize(centres[labels] + rng.normal(scale=0.05, size=(count, DIM))).astype(np.float32)
+
+
+def open_index(directory, **options):
+    options.setdefault('num_lists', NUM_LISTS)
+    options.setdefault('num_probes', NUM_LISTS)
+    options.setdefault('train_size', TRAIN_SIZE)
+    return EmbeddingIndex(str(directory), DIM, model_id='model-a', **options)
+
+
+def assert_finds_itself(index, vectors, ids):
+    for vector, case_id in zip(vectors, ids):
+        best_id, similarity = index.search(vector, k=1)[0]
+        assert best_id == case_id
+        assert similarity == pytest.approx(1.0, abs=1e-3)
+
+
+def test_search_is_exact_below_train_size(tmp_path):
+    index = open_index(tmp_path)
+    vectors = make_vectors(TRAIN_SIZE - 1)
+    ids = index.add(vectors, ['a'] * len(vectors))
+
+    assert ids == list(range(len(vectors)))
+    assert not index.trained
+    assert_finds_itself(index, vectors[:10], ids[:10])
+    index.close()
+
+
+def test_index_trains_at_train_size_and_keeps_later_adds(tmp_path):
+    index = open_index(tmp_path)
+    vectors = make_vectors(TRAIN_SIZE + 40)
+    index.add(vectors[:TRAIN_SIZE], ['a'] * TRAIN_SIZE)
+    # Added while the index may still be training; assigned when it is swapped in
+    late_ids = index.add(vectors[TRAIN_SIZE:], ['b'] * 40)
+
+    assert index.wait_for_training(timeout=30)
+    assert index.trained
+    stats = index.get_stats()
+    assert stats['num_lists'] == NUM_LISTS
+    assert not stats['training']
+    indexed = sum(len(ids) for ids in index._lists) + sum(len(tail) for tail in index._tails)
+    assert indexed == len(vectors)
+    assert_finds_itself(index, vectors[TRAIN_SIZE:], late_ids)
+    index.close()
+
+
+def test_adds_after_training_are_searchable(tmp_path):
+    index = open_index(tmp_path)
+    index.add(make_vectors(TRAIN_SIZE), ['a'] * TRAIN_SIZE)
+    index.wait_for_training(timeout=30)
+
+    vectors = make_vectors(20, seed=1)
+    ids = index.add(vectors, ['b'] * 20)
+
+    assert_finds_itself(index, vectors, ids)
+    index.close()
+
+
+@pytest.mark.parametrize('count', [TRAIN_SIZE - 1, TRAIN_SIZE + 10])
+def test_reopened_store_keeps_vectors_cases_and_index(tmp_path, count):
+    index = open_index(tmp_path)
+    vectors = make_vectors(count)
+    ids = index.add(vectors, [f'class-{i % 3}' for i in range(count)], [{'note': str(i)} for i in range(count)])
+    index.wait_for_training(timeout=30)
+    trained = index.trained
+    index.close()
+
+    reopened = open_index(tmp_path)
+    assert len(reopened) == count
+    assert reopened.trained == trained == (count >= TRAIN_SIZE)
+    assert_finds_itself(reopened, vectors[-5:], ids[-5:])
+    case = reopened.search_cases(vectors[7], k=1)[0]
+    assert case['case_id'] == 7
+    assert case['class_name'] == 'class-1'
+    assert case['note'] == '7'
+    reopened.close()
+
+
+def test_reopen_assigns_vectors_missing_from_the_lists(tmp_path):
+    index = open_index(tmp_path)
+    vectors = make_vectors(TRAIN_SIZE + 10)
+    index.add(vectors, ['a'] * len(vectors))
+    index.wait_for_training(timeout=30)
+    index.close()
+
+    # As if the process stopped before the last assignments were written
+    with open(tmp_path / 'lists.i32', 'r+b') as f:
+        f.truncate(4 * (len(vectors) - 5))
+
+    reopened = open_index(tmp_path)
+    assert sum(len(ids) for ids in reopened._lists) == len(vectors)
+    assert_finds_itself(reopened, vectors[-5:], list(range(len(vectors) - 5, len(vectors))))
+    reopened.close()
+
+
+def test_store_from_another_model_is_refused(tmp_path):
+    open_index(tmp_path).close()
+
+    with pytest.raises(ValueError, match='model-a'):
+        EmbeddingIndex(str(tmp_path), DIM, model_id='model-b')
+
+
+def test_store_with_another_dimension_is_refused(tmp_path):
+    open_index(tmp_path).close()
+
+    with pytest.raises(ValueError, match='16-d'):
+        EmbeddingIndex(str(tmp_path), DIM * 2, model_id='model-a')
+
+
+def test_wrong_size_embeddings_are_rejected(tmp_path):
+    index = open_index(tmp_path)
+    with pytest.raises(ValueError):
+        index.add(np.ones((1, DIM + 1)), ['a'])
+    with pytest.raises(ValueError):
+        index.search(np.ones(DIM + 1))
+    index.close()
+
+
+def test_encoded_embedding_round_trips_normalized():
+    vector = np.arange(1, DIM + 1, dtype=np.float32)
+    decoded = decode_embedding(encode_embedding(vector))
+    np.testing.assert_allclose(decoded, normalize(vector)[0], atol=1e-3)
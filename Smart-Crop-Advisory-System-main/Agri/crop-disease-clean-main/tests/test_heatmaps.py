@@ -0,0 +1,151 @@
+"""
+Tests for Grad-CAM heatmaps: their shape and values, and how /predict caches them
+"""
+
+import importlib
+import io
+import os
+from unittest import mock
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from conftest import STAND_IN_CLASS_NAMES
+
+# The stand-in model's only conv layer has stride 4, so a 224x224 input gives 56x56 feature maps
+FEATURE_MAP_SIZE = 56
+
+
+@pytest.fixture(scope='module')
+def predictor(stand_in_model):
+    from predict_advanced import AdvancedPlantDiseasePredictor
+
+    model_path, class_names_path = stand_in_model(224)
+    return AdvancedPlantDiseasePredictor(
+        model_path=model_path, class_names_path=class_names_path, fallback_model=model_path, warmup=False
+    )
+
+
+@pytest.fixture(scope='module')
+def images():
+    return np.random.default_rng(0).integers(0, 256, (3, 224, 224, 3), dtype=np.uint8)
+
+
+def encoded(seed):
+    """A leafy JPEG upload, different for each seed"""
+    rng = np.random.default_rng(seed)
+    pixels = (rng.random((256, 256, 3)) * 60 + np.array([40, 140, 40])).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def test_heatmaps_cover_the_feature_maps_and_explain_the_top_class(predictor, images):
+    assert predictor.supports_heatmaps
+    predictions, details = predictor.predict_batch(images, return_details=True, return_heatmaps=True)
+
+    for image_predictions, item_details in zip(predictions, details):
+        heatmap = item_details['heatmap']
+        assert heatmap['method'] == 'grad-cam'
+        assert heatmap['class_name'] == STAND_IN_CLASS_NAMES[int(np.argmax(image_predictions))]
+        assert heatmap['layer'] == predictor.backend.heatmap_layer
+        assert heatmap['shape'] == [FEATURE_MAP_SIZE, FEATURE_MAP_SIZE]
+        grid = np.array(heatmap['grid'])
+        assert grid.shape == (FEATURE_MAP_SIZE, FEATURE_MAP_SIZE)
+        assert grid.min() >= 0.0 and grid.max() <= 1.0
+        if heatmap['peak'] is not None:
+            assert grid.max() == 1.0
+            assert 0.0 < heatmap['peak']['x'] < 1.0 and 0.0 < heatmap['peak']['y'] < 1.0
+
+
+def test_heatmaps_share_the_scoring_pass(predictor, images):
+    predictions, details = predictor.predict_batch(images, return_details=True, return_heatmaps=True)
+    np.testing.assert_allclose(predictions, predictor.predict_batch(images), atol=1e-6)
+
+    # The same as Grad-CAM over a separate forward pass
+    _, _, activations = predictor.backend.predict_with_activations(images)
+    heatmaps = predictor.class_activation_maps(activations, predictions.argmax(axis=1))
+    for heatmap, item_details in zip(heatmaps, details):
+        np.testing.assert_allclose(item_details['heatmap']['grid'], np.round(heatmap, 3), atol=1e-3)
+
+
+def test_peak_is_the_centre_of_the_hottest_cell(predictor):
+    heatmap = np.zeros((4, 8), dtype=np.float32)
+    heatmap[1, 3] = 1.0
+    formatted = predictor.format_heatmap(heatmap, STAND_IN_CLASS_NAMES[0])
+    assert formatted['shape'] == [4, 8]
+    assert formatted['peak'] == {'x': 3.5 / 8, 'y': 1.5 / 4}
+
+    # No region supports the class
+    assert predictor.format_heatmap(np.zeros((4, 8), dtype=np.float32), STAND_IN_CLASS_NAMES[0])['peak'] is None
+
+
+@pytest.fixture(scope='module')
+def service(stand_in_model):
+    """The Flask app serving the stand-in model, loaded from the directory holding its class_names.txt"""
+    model_path, class_names_path = stand_in_model(224)
+    environ = {
+        'MODEL_PATH': model_path,
+        'PREDICTION_CACHE_DB': '',
+        'HEATMAP_CACHE_DB': '',
+        'EMBEDDING_STORE_DIR': '',
+        'HEATMAP_MAX_CONCURRENT': '1'
+    }
+    working_directory = os.getcwd()
+    os.chdir(os.path.dirname(class_names_path))
+    try:
+        with mock.patch.dict(os.environ, environ):
+            app_module = importlib.import_module('app_advanced')
+            app_module.model_load_thread.join(60)
+    finally:
+        os.chdir(working_directory)
+    assert app_module.model_load_state['status'] == 'ready'
+    return app_module
+
+
+def predict(service, image_bytes, **fields):
+    response = service.app.test_client().post(
+        '/predict', data={'file': (io.BytesIO(image_bytes), 'leaf.jpg'), **fields}, content_type='multipart/form-data'
+    )
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['results']
+
+
+def test_heatmap_is_computed_once_then_served_from_the_cache(service):
+    image_bytes = encoded(1)
+    computed_before = service.heatmap_counts['computed']
+
+    first = predict(service, image_bytes, heatmap='true', use_tta='false')
+    assert first['heatmap_status'] == 'computed'
+    assert first['heatmap']['shape'] == [FEATURE_MAP_SIZE, FEATURE_MAP_SIZE]
+
+    second = predict(service, image_bytes, heatmap='true', use_tta='false')
+    assert second['heatmap_status'] == 'cached'
+    assert second['cached']
+    assert second['heatmap'] == first['heatmap']
+    assert service.heatmap_counts['computed'] == computed_before + 1
+
+    # The cached prediction itself carries no heatmap
+    plain = predict(service, image_bytes, use_tta='false')
+    assert plain['cached'] and 'heatmap' not in plain and 'heatmap_status' not in plain
+
+
+def test_heatmap_is_keyed_by_image(service):
+    first = predict(service, encoded(2), heatmap='true', use_tta='false')
+    second = predict(service, encoded(3), heatmap='true', use_tta='false')
+    assert first['heatmap_status'] == second['heatmap_status'] == 'computed'
+    assert first['heatmap']['grid'] != second['heatmap']['grid']
+
+
+def test_prediction_without_a_free_slot_is_answered_without_a_heatmap(service):
+    assert service.heatmap_slots.acquire(blocking=False)
+    try:
+        busy = predict(service, encoded(4), heatmap='true', use_tta='false')
+    finally:
+        service.heatmap_slots.release()
+    assert busy['heatmap_status'] == 'busy'
+    assert busy['heatmap'] is None
+
+    # A later request with a free slot computes it
+    assert predict(service, encoded(4), heatmap='true', use_tta='false')['heatmap_status'] == 'computed'
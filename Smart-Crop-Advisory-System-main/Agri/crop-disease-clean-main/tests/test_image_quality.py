@@ -0,0 +1,117 @@
+"""
+Tests for the image-quality gate: measures, thresholds and the off/warn/reject modes
+"""
+
+import numpy as np
+import pytest
+
+from image_quality import QualityGate, assess_quality
+
+# Measures of a good photo under the default thresholds
+GOOD = {'sharpness': 200.0, 'brightness': 120.0, 'dark_fraction': 0.05, 'bright_fraction': 0.05,
+        'green_coverage': 0.6}
+
+
+def leaf(size=64, seed=0):
+    """A sharp, well exposed, mostly green image"""
+    rng = np.random.default_rng(seed)
+    return np.clip(rng.integers(-40, 41, (size, size, 3)) + np.array([60, 150, 50]), 0, 255).astype(np.uint8)
+
+
+def test_measures_of_synthetic_images():
+    sharp = assess_quality(leaf())
+    assert sharp['sharpness'] > 100 and sharp['green_coverage'] > 0.9 and 60 < sharp['brightness'] < 200
+
+    flat = assess_quality(np.full((64, 64, 3), (60, 150, 50), dtype=np.uint8))
+    assert flat['sharpness'] == 0.0
+
+    black = assess_quality(np.zeros((64, 64, 3), dtype=np.uint8))
+    assert black['brightness'] == 0.0 and black['dark_fraction'] == 1.0 and black['green_coverage'] == 0.0
+
+    white = assess_quality(np.full((64, 64, 3), 255, dtype=np.uint8))
+    assert white['brightness'] > 250 and white['bright_fraction'] == 1.0
+
+
+def test_batched_and_single_arrays_measure_the_same():
+    image = leaf()
+    assert assess_quality(image[np.newaxis]) == assess_quality(image)
+
+
+@pytest.mark.parametrize('measure, passing, failing, issue', [
+    ('sharpness', 10.0, 9.99, 'blurry'),
+    ('brightness', 35.0, 34.99, 'too_dark'),
+    ('dark_fraction', 0.6, 0.61, 'too_dark'),
+    ('brightness', 230.0, 230.01, 'overexposed'),
+    ('bright_fraction', 0.6, 0.61, 'overexposed'),
+    ('green_coverage', 0.05, 0.049, 'no_leaf'),
+])
+def test_thresholds_are_inclusive(measure, passing, failing, issue):
+    gate = QualityGate()
+    assert gate.issues({**GOOD, measure: passing}) == []
+    assert gate.issues({**GOOD, measure: failing}) == [issue]
+
+
+def test_too_dark_and_overexposed_are_exclusive():
+    # Crushed and blown pixels at once (harsh contrast) report the darkness only
+    assert QualityGate().issues({**GOOD, 'dark_fraction': 0.7, 'bright_fraction': 0.7}) == ['too_dark']
+
+
+def test_custom_thresholds_apply():
+    gate = QualityGate(min_sharpness=500.0, min_green_coverage=0.0)
+    assert gate.issues(GOOD) == ['blurry']
+    assert gate.issues({**GOOD, 'sharpness': 500.0, 'green_coverage': 0.0}) == []
+
+
+@pytest.mark.parametrize('mode, rejected', [('warn', False), ('reject', True)])
+def test_a_failing_image_is_flagged_or_rejected(mode, rejected):
+    gate = QualityGate(mode=mode)
+    report = gate.check(np.zeros((64, 64, 3), dtype=np.uint8))
+
+    assert not report['passed']
+    assert report['rejected'] is rejected
+    assert report['issues'] == ['blurry', 'too_dark', 'no_leaf']
+    assert len(report['messages']) == 3
+    stats = gate.get_stats()
+    assert (stats['warned'], stats['rejected']) == ((0, 1) if rejected else (1, 0))
+    assert stats['issues']['too_dark'] == 1
+
+
+def test_a_good_image_passes_in_every_mode():
+    for mode in ('warn', 'reject'):
+        report = QualityGate(mode=mode).check(leaf())
+        assert report['passed'] and not report['rejected'] and report['issues'] == []
+
+
+def test_off_skips_the_check():
+    gate = QualityGate(mode='off')
+    assert gate.check(np.zeros((64, 64, 3), dtype=np.uint8)) is None
+    assert gate.get_stats()['checked'] == 0
+
+
+def test_mode_can_be_overridden_per_request():
+    gate = QualityGate(mode='warn')
+    dark = np.zeros((64, 64, 3), dtype=np.uint8)
+    assert gate.check(dark, mode='reject')['rejected']
+    assert not gate.check(dark)['rejected']
+    assert gate.check(dark, mode='off') is None
+    assert gate.get_stats()['checked'] == 2
+
+
+def test_rejections_are_priced_by_measured_inference_time():
+    gate = QualityGate(mode='reject')
+    gate.record_inference(seconds=2.0, images=4, use_tta=False)
+    gate.record_inference(seconds=6.0, images=2, use_tta=True)
+    dark = np.zeros((64, 64, 3), dtype=np.uint8)
+
+    gate.check(dark, use_tta=True)
+    gate.check(dark, use_tta=False)
+    assert gate.get_stats()['inference_seconds_saved'] == pytest.approx(3.5)
+
+    # A mode never scored falls back to the mean over all modes
+    gate.check(dark, use_tta='adaptive')
+    assert gate.get_stats()['inference_seconds_saved'] == pytest.approx(3.5 + 8.0 / 6, abs=1e-3)  # Stats are rounded to ms
+
+
+def test_unknown_mode_is_refused():
+    with pytest.raises(ValueError):
+        QualityGate(mode='strict')
@@ -0,0 +1,323 @@
+"""
+Tests for the micro-batching scheduler: batching, grouping, backpressure, deadlines and shutdown
+"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from micro_batching import MicroBatchScheduler, QueueFullError, SchedulerClosedError
+
+
+class FakePredictor:
+    """Stands in for AdvancedPlantDiseasePredictor; scoring can be held open with `gate`"""
+
+    model_type = 'fake'
+
+    def __init__(self, num_classes=3):
+        self.num_classes = num_classes
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+        self.batches = []
+
+    def prepare_image_array(self, image_array):
+        return image_array
+
+    def predict_batch(self, image_batch, use_tta=False, return_details=False, return_embeddings=False,
+                      return_heatmaps=False):
+        self.batches.append((len(image_batch), use_tta, return_embeddings, return_heatmaps))
+        self.started.set()
+        self.gate.wait()
+        # Each image's score is its first pixel, so results can be matched to inputs
+        predictions = np.zeros((len(image_batch), self.num_classes), dtype=np.float32)
+        predictions[:, 0] = image_batch[:, 0, 0, 0]
+        details = [{'tta_applied': bool(use_tta)} for _ in image_batch]
+        return (predictions, details) if return_details else predictions
+
+    def get_top_predictions(self, predictions, top_n=5):
+        order = np.argsort(predictions)[::-1][:top_n]
+        return [(f'class-{index}', float(predictions[index])) for index in order]
+
+    def format_comprehensive_results(self, results, use_tta, enhanced_image, details):
+        return {'top_prediction': results[0][0], 'score': results[0][1], 'details': details}
+
+
+def image(value=0):
+    return np.full((1, 4, 4, 3), value, dtype=np.uint8)
+
+
+def submit_in_thread(scheduler, timeout=None, value=0):
+    """Submit a raw batch from another thread; returns (thread, outcome dict)"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = scheduler.submit_batch(image(value), timeout=timeout)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def predict_in_thread(scheduler, value, **options):
+    """Submit one image from another thread; returns (thread, outcome dict)"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = scheduler.submit(image(value), top_n=1, timeout=5, **options)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def wait_for_queue_depth(scheduler, depth):
+    deadline = time.monotonic() + 5
+    while scheduler.get_stats()['queue_depth'] < depth and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert scheduler.get_stats()['queue_depth'] == depth
+
+
+@pytest.fixture
+def held():
+    """A one-worker scheduler (batches of up to 4) whose worker is stuck on a first batch, so requests queue up"""
+    predictor = FakePredictor()
+    predictor.gate.clear()
+    scheduler = MicroBatchScheduler(predictor, max_batch_size=4, max_wait_ms=50, max_queue_size=16)
+    scheduler.start()
+    first, _ = submit_in_thread(scheduler)
+    assert predictor.started.wait(5)
+    yield predictor, scheduler
+    predictor.gate.set()
+    scheduler.shutdown(timeout=5)
+    first.join(5)
+
+
+def test_concurrent_requests_share_one_forward_pass(held):
+    predictor, scheduler = held
+    submitted = [predict_in_thread(scheduler, value) for value in (1, 2, 3)]
+    wait_for_queue_depth(scheduler, 3)
+
+    predictor.gate.set()
+    for value, (thread, outcome) in zip((1, 2, 3), submitted):
+        thread.join(5)
+        # Each caller gets its own image's scores back
+        assert outcome['result']['score'] == value
+
+    assert [size for size, *_ in predictor.batches] == [1, 3]
+    assert scheduler.get_stats()['total_requests'] == 4
+
+
+def test_batches_are_capped_at_max_batch_size(held):
+    predictor, scheduler = held
+    submitted = [predict_in_thread(scheduler, value) for value in range(1, 7)]
+    wait_for_queue_depth(scheduler, 6)
+
+    predictor.gate.set()
+    for thread, outcome in submitted:
+        thread.join(5)
+        assert 'result' in outcome
+    assert [size for size, *_ in predictor.batches] == [1, 4, 2]
+
+
+def test_requests_are_grouped_by_tta_mode_and_outputs(held):
+    predictor, scheduler = held
+    options = [
+        {}, {'use_tta': True}, {'use_tta': 'adaptive'}, {'use_tta': False}, {'use_tta': False, 'embedding': True},
+        {'use_tta': False, 'heatmap': True}, {'use_tta': 'adaptive'}
+    ]
+    submitted = []
+    for value, item_options in enumerate(options, start=1):
+        submitted.append(predict_in_thread(scheduler, value, **item_options))
+        # All seven are queued before the worker is released
+        wait_for_queue_depth(scheduler, value)
+
+    scheduler.max_batch_size = len(options)
+    predictor.gate.set()
+    for thread, outcome in submitted:
+        thread.join(5)
+        assert 'result' in outcome
+
+    # One collected batch, one forward pass per (TTA mode, embedding, heatmap) group; submit defaults to TTA
+    assert len(predictor.batches) == 1 + 5
+    groups = {(use_tta, embedding, heatmap): size for size, use_tta, embedding, heatmap in predictor.batches[1:]}
+    assert groups == {
+        (True, False, False): 2,
+        ('adaptive', False, False): 2,
+        (False, False, False): 1,
+        (False, True, False): 1,
+        (False, False, True): 1
+    }
+
+
+def test_raw_batches_are_scored_on_their_own(held):
+    predictor, scheduler = held
+    raw, raw_outcome = submit_in_thread(scheduler, timeout=5, value=9)
+    wait_for_queue_depth(scheduler, 1)
+    singles = [predict_in_thread(scheduler, value, use_tta=False) for value in (1, 2)]
+    wait_for_queue_depth(scheduler, 3)
+
+    predictor.gate.set()
+    raw.join(5)
+    for thread, outcome in singles:
+        thread.join(5)
+        assert 'result' in outcome
+    predictions, details = raw_outcome['result']
+    assert predictions[0, 0] == 9 and len(details) == 1
+    assert [size for size, *_ in predictor.batches] == [1, 1, 2]
+
+
+@pytest.fixture
+def blocked():
+    """A one-worker scheduler whose worker is stuck scoring a first batch"""
+    predictor = FakePredictor()
+    predictor.gate.clear()
+    scheduler = MicroBatchScheduler(predictor, max_batch_size=4, max_wait_ms=0, max_queue_size=2)
+    scheduler.start()
+    first, outcome = submit_in_thread(scheduler)
+    assert predictor.started.wait(5)
+    yield predictor, scheduler, first, outcome
+    predictor.gate.set()
+    scheduler.shutdown(timeout=5)
+    first.join(5)
+
+
+def test_full_queue_is_rejected_without_waiting(blocked):
+    predictor, scheduler, _, _ = blocked
+    waiting = [submit_in_thread(scheduler) for _ in range(2)]
+    deadline = time.monotonic() + 5
+    while scheduler.get_stats()['queue_depth'] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert scheduler.is_saturated()
+
+    started_at = time.perf_counter()
+    with pytest.raises(QueueFullError):
+        scheduler.submit_batch(image(), timeout=5)
+    assert time.perf_counter() - started_at < 1.0
+    assert scheduler.get_stats()['rejected'] == 1
+
+    predictor.gate.set()
+    for thread, outcome in waiting:
+        thread.join(5)
+        assert 'result' in outcome
+
+
+def test_deadline_expires_while_queued_and_the_item_is_never_scored(blocked):
+    predictor, scheduler, _, _ = blocked
+
+    with pytest.raises(TimeoutError):
+        scheduler.submit_batch(image(7), timeout=0.05)
+
+    predictor.gate.set()
+    scheduler.shutdown(timeout=5)
+    stats = scheduler.get_stats()
+    assert stats['timed_out'] == 1
+    # Cancelled work is dropped, not counted again as expired or scored
+    assert stats['expired'] == 0
+    assert stats['total_requests'] == 1
+    assert len(predictor.batches) == 1
+
+
+def test_cancelled_items_do_not_take_a_place_in_the_batch():
+    predictor = FakePredictor()
+    predictor.gate.clear()
+    scheduler = MicroBatchScheduler(predictor, max_batch_size=4, max_wait_ms=50, max_queue_size=8)
+    scheduler.start()
+    blocker, _ = submit_in_thread(scheduler)
+    assert predictor.started.wait(5)
+
+    with pytest.raises(TimeoutError):
+        scheduler.submit(image(1), timeout=0.05)
+    live = threading.Thread(target=lambda: scheduler.submit(image(2), timeout=5))
+    live.start()
+    time.sleep(0.05)
+    predictor.gate.set()
+    live.join(5)
+    blocker.join(5)
+    scheduler.shutdown(timeout=5)
+
+    assert [size for size, *_ in predictor.batches] == [1, 1]
+
+
+def test_queued_deadline_counts_as_expired():
+    predictor = FakePredictor()
+    scheduler = MicroBatchScheduler(predictor, max_wait_ms=0)
+    scheduler.start()
+    passed_deadline = time.perf_counter() - 1.0
+
+    # An item whose deadline passed before a worker reached it, with the caller still waiting
+    original = scheduler._drop_expired
+
+    def expire_first(batch):
+        for item in batch:
+            item.deadline = passed_deadline
+        return original(batch)
+
+    scheduler._drop_expired = expire_first
+    with pytest.raises(TimeoutError, match='Deadline passed'):
+        scheduler.submit(image(), timeout=5)
+    scheduler.shutdown(timeout=5)
+    assert scheduler.get_stats()['expired'] == 1
+    assert predictor.batches == []
+
+
+def test_shutdown_returns_within_its_timeout_while_a_worker_is_busy(blocked):
+    predictor, scheduler, first, outcome = blocked
+
+    started_at = time.perf_counter()
+    scheduler.shutdown(timeout=0.1)
+    assert time.perf_counter() - started_at < 1.0
+
+    # The batch in progress still completes once the model returns
+    predictor.gate.set()
+    first.join(5)
+    assert 'result' in outcome
+
+
+def test_shutdown_drains_queued_work():
+    predictor = FakePredictor()
+    predictor.gate.clear()
+    scheduler = MicroBatchScheduler(predictor, max_wait_ms=0, max_queue_size=8)
+    scheduler.start()
+    submitted = [submit_in_thread(scheduler, timeout=5, value=value) for value in range(3)]
+    assert predictor.started.wait(5)
+    time.sleep(0.05)
+
+    stopper = threading.Thread(target=scheduler.shutdown)
+    stopper.start()
+    predictor.gate.set()
+    stopper.join(5)
+
+    assert not stopper.is_alive()
+    assert all(not worker.is_alive() for worker in scheduler._workers)
+    for thread, outcome in submitted:
+        thread.join(5)
+        assert 'result' in outcome
+
+
+def test_shut_down_scheduler_refuses_work_instead_of_restarting():
+    scheduler = MicroBatchScheduler(FakePredictor())
+    scheduler.start()
+    scheduler.shutdown(timeout=5)
+
+    with pytest.raises(SchedulerClosedError):
+        scheduler.submit(image(), timeout=1)
+    with pytest.raises(SchedulerClosedError):
+        scheduler.start()
+    assert all(not worker.is_alive() for worker in scheduler._workers)
+    assert scheduler.get_stats()['closed']
+
+
+def test_unstarted_scheduler_starts_on_first_submit():
+    scheduler = MicroBatchScheduler(FakePredictor())
+    predictions, _ = scheduler.submit_batch(image(9), timeout=5)
+    assert predictions[0, 0] == 9
+    scheduler.shutdown(timeout=5)
@@ -0,0 +1,227 @@
+"""
+Tests for the crop model registry: lazy loading, leases and LRU eviction under the memory budget
+"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from micro_batching import MicroBatchScheduler, SchedulerClosedError
+from model_registry import ModelRegistry, UnknownModelError, load_registry_specs
+
+MB = 1024 * 1024
+
+
+class FakePredictor:
+    """Stands in for a loaded model of a given size"""
+
+    model_type = 'fake'
+    class_names = ['a', 'b']
+
+    def __init__(self, model_id, memory_bytes):
+        self.loaded_model_path = f'{model_id}.h5'
+        self._memory_bytes = memory_bytes
+
+    def memory_bytes(self):
+        return self._memory_bytes
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.stopped = False
+
+    def shutdown(self, timeout=None):
+        self.stopped = True
+
+
+class Loader:
+    """load_predictor for the registry; counts loads and can be made to fail or stall"""
+
+    def __init__(self, memory_bytes=MB):
+        self.memory_bytes = memory_bytes
+        self.loads = []
+        self.fail = False
+        self.delay = 0.0
+
+    def __call__(self, model_id, spec):
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise OSError(f'Cannot read {spec["model_path"]}')
+        self.loads.append(model_id)
+        return FakePredictor(model_id, self.memory_bytes)
+
+
+SPECS = {model_id: {'model_path': f'{model_id}.h5'} for model_id in ('tomato', 'potato', 'apple', 'grape')}
+
+
+def make_registry(memory_budget_mb=2, loader=None):
+    schedulers = {}
+
+    def make_scheduler(predictor):
+        schedulers[predictor.loaded_model_path] = FakeScheduler()
+        return schedulers[predictor.loaded_model_path]
+
+    registry = ModelRegistry(SPECS, loader or Loader(), make_scheduler, memory_budget_mb=memory_budget_mb)
+    return registry, schedulers
+
+
+def resident(registry):
+    """Resident model IDs, least recently used first"""
+    return [entry['model_id'] for entry in reversed(registry.get_stats()['resident'])]
+
+
+def use(registry, *model_ids):
+    for model_id in model_ids:
+        with registry.lease(model_id):
+            pass
+
+
+def test_models_load_on_first_use_only():
+    loader = Loader()
+    registry, _ = make_registry(loader=loader)
+    assert resident(registry) == []
+
+    use(registry, 'tomato', 'tomato')
+    stats = registry.get_stats()
+    assert loader.loads == ['tomato']
+    assert (stats['loads'], stats['hits']) == (1, 1)
+    assert stats['resident'][0]['uses'] == 2
+
+
+def test_least_recently_used_model_is_evicted_over_budget():
+    registry, schedulers = make_registry(memory_budget_mb=2)
+    use(registry, 'tomato', 'potato', 'apple')
+
+    assert resident(registry) == ['potato', 'apple']
+    assert schedulers['tomato.h5'].stopped
+    assert not schedulers['potato.h5'].stopped
+
+    # Using potato makes apple the least recently used
+    use(registry, 'potato', 'grape')
+    assert resident(registry) == ['potato', 'grape']
+    stats = registry.get_stats()
+    assert stats['evictions'] == 2
+    assert stats['resident_bytes'] == 2 * MB <= stats['memory_budget_mb'] * MB
+
+
+def test_leased_model_is_not_evicted_until_its_lease_ends():
+    registry, schedulers = make_registry(memory_budget_mb=1)
+
+    with registry.lease('tomato') as (predictor, scheduler):
+        use(registry, 'potato')
+        # tomato is over budget but in use: the idle potato goes instead
+        assert resident(registry) == ['tomato']
+        assert not scheduler.stopped
+        assert schedulers['potato.h5'].stopped
+        assert registry.get_stats()['resident'][0]['in_use'] == 1
+
+    use(registry, 'apple')
+    assert resident(registry) == ['apple']
+    assert schedulers['tomato.h5'].stopped
+
+
+def test_budget_is_enforced_when_a_lease_ends():
+    registry, _ = make_registry(memory_budget_mb=1)
+    with registry.lease('tomato'):
+        with registry.lease('potato'):
+            # Both in use: the budget is exceeded rather than evicting either
+            assert resident(registry) == ['tomato', 'potato']
+        # potato is idle again and over budget
+        assert resident(registry) == ['tomato']
+    assert resident(registry) == ['tomato']
+
+
+def test_concurrent_first_uses_load_once():
+    loader = Loader()
+    loader.delay = 0.1
+    registry, _ = make_registry(loader=loader)
+    leased = []
+
+    def run():
+        with registry.lease('tomato') as (predictor, _):
+            leased.append(predictor)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert loader.loads == ['tomato']
+    assert len(leased) == 4 and all(predictor is leased[0] for predictor in leased)
+    assert registry.get_stats()['hits'] == 3
+
+
+def test_failed_load_is_counted_and_retried():
+    loader = Loader()
+    registry, _ = make_registry(loader=loader)
+    loader.fail = True
+    with pytest.raises(OSError):
+        use(registry, 'tomato')
+    assert resident(registry) == []
+    assert registry.get_stats()['load_failures'] == 1
+
+    loader.fail = False
+    use(registry, 'tomato')
+    assert resident(registry) == ['tomato']
+
+
+def test_unknown_models_and_crops():
+    registry, _ = make_registry()
+    with pytest.raises(UnknownModelError):
+        use(registry, 'rice')
+    assert registry.model_for_crop('Tomato') == 'tomato'
+    assert registry.model_for_crop('Rice') is None
+    assert registry.model_for_crop(None) is None
+
+
+def test_shutdown_unloads_every_model():
+    registry, schedulers = make_registry(memory_budget_mb=10)
+    use(registry, 'tomato', 'potato')
+    registry.shutdown()
+    assert resident(registry) == []
+    assert all(scheduler.stopped for scheduler in schedulers.values())
+
+
+def test_registry_file_is_validated(tmp_path):
+    assert load_registry_specs(str(tmp_path / 'missing.json')) == {}
+    path = tmp_path / 'registry.json'
+    path.write_text('{"models": {"tomato": {"crops": ["Tomato"]}}}')
+    with pytest.raises(ValueError):
+        load_registry_specs(str(path))
+
+
+def test_evicted_stand_in_model_stops_taking_work(stand_in_model):
+    from predict_advanced import AdvancedPlantDiseasePredictor
+
+    model_path, class_names_path = stand_in_model(224)
+
+    def load_predictor(model_id, spec):
+        return AdvancedPlantDiseasePredictor(
+            model_path=spec['model_path'], class_names_path=class_names_path, fallback_model=spec['model_path'],
+            warmup=False
+        )
+
+    def make_scheduler(predictor):
+        scheduler = MicroBatchScheduler(predictor, max_wait_ms=0)
+        scheduler.start()
+        return scheduler
+
+    specs = {'tomato': {'model_path': model_path}, 'potato': {'model_path': model_path}}
+    probe = load_predictor('probe', specs['tomato'])
+    # Room for one model only
+    registry = ModelRegistry(specs, load_predictor, make_scheduler, memory_budget_mb=1.5 * probe.memory_bytes() / MB)
+    image = np.zeros((1, 224, 224, 3), dtype=np.uint8)
+
+    with registry.lease('tomato') as (_, tomato_scheduler):
+        assert tomato_scheduler.submit(image, top_n=1, use_tta=False, timeout=30)['top_prediction']
+    with registry.lease('potato') as (_, potato_scheduler):
+        assert potato_scheduler.submit(image, top_n=1, use_tta=False, timeout=30)['top_prediction']
+
+    assert resident(registry) == ['potato']
+    with pytest.raises(SchedulerClosedError):
+        tomato_scheduler.submit(image, top_n=1, use_tta=False, timeout=30)
+    registry.shutdown()
@@ -0,0 +1,105 @@
+"""
+Tests for the two-tier prediction cache and its keys
+"""
+
+import pytest
+
+from image_quality import QualityGate
+from prediction_cache import PredictionCache
+
+IMAGE = b'\xff\xd8 fake jpeg bytes'
+OPTIONS = {'use_tta': False, 'enhance_image': True, 'top_n': 3}
+
+
+def test_key_is_stable_and_ignores_option_order():
+    key = PredictionCache.make_key(IMAGE, 'model-a', **OPTIONS)
+    assert key == PredictionCache.make_key(IMAGE, 'model-a', top_n=3, enhance_image=True, use_tta=False)
+    assert len(key) == 64
+
+
+@pytest.mark.parametrize('change', [
+    {'use_tta': True},
+    {'use_tta': 'adaptive'},
+    {'enhance_image': False},
+    {'top_n': 5},
+    {'embedding': True},
+    {'heatmap': True},
+    {'tiling': {'overlap': 0.25, 'max_tiles': 16}},
+])
+def test_key_separates_options(change):
+    assert (PredictionCache.make_key(IMAGE, 'model-a', **OPTIONS)
+            != PredictionCache.make_key(IMAGE, 'model-a', **{**OPTIONS, **change}))
+
+
+def test_key_separates_models_and_images():
+    key = PredictionCache.make_key(IMAGE, 'model-a', **OPTIONS)
+    assert key != PredictionCache.make_key(IMAGE, 'model-b', **OPTIONS)
+    assert key != PredictionCache.make_key(IMAGE + b'\0', 'model-a', **OPTIONS)
+
+
+def test_key_separates_quality_gate_settings():
+    gate = QualityGate(mode='warn')
+    keys = {
+        PredictionCache.make_key(IMAGE, 'model-a', quality_gate=settings, **OPTIONS)
+        for settings in (gate.settings(), gate.settings('reject'), gate.settings('off'),
+                         QualityGate(mode='warn', min_sharpness=50.0).settings())
+    }
+    assert len(keys) == 4
+    # The thresholds do not matter once the gate is off
+    assert QualityGate(mode='off').settings() == QualityGate(mode='off', min_sharpness=50.0).settings()
+
+
+def test_get_returns_a_fresh_copy():
+    cache = PredictionCache(max_entries=4)
+    cache.put('key', {'predictions': [['Tomato___healthy', 0.9]]})
+
+    cache.get('key')['predictions'].clear()
+
+    assert cache.get('key') == {'predictions': [['Tomato___healthy', 0.9]]}
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = PredictionCache(max_entries=2)
+    cache.put('a', {'n': 1})
+    cache.put('b', {'n': 2})
+    cache.get('a')  # b is now the least recently used
+    cache.put('c', {'n': 3})
+
+    assert cache.get('b') is None
+    assert cache.get('a') == {'n': 1}
+    assert cache.get('c') == {'n': 3}
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_evicted_entries_fall_through_to_sqlite(tmp_path):
+    cache = PredictionCache(max_entries=1, db_path=str(tmp_path / 'cache.sqlite3'))
+    cache.put('a', {'n': 1})
+    cache.put('b', {'n': 2})  # Evicts a from memory only
+
+    assert cache.get('a') == {'n': 1}
+    stats = cache.get_stats()
+    assert stats['disk_hits'] == 1
+    assert stats['memory_hits'] == 0
+
+    # The disk hit was promoted back into memory
+    assert cache.get('a') == {'n': 1}
+    assert cache.get_stats()['memory_hits'] == 1
+
+
+def test_sqlite_tier_survives_a_restart(tmp_path):
+    db_path = str(tmp_path / 'cache.sqlite3')
+    PredictionCache(max_entries=4, db_path=db_path).put('a', {'n': 1})
+
+    cache = PredictionCache(max_entries=4, db_path=db_path)
+    assert cache.get('a') == {'n': 1}
+    assert cache.get_stats()['disk_hits'] == 1
+    assert cache.get('missing') is None
+    assert cache.get_stats()['misses'] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = PredictionCache(max_entries=0)
+    cache.put('a', {'n': 1})
+
+    assert not cache.enabled
+    assert cache.get('a') is None
@@ -0,0 +1,86 @@
+"""
+Tests for the remote backend's calls to a stalled or slow inference server
+"""
+
+import threading
+import time
+from multiprocessing.connection import Listener
+
+import numpy as np
+import pytest
+
+from inference_backends import RemoteBackend
+
+AUTHKEY = b'test-key'
+INFO = {'input_shape': [None, 4, 4, 3], 'fingerprint': 'fake'}
+
+
+class FakeServer:
+    """Answers 'info' and 'predict'; predict replies are held back while `stalled` is set"""
+
+    def __init__(self, socket_path):
+        self.listener = Listener(socket_path, family='AF_UNIX', authkey=AUTHKEY)
+        self.stalled = threading.Event()
+        self.connections = 0
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        while True:
+            try:
+                command, payload = connection.recv()
+            except (EOFError, OSError):
+                return
+            if command == 'info':
+                connection.send(('ok', INFO))
+                continue
+            if self.stalled.is_set():
+                time.sleep(1.0)
+            try:
+                connection.send(('ok', np.ones((len(payload), 2), dtype=np.float32)))
+            except OSError:
+                return
+
+    def close(self):
+        self.listener.close()
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = FakeServer(str(tmp_path / 'inference.sock'))
+    yield server
+    server.close()
+
+
+def test_call_returns_the_server_reply(server):
+    backend = RemoteBackend(server.listener.address, authkey=AUTHKEY, connect_timeout=5, call_timeout=5)
+    predictions = backend.predict(np.zeros((3, 4, 4, 3), dtype=np.uint8))
+    assert predictions.shape == (3, 2)
+    assert backend.input_shape == (None, 4, 4, 3)
+
+
+def test_stalled_server_times_out_and_the_connection_is_discarded(server):
+    backend = RemoteBackend(server.listener.address, authkey=AUTHKEY, connect_timeout=5, call_timeout=0.2)
+    batch = np.zeros((1, 4, 4, 3), dtype=np.uint8)
+    backend.predict(batch)
+    assert server.connections == 1
+
+    server.stalled.set()
+    started_at = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        backend.predict(batch)
+    assert time.perf_counter() - started_at < 0.9
+    assert backend._connections.empty()
+
+    # The late reply is never read as the answer to the next call, which gets a new connection
+    server.stalled.clear()
+    assert backend.predict(np.zeros((2, 4, 4, 3), dtype=np.uint8)).shape == (2, 2)
+    assert server.connections == 2
@@ -0,0 +1,97 @@
+"""
+Tests for the framed tensor request format
+"""
+
+import numpy as np
+import pytest
+
+from tensor_protocol import (REQUEST_HEADER, REQUEST_MAGIC, TensorFormatError, decode_binary_results,
+                             encode_binary_results, encode_tensor_request, parse_tensor_request)
+
+
+def make_images(count=3, height=4, width=5):
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (count, height, width, 3), dtype=np.uint8)
+
+
+def test_round_trip_is_a_view_over_the_body():
+    images = make_images()
+    body = encode_tensor_request(images)
+
+    tensors = parse_tensor_request(body, 4, 5)
+
+    assert tensors.shape == images.shape
+    assert tensors.dtype == np.uint8
+    np.testing.assert_array_equal(tensors, images)
+    assert not tensors.flags.writeable
+    assert not tensors.flags.owndata
+
+
+def test_single_image_is_framed_as_a_batch_of_one():
+    image = make_images(1)[0]
+    assert parse_tensor_request(encode_tensor_request(image)).shape == (1, 4, 5, 3)
+
+
+@pytest.mark.parametrize('length', [0, 1, REQUEST_HEADER.size - 1])
+def test_truncated_header_is_rejected(length):
+    body = encode_tensor_request(make_images())
+    with pytest.raises(TensorFormatError, match='header'):
+        parse_tensor_request(body[:length])
+
+
+@pytest.mark.parametrize('cut', [1, 3 * 4 * 5, 4 * 5 * 3 * 3])
+def test_truncated_pixels_are_rejected(cut):
+    body = encode_tensor_request(make_images())
+    with pytest.raises(TensorFormatError, match='bytes'):
+        parse_tensor_request(body[:-cut])
+
+
+def test_trailing_bytes_are_rejected():
+    body = encode_tensor_request(make_images())
+    with pytest.raises(TensorFormatError, match='bytes'):
+        parse_tensor_request(body + b'\0')
+
+
+def test_oversized_frame_is_rejected_from_the_header_alone():
+    # The count is checked before the body length, so a huge claimed count never needs its pixels
+    header = REQUEST_HEADER.pack(REQUEST_MAGIC, 100000, 4, 5, 3, 1)
+    with pytest.raises(TensorFormatError, match='at most 500'):
+        parse_tensor_request(header, 4, 5, max_count=500)
+
+
+def test_frame_at_the_limit_is_accepted():
+    body = encode_tensor_request(make_images(3))
+    assert len(parse_tensor_request(body, max_count=3)) == 3
+    with pytest.raises(TensorFormatError, match='at most 2'):
+        parse_tensor_request(body, max_count=2)
+
+
+def test_empty_frame_is_rejected():
+    with pytest.raises(TensorFormatError, match='no tensors'):
+        parse_tensor_request(REQUEST_HEADER.pack(REQUEST_MAGIC, 0, 4, 5, 3, 1))
+
+
+@pytest.mark.parametrize('header, message', [
+    (REQUEST_HEADER.pack(b'XXXX', 1, 4, 5, 3, 1), 'magic'),
+    (REQUEST_HEADER.pack(REQUEST_MAGIC, 1, 4, 5, 3, 2), 'dtype'),
+    (REQUEST_HEADER.pack(REQUEST_MAGIC, 1, 4, 5, 4, 1), 'channels'),
+])
+def test_bad_header_fields_are_rejected(header, message):
+    with pytest.raises(TensorFormatError, match=message):
+        parse_tensor_request(header + bytes(4 * 5 * 4))
+
+
+def test_wrong_input_size_is_rejected():
+    body = encode_tensor_request(make_images())
+    with pytest.raises(TensorFormatError, match='the model takes'):
+        parse_tensor_request(body, 224, 224)
+
+
+def test_binary_results_hold_the_top_classes_best_first():
+    predictions = np.array([[0.1, 0.7, 0.2], [0.5, 0.2, 0.3]], dtype=np.float32)
+
+    records = decode_binary_results(encode_binary_results(predictions, 2))
+
+    assert records.shape == (2, 2)
+    np.testing.assert_array_equal(records['class_index'], [[1, 2], [0, 2]])
+    np.testing.assert_allclose(records['confidence'], [[0.7, 0.2], [0.5, 0.3]])
@@ -0,0 +1,102 @@
+"""
+Tests for batched test-time augmentation: one model call over every view of every
+image must give what scoring each image's views separately gives
+"""
+
+import numpy as np
+import pytest
+
+from predict_advanced import AdvancedPlantDiseasePredictor
+
+TTA_VIEWS = 5
+TTA_SEED = 7
+
+
+def make_predictor(stand_in_model, **options):
+    model_path, class_names_path = stand_in_model(300)
+    options = {'tta_views': TTA_VIEWS, 'tta_seed': TTA_SEED, **options}
+    return AdvancedPlantDiseasePredictor(
+        model_path=model_path, class_names_path=class_names_path, fallback_model=model_path, warmup=False, **options
+    )
+
+
+@pytest.fixture(scope='module')
+def predictor(stand_in_model):
+    return make_predictor(stand_in_model)
+
+
+@pytest.fixture(scope='module')
+def images():
+    return np.random.default_rng(0).integers(0, 256, (6, 300, 300, 3), dtype=np.uint8)
+
+
+def reference_views(image, seed=TTA_SEED, num_views=TTA_VIEWS):
+    """The TTA views of one image, built view by view from the documented augmentations"""
+    rng = np.random.default_rng(seed)
+    brightness = rng.uniform(0.9, 1.1, size=num_views - 1).astype('float32')
+    noise = rng.normal(0, 0.01, size=(num_views - 1,) + image.shape).astype('float32')
+    original = image.astype('float32') / 255.0
+    views = [original]
+    for i in range(num_views - 1):
+        source = original[:, ::-1] if i % 2 == 0 else original
+        views.append(np.clip(np.minimum(source * brightness[i], 1) + noise[i], 0, 1))
+    return np.stack(views)
+
+
+def test_predictor_is_advanced(predictor):
+    # TTA only runs for the 300x300 model
+    assert predictor.model_type == 'advanced'
+
+
+def test_batched_tta_matches_one_pass_per_view(predictor, images):
+    batched = predictor.test_time_augmentation(images)
+    # The views do change the scores, so matching them below is not trivial
+    assert not np.allclose(batched, predictor.backend.predict(images), atol=1e-5)
+
+    for image, image_predictions in zip(images, batched):
+        per_view = [predictor.backend.predict(view[np.newaxis]) for view in reference_views(image)]
+        np.testing.assert_allclose(image_predictions, np.mean(per_view, axis=0)[0], atol=1e-5)
+
+
+def test_batched_tta_matches_tta_one_image_at_a_time(predictor, images):
+    batched = predictor.test_time_augmentation(images)
+    singles = np.concatenate([predictor.test_time_augmentation(image[np.newaxis]) for image in images])
+    np.testing.assert_allclose(batched, singles, atol=1e-5)
+
+
+def test_tta_from_base_predictions_matches_full_tta(predictor, images):
+    base_predictions = predictor.backend.predict(images)
+    np.testing.assert_allclose(
+        predictor.test_time_augmentation(images, base_predictions=base_predictions),
+        predictor.test_time_augmentation(images),
+        atol=1e-5
+    )
+
+
+def test_original_view_features_come_from_the_same_call(predictor, images):
+    predictions, outputs = predictor.test_time_augmentation(images, features=('embeddings',))
+    _, embeddings = predictor.backend.predict_with_embeddings(images)
+    np.testing.assert_allclose(predictions, predictor.test_time_augmentation(images), atol=1e-5)
+    np.testing.assert_allclose(outputs['embeddings'], embeddings, atol=1e-5)
+
+
+def test_views_are_fixed_by_the_seed(stand_in_model, predictor, images):
+    same_seed = make_predictor(stand_in_model)
+    np.testing.assert_array_equal(same_seed.test_time_augmentation(images), predictor.test_time_augmentation(images))
+
+    other_seed = make_predictor(stand_in_model, tta_seed=TTA_SEED + 1)
+    assert not np.array_equal(other_seed.test_time_augmentation(images), predictor.test_time_augmentation(images))
+
+
+def test_adaptive_tta_scores_only_uncertain_images(stand_in_model, images):
+    # An untrained model is never this confident, so every image is escalated ...
+    always = make_predictor(stand_in_model, tta_confidence_threshold=1.0, tta_margin_threshold=1.0)
+    predictions, tta_applied = always.adaptive_test_time_augmentation(images)
+    assert tta_applied.all()
+    np.testing.assert_allclose(predictions, always.test_time_augmentation(images), atol=1e-5)
+
+    # ... and with thresholds of 0 none is, leaving the plain predictions
+    never = make_predictor(stand_in_model, tta_confidence_threshold=0.0, tta_margin_threshold=0.0)
+    predictions, tta_applied = never.adaptive_test_time_augmentation(images)
+    assert not tta_applied.any()
+    np.testing.assert_allclose(predictions, never.backend.predict(images), atol=1e-6)
@@ -0,0 +1,209 @@
+"""
+Tiled inference for high-resolution field photos
+Cuts a photo into overlapping model-sized tiles, skips near-uniform background
+tiles, scores the rest in batched forward passes and aggregates the tile
+scores into one image-level prediction plus a per-tile heatmap
+"""
+
+import math
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from metrics import stage_timer
+
+# How tile probabilities are combined into the image-level prediction
+TILE_AGGREGATIONS = ('max', 'mean')
+
+
+def tile_offsets(length, tile_size, stride):
+    """
+    Start offsets of tiles covering [0, length), the last one flush with the edge
+
+    Args:
+        length (int): Image width or height in pixels
+        tile_size (int): Tile width or height in pixels
+        stride (int): Distance between tile starts
+
+    Returns:
+        list: Tile start offsets
+    """
+    if length <= tile_size:
+        return [0]
+    count = math.ceil((length - tile_size) / stride) + 1
+    offsets = [min(index * stride, length - tile_size) for index in range(count)]
+    return sorted(set(offsets))
+
+
+def fit_scale(width, height, tile_width, tile_height, stride_x, stride_y, max_tiles):
+    """
+    Scale factor that keeps the tile grid within max_tiles
+
+    The image is never scaled below one tile, and images smaller than a tile
+    are scaled up to one.
+
+    Returns:
+        float: Factor applied to the full-resolution image
+    """
+    min_scale = max(tile_width / width, tile_height / height)
+    scale = max(1.0, min_scale)
+    while True:
+        scaled_width, scaled_height = round(width * scale), round(height * scale)
+        tiles = (len(tile_offsets(scaled_width, tile_width, stride_x)) *
+                 len(tile_offsets(scaled_height, tile_height, stride_y)))
+        if tiles <= max_tiles or scaled_width <= tile_width or scaled_height <= tile_height:
+            return scale
+        scale = max(scale * 0.9, min_scale)
+
+
+def load_tiling_image(source, tile_width, tile_height, stride_x, stride_y, max_tiles):
+    """
+    Decode a photo at the resolution its tile grid will be cut from
+
+    JPEGs are decoded at reduced scale (PIL draft mode) when the grid needs
+    fewer pixels than the photo has.
+
+    Returns:
+        tuple: (uint8 HWC array, scale relative to the original, original (width, height))
+    """
+    with stage_timer('decode'):
+        image = Image.open(source)
+        # Orientation swaps the axes, so work out the grid on the displayed size
+        orientation = image.getexif().get(0x0112, 1)
+        width, height = image.size if orientation not in (5, 6, 7, 8) else image.size[::-1]
+
+        scale = fit_scale(width, height, tile_width, tile_height, stride_x, stride_y, max_tiles)
+        target_size = (max(tile_width, round(width * scale)), max(tile_height, round(height * scale)))
+        image.draft('RGB', target_size if orientation not in (5, 6, 7, 8) else target_size[::-1])
+        image.load()
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+    with stage_timer('resize'):
+        if image.size != target_size:
+            image = image.resize(target_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    return np.asarray(image), scale, (width, height)
+
+
+def is_uniform_tile(tile, min_std):
+    """Cheap background check: pixel spread on a strided subsample"""
+    return float(tile[::4, ::4].std()) < min_std
+
+
+def healthy_mask(class_names):
+    """Boolean mask of the healthy classes"""
+    return np.array(['healthy' in name.split('___')[-1].lower() for name in class_names])
+
+
+def predict_tiled(predictor, source, overlap=0.25, max_tiles=64, min_std=8.0, aggregation='max',
+                  batch_size=32, use_tta=False, score_batch=None):
+    """
+    Score a high-resolution photo tile by tile
+
+    Args:
+        predictor (AdvancedPlantDiseasePredictor): Loaded predictor; tiles have its input size
+        source (str or file): Path or file-like object of the encoded photo
+        overlap (float): Fraction of a tile shared with its neighbour, in [0, 0.9]
+        max_tiles (int): Largest tile grid; bigger photos are scaled down to fit
+        min_std (float): Tiles whose pixel standard deviation (0-255) is below this are skipped as background
+        aggregation (str): 'max' keeps each class's strongest tile score, 'mean' averages the scored tiles
+        batch_size (int): Tiles per forward pass
+        use_tta (bool or str): Whether to use test-time augmentation, or 'adaptive'
+        score_batch (callable): Scores an (N, H, W, 3) batch, returning (predictions, details);
+            defaults to predictor.predict_batch
+
+    Returns:
+        tuple: (image-level class probabilities, tiling info with the heatmap)
+    """
+    if aggregation not in TILE_AGGREGATIONS:
+        raise ValueError(f"Unknown tile aggregation '{aggregation}', expected one of {TILE_AGGREGATIONS}")
+    if score_batch is None:
+        score_batch = lambda batch: predictor.predict_batch(batch, use_tta=use_tta, return_details=True)
+
+    started_at = time.perf_counter()
+    tile_height, tile_width = predictor.IMG_HEIGHT, predictor.IMG_WIDTH
+    overlap = min(max(float(overlap), 0.0), 0.9)
+    stride_x = max(1, int(tile_width * (1.0 - overlap)))
+    stride_y = max(1, int(tile_height * (1.0 - overlap)))
+
+    image, scale, original_size = load_tiling_image(source, tile_width, tile_height, stride_x, stride_y, max_tiles)
+
+    ys = tile_offsets(image.shape[0], tile_height, stride_y)
+    xs = tile_offsets(image.shape[1], tile_width, stride_x)
+
+    def tile_at(position):
+        # A view into the image, no copy
+        row, col = position
+        return image[ys[row]:ys[row] + tile_height, xs[col]:xs[col] + tile_width]
+
+    with stage_timer('tile'):
+        positions = [(row, col) for row in range(len(ys)) for col in range(len(xs))]
+        kept = [position for position in positions if not is_uniform_tile(tile_at(position), min_std)]
+        if not kept:
+            # A uniform photo still gets a prediction, from its busiest tile
+            kept = [max(positions, key=lambda position: tile_at(position)[::4, ::4].std())]
+
+    # Score kept tiles in chunks, copying the uint8 tiles into one reused batch buffer
+    batch_size = max(1, batch_size)
+    buffer = np.empty((min(batch_size, len(kept)), tile_height, tile_width, 3), dtype=np.uint8)
+    tile_predictions = []
+    tta_applied = 0
+    tta_modes = set()
+    for start in range(0, len(kept), batch_size):
+        chunk = kept[start:start + batch_size]
+        with stage_timer('stack'):
+            for index, position in enumerate(chunk):
+                buffer[index] = tile_at(position)
+        predictions, details = score_batch(buffer[:len(chunk)])
+        tile_predictions.append(predictions)
+        tta_applied += sum(bool(item_details.get('tta_applied')) for item_details in details)
+        tta_modes.update(item_details.get('tta_mode', 'none') for item_details in details)
+    tile_predictions = np.concatenate(tile_predictions)
+
+    with stage_timer('aggregate'):
+        if aggregation == 'max':
+            probabilities = tile_predictions.max(axis=0)
+            probabilities = probabilities / probabilities.sum()
+        else:
+            probabilities = tile_predictions.mean(axis=0)
+
+        healthy = healthy_mask(predictor.class_names)
+        disease_probability = 1.0 - tile_predictions[:, healthy].sum(axis=1) if healthy.any() else tile_predictions.max(axis=1)
+        top_classes = tile_predictions.argmax(axis=1)
+
+        heatmap = [[None] * len(xs) for _ in ys]
+        tile_classes = [[None] * len(xs) for _ in ys]
+        for (row, col), probability, class_index in zip(kept, disease_probability, top_classes):
+            heatmap[row][col] = round(float(probability), 4)
+            tile_classes[row][col] = predictor.class_names[class_index]
+
+        hottest = int(np.argmax(disease_probability))
+
+    tiling = {
+        'grid': [len(ys), len(xs)],
+        'tile_size': [round(tile_width / scale), round(tile_height / scale)],  # In original pixels
+        'stride': [round(stride_x / scale), round(stride_y / scale)],
+        'overlap': overlap,
+        'scale': round(scale, 4),
+        'original_size': list(original_size),
+        'aggregation': aggregation,
+        'tiles_total': len(positions),
+        'tiles_scored': len(kept),
+        'tiles_skipped': len(positions) - len(kept),
+        'tta_applied_tiles': tta_applied,
+        # 'full' if any tile got TTA
+        'tta_mode': next((mode for mode in ('full', 'adaptive-skipped') if mode in tta_modes), 'none'),
+        'heatmap': heatmap,
+        'tile_classes': tile_classes,
+        'most_diseased_tile': {
+            'row': kept[hottest][0],
+            'col': kept[hottest][1],
+            'disease_probability': round(float(disease_probability[hottest]), 4),
+            'class': predictor.class_names[top_classes[hottest]]
+        },
+        'elapsed_ms': round((time.perf_counter() - started_at) * 1000.0, 3)
+    }
+    return probabilities, tiling
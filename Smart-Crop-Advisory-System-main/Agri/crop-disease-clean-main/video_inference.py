@@ -0,0 +1,275 @@
+"""
+Video and frame-sequence inference for field walk-through clips
+Frames are streamed from the source, sampled, deduplicated with a cheap
+thumbnail difference, scored in batches and folded into a per-segment
+disease timeline
+"""
+
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from metrics import stage_timer
+
+VIDEO_EXTENSIONS = ('mp4', 'mov', 'avi', 'mkv', 'webm', 'm4v', '3gp')
+
+# Side of the grayscale thumbnail compared between consecutive frames
+SIGNATURE_SIZE = 32
+
+
+class VideoFrames:
+    """Sampled RGB frames of a video file, decoded one at a time"""
+
+    def __init__(self, path, sample_fps=2.0, max_frames=None):
+        """
+        Open a video for streaming
+
+        Args:
+            path (str): Video file path (OpenCV needs a real file)
+            sample_fps (float): Frames per second of video kept for inference, 0 keeps every frame
+            max_frames (int): Stop after this many sampled frames, None for the whole clip
+        """
+        import cv2
+
+        self._cv2 = cv2
+        self._capture = cv2.VideoCapture(path)
+        if not self._capture.isOpened():
+            raise ValueError('Could not open the video; unsupported or corrupt file')
+
+        self.source_fps = self._capture.get(cv2.CAP_PROP_FPS) or 0.0
+        self.frame_count = int(self._capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        fps = self.source_fps if self.source_fps > 0 else 30.0
+        self.step = max(1, round(fps / sample_fps)) if sample_fps and sample_fps > 0 else 1
+        self.max_frames = max_frames
+        self.frames_read = 0
+        self._fps = fps
+
+    def __iter__(self):
+        """
+        Yields:
+            tuple: (frame index, timestamp in seconds, uint8 RGB array)
+        """
+        sampled = 0
+        index = 0
+        try:
+            while self.max_frames is None or sampled < self.max_frames:
+                with stage_timer('decode'):
+                    if index % self.step:
+                        # Skipped frames are demuxed and decoded but never converted
+                        if not self._capture.grab():
+                            break
+                        frame = None
+                    else:
+                        ok, frame = self._capture.read()
+                        if not ok:
+                            break
+                        frame = self._cv2.cvtColor(frame, self._cv2.COLOR_BGR2RGB)
+                self.frames_read += 1
+                if frame is not None:
+                    sampled += 1
+                    yield index, index / self._fps, frame
+                index += 1
+        finally:
+            self.release()
+
+    def release(self):
+        self._capture.release()
+
+
+class SequenceFrames:
+    """An ordered list of uploaded frame images, decoded one at a time"""
+
+    def __init__(self, files, frame_rate=1.0, max_frames=None, target_size=None):
+        """
+        Args:
+            files (list): File objects with the encoded frames, in order
+            frame_rate (float): Frames per second the sequence was captured at, for timestamps
+            max_frames (int): Stop after this many frames, None for all
+            target_size (tuple): (width, height) the frames are scored at; JPEG frames are then
+                decoded at the smallest DCT scale that still covers it, as in load_image
+        """
+        self.files = files if max_frames is None else files[:max_frames]
+        self.target_size = target_size
+        self.source_fps = float(frame_rate) if frame_rate and frame_rate > 0 else 1.0
+        self.frame_count = len(self.files)
+        self.frames_read = 0
+
+    def __iter__(self):
+        for index, file in enumerate(self.files):
+            with stage_timer('decode'):
+                stream = file.stream if hasattr(file, 'stream') else file
+                image = Image.open(stream)
+                if self.target_size:
+                    # Only JPEG honours draft; the decoded size stays >= the requested size
+                    image.draft('RGB', self.target_size)
+                image.load()
+                image = ImageOps.exif_transpose(image)
+                frame = np.asarray(image if image.mode == 'RGB' else image.convert('RGB'))
+            self.frames_read += 1
+            yield index, index / self.source_fps, frame
+
+    def release(self):
+        pass
+
+
+def frame_signature(image):
+    """Grayscale thumbnail used to spot near-duplicate frames"""
+    thumbnail = image.resize((SIGNATURE_SIZE, SIGNATURE_SIZE), Image.Resampling.BOX)
+    return np.asarray(thumbnail.convert('L'), dtype=np.float32)
+
+
+class TimelineBuilder:
+    """Fold per-frame predictions into segments of consecutive frames with the same top class"""
+
+    def __init__(self, predictor):
+        self.predictor = predictor
+        self.segments_closed = 0
+        self._current = None
+
+    def add(self, frame_index, timestamp, class_index, confidence, deduplicated):
+        """
+        Add one frame
+
+        Returns:
+            dict: The segment this frame closed, or None
+        """
+        closed = None
+        if self._current is not None and self._current['class_index'] != class_index:
+            closed = self.close()
+
+        if self._current is None:
+            self._current = {
+                'class_index': class_index,
+                'start_frame': frame_index,
+                'start_time': timestamp,
+                'confidences': [],
+                'frames_deduplicated': 0
+            }
+        segment = self._current
+        segment['end_frame'] = frame_index
+        segment['end_time'] = timestamp
+        if deduplicated:
+            segment['frames_deduplicated'] += 1
+        else:
+            segment['confidences'].append(confidence)
+        return closed
+
+    def close(self):
+        """
+        Close the open segment
+
+        Returns:
+            dict: The formatted segment, or None if none was open
+        """
+        segment, self._current = self._current, None
+        if segment is None:
+            return None
+
+        class_name = self.predictor.class_names[segment['class_index']]
+        parts = class_name.split('___')
+        disease = parts[1] if len(parts) > 1 else 'Unknown'
+        confidences = segment['confidences']
+        self.segments_closed += 1
+        return {
+            'segment': self.segments_closed - 1,
+            'start_time': round(segment['start_time'], 3),
+            'end_time': round(segment['end_time'], 3),
+            'start_frame': segment['start_frame'],
+            'end_frame': segment['end_frame'],
+            'prediction': class_name,
+            'plant': parts[0] if parts else 'Unknown',
+            'disease': disease,
+            'is_healthy': 'healthy' in disease.lower(),
+            'severity': self.predictor.disease_info.get(class_name, {}).get('severity', 'Unknown'),
+            'mean_confidence': round(float(np.mean(confidences)), 4),
+            'max_confidence': round(float(np.max(confidences)), 4),
+            'frames_scored': len(confidences),
+            'frames_deduplicated': segment['frames_deduplicated']
+        }
+
+
+def iter_timeline(predictor, frames, score_batch, batch_size=32, dedup_threshold=4.0, stats=None):
+    """
+    Score a frame stream and yield disease segments as they close
+
+    Only one batch of model-sized frames is held at a time, so memory stays
+    flat however long the clip is. A frame whose thumbnail differs from the
+    last scored frame by less than dedup_threshold (mean absolute difference,
+    0-255) is not scored and takes that frame's prediction.
+
+    Args:
+        predictor (AdvancedPlantDiseasePredictor): Loaded predictor
+        frames (VideoFrames or SequenceFrames): Frame source
+        score_batch (callable): Scores an (N, H, W, 3) batch, returning (predictions, details)
+        batch_size (int): Frames per forward pass
+        dedup_threshold (float): Thumbnail difference below which a frame counts as a duplicate, 0 disables
+        stats (dict): Filled with frame counts and timings
+
+    Yields:
+        dict: Timeline segments, in time order
+    """
+    stats = stats if stats is not None else {}
+    stats.update({'frames_sampled': 0, 'frames_deduplicated': 0, 'frames_scored': 0, 'inference_seconds': 0.0})
+    batch_size = max(1, int(batch_size))
+    buffer = np.empty((batch_size, predictor.IMG_HEIGHT, predictor.IMG_WIDTH, 3), dtype=np.uint8)
+    timeline = TimelineBuilder(predictor)
+    pending = []  # (frame index, timestamp, buffer row or None for a duplicate)
+    kept = 0
+    last_signature = None
+    last_result = None
+
+    def flush():
+        nonlocal kept, last_result
+        closed = []
+        if kept:
+            started_at = time.perf_counter()
+            predictions, _ = score_batch(buffer[:kept])
+            stats['inference_seconds'] += time.perf_counter() - started_at
+            stats['frames_scored'] += kept
+        for frame_index, timestamp, row in pending:
+            if row is not None:
+                last_result = (int(np.argmax(predictions[row])), float(np.max(predictions[row])))
+            segment = timeline.add(frame_index, timestamp, last_result[0], last_result[1], row is None)
+            if segment is not None:
+                closed.append(segment)
+        pending.clear()
+        kept = 0
+        return closed
+
+    try:
+        for frame_index, timestamp, frame in frames:
+            stats['frames_sampled'] += 1
+            image = Image.fromarray(frame)
+
+            with stage_timer('dedup'):
+                signature = frame_signature(image)
+                duplicate = (
+                    dedup_threshold > 0 and last_signature is not None and
+                    float(np.abs(signature - last_signature).mean()) < dedup_threshold
+                )
+            # A duplicate needs a scored frame before it to copy from
+            if duplicate and (pending or last_result is not None):
+                stats['frames_deduplicated'] += 1
+                pending.append((frame_index, timestamp, None))
+                continue
+            last_signature = signature
+
+            with stage_timer('resize'):
+                resized = image.resize((predictor.IMG_WIDTH, predictor.IMG_HEIGHT), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            with stage_timer('stack'):
+                buffer[kept] = resized
+            pending.append((frame_index, timestamp, kept))
+            kept += 1
+
+            if kept == batch_size:
+                yield from flush()
+
+        yield from flush()
+        segment = timeline.close()
+        if segment is not None:
+            yield segment
+    finally:
+        frames.release()
+        stats['segments'] = timeline.segments_closed
+        stats['frames_read'] = frames.frames_read